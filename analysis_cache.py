@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Optional
+
+import chess
+import chess.engine
+
+DEFAULT_CACHE_SIZE = 2000
+
+
+class PositionAnalysis:
+    depth: int
+    score: chess.engine.PovScore
+    pv: list[chess.Move]
+
+    def __init__(self, depth: int, score: chess.engine.PovScore, pv: list[chess.Move]):
+        self.depth = depth
+        self.score = score
+        self.pv = pv
+
+    def info(self) -> dict:
+        """Returns the analysis in the same shape as an engine info dict."""
+        return {"depth": self.depth, "score": self.score, "pv": self.pv}
+
+
+class AnalysisCache:
+    """
+    Bounded LRU cache of the deepest engine analysis seen for each position, so that
+    revisiting a position can show the previous result straight away rather than
+    starting again from depth 1.
+    """
+
+    entries: OrderedDict[str, PositionAnalysis]
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+
+    def get(self, epd: str) -> Optional[PositionAnalysis]:
+        analysis = self.entries.get(epd)
+        if analysis is not None:
+            self.entries.move_to_end(epd)
+        return analysis
+
+    def depth(self, epd: str) -> int:
+        analysis = self.entries.get(epd)
+        return 0 if analysis is None else analysis.depth
+
+    def update(self, epd: str, info: dict) -> bool:
+        """
+        Records an engine info for the position.
+
+        Returns:
+            bool: True if the info was deeper than anything already cached (and so
+            worth displaying).
+        """
+        depth = info.get("depth")
+        score = info.get("score")
+        if depth is None or score is None:
+            return False
+        # Bounds from an aspiration window fail aren't real scores.
+        if info.get("lowerbound") or info.get("upperbound"):
+            return False
+        if depth < self.depth(epd):
+            return False
+
+        self.entries[epd] = PositionAnalysis(depth, score, list(info.get("pv", [])))
+        self.entries.move_to_end(epd)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return True
+
+
+class CandidateCache:
+    """
+    Bounded LRU cache of the evaluation of each candidate move from a position, as
+    found by a MultiPV search restricted to those moves.
+    """
+
+    entries: OrderedDict[str, dict[chess.Move, PositionAnalysis]]
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+
+    def get(self, epd: str) -> dict[chess.Move, PositionAnalysis]:
+        candidates = self.entries.get(epd)
+        if candidates is None:
+            return {}
+        self.entries.move_to_end(epd)
+        return candidates
+
+    def depth(self, epd: str, moves: list[chess.Move]) -> int:
+        """Returns the depth to which all of the moves have been searched."""
+        candidates = self.entries.get(epd, {})
+        return min(
+            (candidates[move].depth if move in candidates else 0 for move in moves),
+            default=0,
+        )
+
+    def update(self, epd: str, info: dict) -> bool:
+        depth = info.get("depth")
+        score = info.get("score")
+        pv = info.get("pv")
+        if depth is None or score is None or not pv:
+            return False
+        if info.get("lowerbound") or info.get("upperbound"):
+            return False
+
+        candidates = self.entries.setdefault(epd, {})
+        self.entries.move_to_end(epd)
+        previous = candidates.get(pv[0])
+        if previous is not None and depth < previous.depth:
+            return False
+
+        candidates[pv[0]] = PositionAnalysis(depth, score, list(pv))
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return True
@@ -0,0 +1,127 @@
+"""
+Measures how long ChessBoard takes to draw and paint the board while navigating
+through a game and while dragging a piece over the board.
+
+    QT_QPA_PLATFORM=offscreen python benchmark_board.py [--full] [--json] [pgn...]
+
+--full repaints the whole board on every update, for comparison with the
+incremental renderer.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from PySide6 import QtGui
+from PySide6.QtWidgets import QApplication
+
+import chess
+import chess.pgn
+from chess_board import ChessBoard
+
+
+class TimedChessBoard(ChessBoard):
+    def __init__(self):
+        self.paintTime = 0.0
+        super().__init__()
+
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.paintTime += time.perf_counter() - start
+
+
+def timeUpdate(app: QApplication, board: TimedChessBoard, full: bool) -> float:
+    board.paintTime = 0.0
+    start = time.perf_counter()
+    if full:
+        board.redrawBoard()
+    else:
+        board.drawBoard()
+    drawTime = time.perf_counter() - start
+    app.processEvents()
+    return (drawTime + board.paintTime) * 1000
+
+
+def navigation(app, board, games, full):
+    times = []
+    for game in games:
+        position = game.board()
+        board.setupBoard(position)
+        for move in game.mainline_moves():
+            position.push(move)
+            board.clearClicks()
+            checkSquare = position.king(position.turn) if position.is_check() else None
+            board.setLastMove((move.from_square, move.to_square), checkSquare)
+            times.append(timeUpdate(app, board, full))
+    return times
+
+
+def drag(app, board, games, full):
+    times = []
+    for game in games:
+        position = game.board()
+        for move in game.mainline_moves():
+            board.setupBoard(position)
+            board.clearClicks()
+            moves = [m for m in position.legal_moves if m.from_square == move.from_square]
+            board.setValidMoves(moves)
+            board.firstClickSquare = move.from_square
+            times.append(timeUpdate(app, board, full))
+            # Drag over every square, as mouseMoveEvent would when hovering a target.
+            targets = {m.to_square for m in moves}
+            for square in chess.SQUARES:
+                board.mouseOverSquare = square if square in targets else None
+                times.append(timeUpdate(app, board, full))
+            board.mouseOverSquare = None
+            position.push(move)
+    return times
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "count": len(times),
+        "mean_ms": statistics.fmean(times),
+        "p50_ms": times[len(times) // 2],
+        "p99_ms": times[min(len(times) - 1, int(len(times) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pgns", nargs="*", default=["win.pgn", "long_draw.pgn"])
+    parser.add_argument("--full", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication([])
+    board = TimedChessBoard()
+    board.resize(board.sizeHint())
+    board.show()
+
+    games = []
+    for pgn in args.pgns:
+        with open(pgn) as f:
+            games.append(chess.pgn.read_game(f))
+
+    results = {
+        "navigation": summarize(navigation(app, board, games, args.full)),
+        "drag": summarize(drag(app, board, games, args.full)),
+    }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, result in results.items():
+            print(
+                f"{name:12} {result['count']:6} updates  "
+                f"mean {result['mean_ms']:.3f}ms  p50 {result['p50_ms']:.3f}ms  "
+                f"p99 {result['p99_ms']:.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
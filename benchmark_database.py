@@ -0,0 +1,344 @@
+"""
+Measures ingesting games and opening lines into freshly generated databases, the
+latency of looking positions up in them and compressing the games' PGNs.
+
+    python benchmark_database.py [--games N] [--openings N] [--lookups N]
+        [--seed N] [--pgn file]... [--json] [--output file] [--compare file]
+
+Lookups are timed with the lookup cache empty (cold) and again once it has been
+filled (warm). --output saves the results as JSON and --compare prints how they
+changed from results saved before, e.g. on another commit.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import chess
+
+import compress_pgns
+import generate_databases
+import import_openings
+import position_index
+import update_positions
+from database import GameDatabase, OpeningDatabase
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "count": len(times),
+        "mean_ms": statistics.fmean(times),
+        "p50_ms": times[len(times) // 2],
+        "p99_ms": times[min(len(times) - 1, int(len(times) * 0.99))],
+    }
+
+
+def maxRssMb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes.
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / (1 << 10)
+
+
+def gitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def ingestGames(games_file, args):
+    con = sqlite3.connect(games_file)
+    generate_databases.generateGames(con, args.games, args.seed, args.pgn)
+    start = time.perf_counter()
+    positions = update_positions.update_positions(con, verbose=False)
+    seconds = time.perf_counter() - start
+    con.close()
+    return {
+        "games": args.games,
+        "positions": positions,
+        "seconds": seconds,
+        "games_per_s": args.games / seconds,
+        "positions_per_s": positions / seconds,
+        "max_rss_mb": maxRssMb(),
+        "file_mb": os.path.getsize(games_file) / (1 << 20),
+    }
+
+
+def ingestOpenings(openings_file, args):
+    variations = generate_databases.generateVariations(args.openings, args.seed)
+    con = sqlite3.connect(openings_file)
+    import_openings.create_tables(con)
+    start = time.perf_counter()
+    lines = import_openings.import_variations(con.cursor(), variations, verbose=False)
+    con.commit()
+    seconds = time.perf_counter() - start
+    positions = con.execute("SELECT COUNT(1) FROM opening_positions").fetchone()[0]
+    con.close()
+    return {
+        "lines": lines,
+        "positions": positions,
+        "seconds": seconds,
+        "lines_per_s": lines / seconds,
+        "positions_per_s": positions / seconds,
+        "max_rss_mb": maxRssMb(),
+        "file_mb": os.path.getsize(openings_file) / (1 << 20),
+    }
+
+
+def pgnMb(con) -> float:
+    (size,) = con.execute(
+        "SELECT SUM(LENGTH(CAST(pgn AS BLOB))) FROM raw_games"
+    ).fetchone()
+    (games_size,) = con.execute(
+        "SELECT SUM(LENGTH(CAST(pgn AS BLOB))) FROM games"
+    ).fetchone()
+    return (size + games_size) / (1 << 20)
+
+
+def compressPgns(games_file):
+    con = sqlite3.connect(games_file)
+    pgn_mb = pgnMb(con)
+    file_mb = os.path.getsize(games_file) / (1 << 20)
+    start = time.perf_counter()
+    pgns = compress_pgns.compress_pgns(con, verbose=False)
+    seconds = time.perf_counter() - start
+    con.execute("VACUUM")
+    results = {
+        "pgns": pgns,
+        "seconds": seconds,
+        "pgns_per_s": pgns / seconds,
+        "pgn_mb_before": pgn_mb,
+        "pgn_mb_after": pgnMb(con),
+        "file_mb_before": file_mb,
+        "file_mb_after": os.path.getsize(games_file) / (1 << 20),
+    }
+    con.close()
+    return results
+
+
+def sampleLookups(games_file, count, seed):
+    """
+    Picks positions to look up, weighted towards the opening as navigating games
+    is, and whole games' mainlines as the controller looks up when opening one.
+    """
+    rng = random.Random(seed)
+    con = sqlite3.connect(games_file)
+    epds = [
+        epd
+        for (epd,) in con.execute(
+            """
+            SELECT epd FROM positions p
+            JOIN game_positions g ON p.pos_id = g.pos_id
+            ORDER BY g.game_pos_id
+            """
+        )
+    ]
+    game_ids = [game_id for (game_id,) in con.execute("SELECT game_id FROM games")]
+    mainlines = []
+    for game_id in rng.sample(game_ids, min(len(game_ids), max(1, count // 10))):
+        mainlines.append(
+            [
+                epd
+                for (epd,) in con.execute(
+                    """
+                    SELECT epd FROM positions p
+                    JOIN game_positions g ON p.pos_id = g.pos_id
+                    WHERE game_id = ?
+                    ORDER BY ply
+                    """,
+                    (game_id,),
+                )
+            ]
+        )
+    con.close()
+    positions = [epds[int(len(epds) * rng.random() ** 2)] for _ in range(count)]
+    return positions, mainlines
+
+
+async def timeLookups(database, lookups, clear):
+    times = []
+    for epds in lookups:
+        if clear:
+            database.cache.clear()
+        start = time.perf_counter()
+        await database.lookupPositions(epds, chess.WHITE)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+async def lookupLatency(database, positions, mainlines):
+    single = [[epd] for epd in positions]
+    results = {
+        "single_cold": summarize(await timeLookups(database, single, True)),
+        "mainline_cold": summarize(await timeLookups(database, mainlines, True)),
+    }
+    # The first pass fills the cache.
+    await timeLookups(database, single, False)
+    results["single_warm"] = summarize(await timeLookups(database, single, False))
+    results["max_rss_mb"] = maxRssMb()
+    await database.close()
+    return results
+
+
+async def sameRows(database, backend, epds) -> bool:
+    """Whether the backend finds the same rows as the SQL, which is in any order."""
+    sql_rows = await database.fetchRows(epds, chess.WHITE)
+    backend_rows = await backend.fetchRows(epds, chess.WHITE)
+    await database.close()
+    return sorted(sql_rows, key=repr) == sorted(backend_rows, key=repr)
+
+
+def backendLookups(games_file, positions, mainlines, **kwargs):
+    """
+    Times lookups with GameDatabase looking positions up somewhere other than the
+    SQL, checking it finds the same rows.
+    """
+
+    def database(**kwargs):
+        return GameDatabase(
+            games_file, username=generate_databases.DEFAULT_USERNAME, **kwargs
+        )
+
+    backend = database(**kwargs)
+    epds = positions + [epd for mainline in mainlines for epd in mainline]
+    # The backend is opened by the first lookup.
+    start = time.perf_counter()
+    asyncio.run(backend.fetchRows(positions[:1], chess.WHITE))
+    open_seconds = time.perf_counter() - start
+    identical = asyncio.run(sameRows(database(), backend, epds))
+    backend_mb = backend.backendBytes()
+    results = asyncio.run(lookupLatency(backend, positions, mainlines))
+    results["identical"] = identical
+    results["open_seconds"] = open_seconds
+    if backend_mb is not None:
+        results["memory_mb"] = backend_mb / (1 << 20)
+    return results
+
+
+def indexLookups(games_file, positions, mainlines):
+    """Builds a position index and times lookups with it instead of the SQL."""
+    index_file = games_file + ".pidx"
+    con = sqlite3.connect(games_file)
+    start = time.perf_counter()
+    position_index.buildIndex(con, index_file, generate_databases.DEFAULT_USERNAME)
+    seconds = time.perf_counter() - start
+    con.close()
+
+    results = backendLookups(
+        games_file, positions, mainlines, position_index=index_file
+    )
+    results["build_seconds"] = seconds
+    results["file_mb"] = os.path.getsize(index_file) / (1 << 20)
+    return results
+
+
+def compare(results, baseline, path=()):
+    """Prints each number in the results next to the baseline's."""
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        if isinstance(value, dict):
+            compare(value, baseline[key], path + (key,))
+        elif isinstance(value, (int, float)) and baseline[key]:
+            name = ".".join(path + (key,))
+            change = (value / baseline[key] - 1) * 100
+            print(f"{name:40} {baseline[key]:12.3f} -> {value:12.3f} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--openings", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pgn", action="append", help="Take games from this file")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--output", help="Save the results as JSON to this file")
+    parser.add_argument("--compare", help="Compare with results saved by --output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        games_file = os.path.join(directory, "games.db")
+        openings_file = os.path.join(directory, "openings.db")
+
+        results = {
+            "ingest_games": ingestGames(games_file, args),
+            "ingest_openings": ingestOpenings(openings_file, args),
+        }
+        positions, mainlines = sampleLookups(games_file, args.lookups, args.seed)
+        results["lookup_games"] = asyncio.run(
+            lookupLatency(
+                GameDatabase(games_file, username=generate_databases.DEFAULT_USERNAME),
+                positions,
+                mainlines,
+            )
+        )
+        results["lookup_games_index"] = indexLookups(games_file, positions, mainlines)
+        results["lookup_games_columns"] = backendLookups(
+            games_file, positions, mainlines, columns=True
+        )
+        results["lookup_openings"] = asyncio.run(
+            lookupLatency(OpeningDatabase(openings_file), positions, mainlines)
+        )
+        results["compress_pgns"] = compressPgns(games_file)
+
+    report = {
+        "commit": gitCommit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "params": {
+            "games": args.games,
+            "openings": args.openings,
+            "lookups": args.lookups,
+            "seed": args.seed,
+            "pgn": args.pgn,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report))
+    elif args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"{baseline.get('commit')} -> {report['commit']}")
+        compare(results, baseline["results"])
+    else:
+        for name, result in results.items():
+            print(name)
+            for key, value in result.items():
+                if isinstance(value, dict):
+                    print(
+                        f"  {key:16} {value['count']:6} lookups  "
+                        f"mean {value['mean_ms']:.3f}ms  p50 {value['p50_ms']:.3f}ms  "
+                        f"p99 {value['p99_ms']:.3f}ms"
+                    )
+                elif isinstance(value, float):
+                    print(f"  {key:16} {value:.2f}")
+                else:
+                    print(f"  {key:16} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Measures what navigating a game feels like: the time from a navigation click to
+the board being drawn, the database and openings panes being filled and the first
+engine output being shown.
+
+    python benchmark_navigation.py [--games N] [--depth-time SECONDS]
+        [--dwell SECONDS] [--json] [--output file] [--trace file] [pgn...]
+
+Runs the real Controller, board, move list and panes under Qt's offscreen
+platform, against generated databases and the deterministic fake_uci_engine.py.
+Each game is stepped through with pauses, held down as if the arrow key was held,
+and jumped around. --trace saves a trace of the run, see tracing.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import qasync
+from PySide6 import QtGui
+from PySide6.QtWidgets import QApplication, QLabel, QPushButton
+
+import chess
+import chess.pgn
+import generate_databases
+import tracing
+import update_positions
+from chess_board import ChessBoard
+from config import setConfig
+from controller import Controller
+from database_pane import DatabasePane
+from eval_bar import EvalBar
+from game import Game
+from move_list import MoveList
+from openings_pane import OpeningsPane
+
+STAGES = ("board", "database", "openings", "engine")
+HOLD_INTERVAL = 1 / 30
+FAKE_ENGINE = os.path.join(os.path.dirname(__file__), "fake_uci_engine.py")
+
+
+class TimedChessBoard(ChessBoard):
+    """Calls onPaint after each paint, so the harness sees when it was drawn."""
+
+    def __init__(self):
+        self.onPaint = None
+        super().__init__()
+
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        super().paintEvent(event)
+        if self.onPaint is not None:
+            self.onPaint()
+
+
+class Probe:
+    """
+    Records when each stage first shows the position that navigation is heading
+    for. The controller's outputs are wrapped so that the position they're
+    showing can be checked against the target.
+    """
+
+    def __init__(self, controller: Controller, board: TimedChessBoard):
+        self.controller = controller
+        self.target = None
+        self.clicked = 0.0
+        self.times = {}
+        self.samples = {stage: [] for stage in STAGES}
+
+        board.onPaint = lambda: self.reached("board", controller.game.getEpd())
+
+        def wrap(pane, stage):
+            setMoves = pane.setMoves
+
+            def timedSetMoves(moves, controller):
+                setMoves(moves, controller)
+                self.reached(stage, self.controller.game.getEpd())
+
+            pane.setMoves = timedSetMoves
+
+        wrap(controller.game_database_pane, "database")
+        wrap(controller.opening_database_pane, "openings")
+
+        submit = controller.engine_output.submit
+
+        def timedSubmit(board, info):
+            submit(board, info)
+            if "score" in info:
+                self.reached("engine", board.epd())
+
+        controller.engine_output.submit = timedSubmit
+
+    def start(self, target: str):
+        self.target = target
+        self.clicked = time.perf_counter()
+        self.times = {}
+
+    def reached(self, stage: str, epd: str):
+        if epd == self.target and stage not in self.times:
+            self.times[stage] = (time.perf_counter() - self.clicked) * 1000
+
+    async def finish(self, timeout: float):
+        """Waits for every stage to show the target and records how long they took."""
+        deadline = time.perf_counter() + timeout
+        while len(self.times) < len(STAGES) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        for stage, elapsed in self.times.items():
+            self.samples[stage].append(elapsed)
+        return len(self.times) == len(STAGES)
+
+
+def targetEpd(game: Game, ply: int) -> str:
+    return game.getEpd(min(ply, len(game.getMainlineEpds()) - 1))
+
+
+async def stepThrough(controller, probe, plies, args):
+    """Steps forward one move at a time, waiting on each position."""
+    game = controller.game
+    for _ in range(plies):
+        if not game.hasMoreMoves():
+            break
+        probe.start(targetEpd(game, game.ply + 1))
+        controller.nextMove()
+        await probe.finish(args.dwell)
+
+
+async def hold(controller, probe, plies, args, forward=True):
+    """Steps at the keyboard repeat rate, timing only the position it ends on."""
+    game = controller.game
+    step = 1 if forward else -1
+    target = game.ply + step * plies
+    target = max(0, min(target, len(game.getMainlineEpds()) - 1))
+    probe.start(targetEpd(game, target))
+    for _ in range(abs(target - game.ply)):
+        # Timed from the last key press, as nothing can show the target before it.
+        probe.clicked = time.perf_counter()
+        (controller.nextMove if forward else controller.previousMove)()
+        await asyncio.sleep(HOLD_INTERVAL)
+    await probe.finish(args.dwell)
+
+
+async def jumps(controller, probe, count, rng, args):
+    game = controller.game
+    last = len(game.getMainlineEpds()) - 1
+    for _ in range(count):
+        ply = rng.randint(1, last)
+        probe.start(targetEpd(game, ply))
+        turn = chess.BLACK if (ply - 1) % 2 else chess.WHITE
+        controller.selectMove(turn, (ply + 1) // 2)
+        await probe.finish(args.dwell)
+    probe.start(targetEpd(game, last))
+    controller.lastMove()
+    await probe.finish(args.dwell)
+    probe.start(targetEpd(game, 0))
+    controller.firstMove()
+    await probe.finish(args.dwell)
+
+
+def summarize(times):
+    if not times:
+        return {"count": 0}
+    times = sorted(times)
+    return {
+        "count": len(times),
+        "mean_ms": statistics.fmean(times),
+        "p50_ms": times[len(times) // 2],
+        "p90_ms": times[min(len(times) - 1, int(len(times) * 0.9))],
+        "p99_ms": times[min(len(times) - 1, int(len(times) * 0.99))],
+    }
+
+
+def buildDatabases(directory, args, pgns):
+    games_file = os.path.join(directory, "games.db")
+    openings_file = os.path.join(directory, "openings.db")
+    con = sqlite3.connect(games_file)
+    generate_databases.generateGames(con, args.games, args.seed)
+    # The benchmarked games are in the database too, so their positions are found.
+    generate_databases.generateGames(con, len(pgns), args.seed, pgns)
+    update_positions.update_positions(con, verbose=False)
+    con.close()
+    con = sqlite3.connect(openings_file)
+    generate_databases.generateOpenings(con, args.openings, args.seed)
+    con.close()
+    return games_file, openings_file
+
+
+def longGames(count, seed) -> list[str]:
+    """Random games far longer than the bundled ones, as PGN."""
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        board = chess.Board()
+        for move in generate_databases.randomMoves(rng, 400):
+            board.push(move)
+        games.append(str(chess.pgn.Game.from_board(board)))
+    return games
+
+
+async def benchmark(args, pgn_texts, games_file, openings_file):
+    board = TimedChessBoard()
+    board.resize(board.sizeHint())
+    board.show()
+    widgets = dict(
+        eval_bar=EvalBar(),
+        move_list=MoveList(),
+        game_database_pane=DatabasePane(),
+        opening_database_pane=OpeningsPane(),
+        first=QPushButton(),
+        previous=QPushButton(),
+        next=QPushButton(),
+        last=QPushButton(),
+        rotate=QPushButton(),
+        analysis_widget=QLabel(),
+    )
+    for widget in widgets.values():
+        widget.show()
+
+    rng = random.Random(args.seed)
+    results = {}
+    schedulers = {}
+    incomplete = 0
+    for name, text in pgn_texts:
+        game = Game.fromPgnText(text)
+        controller = Controller(
+            game,
+            board,
+            engine_command=[
+                sys.executable,
+                FAKE_ENGINE,
+                "--depth-time",
+                str(args.depth_time),
+            ],
+            games_database=games_file,
+            openings_database=openings_file,
+            username=generate_databases.DEFAULT_USERNAME,
+            **widgets,
+        )
+        probe = Probe(controller, board)
+        # Let the engine start and the first lookups finish.
+        probe.start(game.getEpd())
+        await probe.finish(args.dwell * 4)
+
+        scenarios = {}
+        for scenario, run in (
+            ("step", lambda: stepThrough(controller, probe, args.steps, args)),
+            ("hold_forward", lambda: hold(controller, probe, 20, args)),
+            ("hold_back", lambda: hold(controller, probe, 20, args, forward=False)),
+            ("jump", lambda: jumps(controller, probe, args.jumps, rng, args)),
+        ):
+            probe.samples = {stage: [] for stage in STAGES}
+            await run()
+            scenarios[scenario] = {
+                stage: summarize(samples) for stage, samples in probe.samples.items()
+            }
+            incomplete += sum(
+                len(probe.samples["board"]) - len(samples)
+                for samples in probe.samples.values()
+            )
+        results[name] = scenarios
+        # Before stopping, which cancels whatever is still waiting.
+        schedulers[name] = controller.scheduler.report()
+        await controller.stop()
+        for button in ("first", "previous", "next", "last", "rotate"):
+            widgets[button].clicked.disconnect()
+    return results, schedulers, incomplete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pgns", nargs="*", default=["win.pgn", "long_draw.pgn"])
+    parser.add_argument("--games", type=int, default=300, help="Database size")
+    parser.add_argument("--openings", type=int, default=300)
+    parser.add_argument("--long-games", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--jumps", type=int, default=10)
+    parser.add_argument("--dwell", type=float, default=1.0)
+    parser.add_argument("--depth-time", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--output", help="Save the results as JSON to this file")
+    parser.add_argument("--trace", help="Save a Chrome trace of the run to this file")
+    args = parser.parse_args()
+
+    setConfig(
+        {
+            "lichess": {"username": generate_databases.DEFAULT_USERNAME},
+            "engine": {
+                "dwell_seconds": args.dwell,
+                "quick_depth": 10,
+                "max_depth": 20,
+            },
+        }
+    )
+
+    pgn_texts = []
+    for pgn in args.pgns:
+        with open(pgn) as f:
+            pgn_texts.append((os.path.basename(pgn), f.read()))
+    for i, text in enumerate(longGames(args.long_games, args.seed)):
+        pgn_texts.append((f"long_{i}", text))
+
+    if args.trace:
+        tracing.enable(args.trace)
+    app = QApplication([])
+    with tempfile.TemporaryDirectory() as directory:
+        games_file, openings_file = buildDatabases(directory, args, args.pgns)
+        results, schedulers, incomplete = qasync.run(
+            benchmark(args, pgn_texts, games_file, openings_file)
+        )
+    app.quit()
+
+    report = {
+        "params": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("json", "output", "trace")
+        },
+        "incomplete": incomplete,
+        "results": results,
+        "scheduler": schedulers,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    for name, scenarios in results.items():
+        print(name)
+        for scenario, stages in scenarios.items():
+            for stage, result in stages.items():
+                if result["count"] == 0:
+                    continue
+                print(
+                    f"  {scenario:13} {stage:9} {result['count']:4}  "
+                    f"p50 {result['p50_ms']:8.1f}ms  p90 {result['p90_ms']:8.1f}ms  "
+                    f"p99 {result['p99_ms']:8.1f}ms"
+                )
+        for stage, report in schedulers[name]["stages"].items():
+            wait = report["mean_wait_ms"]
+            print(
+                f"  {'scheduler':13} {stage:9} {report['requests']:4}  "
+                f"superseded {report['superseded']:4}  "
+                f"wait {'-' if wait is None else f'{wait:.1f}ms'}"
+            )
+    if incomplete:
+        print(f"{incomplete} stages didn't show the position within --dwell")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import time
 from abc import ABC, abstractmethod
+from collections import deque
 from typing import Optional
 
 from PySide6 import QtCore, QtGui, QtWidgets
@@ -8,11 +10,14 @@ from PySide6.QtWidgets import QLabel, QWidget
 
 import chess
 import chess.pgn
+from piece_atlas import PiecePixmaps, pieceAtlas
+from tracing import traced
 
 SQUARE_SIZE = 80
-HALF_SQUARE_SIZE = SQUARE_SIZE // 2
-VALID_MOVE_CIRCLE_RADIUS = SQUARE_SIZE // 6
-VALID_CAPTURE_CIRCLE_RADIUS = SQUARE_SIZE * 0.6
+MIN_SQUARE_SIZE = 32
+VALID_MOVE_CIRCLE_RATIO = 1 / 6
+DRAW_TIME_SAMPLES = 50
+VALID_CAPTURE_CIRCLE_RATIO = 0.6
 LEFT_MARGIN = 20
 RIGHT_MARGIN = 20
 TOP_MARGIN = 20
@@ -21,6 +26,11 @@ WIDTH = SQUARE_SIZE * 8 + LEFT_MARGIN + RIGHT_MARGIN
 HEIGHT = SQUARE_SIZE * 8 + TOP_MARGIN + TOP_MARGIN
 ANIMATION_DURATION = 200
 
+HIGHLIGHT_SELECTED = 1
+HIGHLIGHT_LAST_MOVE = 2
+TARGET_MOVE = 1
+TARGET_CAPTURE = 2
+
 
 class DragHandler(ABC):
     """Abstract piece drag handler."""
@@ -53,40 +63,63 @@ class DragHandler(ABC):
         return NotImplemented
 
 
-def rankAndFileFromCoords(x: int, y: int, colorPerspective: chess.Color):
+def boardWidth(squareSize: int = SQUARE_SIZE) -> int:
+    return squareSize * 8 + LEFT_MARGIN + RIGHT_MARGIN
+
+
+def boardHeight(squareSize: int = SQUARE_SIZE) -> int:
+    return squareSize * 8 + TOP_MARGIN + BOTTOM_MARGIN
+
+
+def rankAndFileFromCoords(
+    x: int, y: int, colorPerspective: chess.Color, squareSize: int = SQUARE_SIZE
+):
     if colorPerspective == chess.WHITE:
-        return (7 - (y - TOP_MARGIN) // SQUARE_SIZE, (x - LEFT_MARGIN) // SQUARE_SIZE)
+        return (7 - (y - TOP_MARGIN) // squareSize, (x - LEFT_MARGIN) // squareSize)
     else:
-        return ((y - TOP_MARGIN) // SQUARE_SIZE, 7 - (x - LEFT_MARGIN) // SQUARE_SIZE)
+        return ((y - TOP_MARGIN) // squareSize, 7 - (x - LEFT_MARGIN) // squareSize)
 
 
-def fileAndRankFromCoords(x: int, y: int, colorPerspective: chess.Color):
-    temp = rankAndFileFromCoords(x, y, colorPerspective)
+def fileAndRankFromCoords(
+    x: int, y: int, colorPerspective: chess.Color, squareSize: int = SQUARE_SIZE
+):
+    temp = rankAndFileFromCoords(x, y, colorPerspective, squareSize)
     return temp[1], temp[0]
 
 
-def squarePositionFromRankAndFile(rank: int, file: int, colorPerspective: chess.Color):
+def squarePositionFromRankAndFile(
+    rank: int, file: int, colorPerspective: chess.Color, squareSize: int = SQUARE_SIZE
+):
     if colorPerspective == chess.WHITE:
         return QtCore.QPoint(
-            SQUARE_SIZE * file + LEFT_MARGIN,
-            (7 - rank) * SQUARE_SIZE + TOP_MARGIN,
+            squareSize * file + LEFT_MARGIN,
+            (7 - rank) * squareSize + TOP_MARGIN,
         )
     else:
         return QtCore.QPoint(
-            SQUARE_SIZE * (7 - file) + LEFT_MARGIN,
-            rank * SQUARE_SIZE + TOP_MARGIN,
+            squareSize * (7 - file) + LEFT_MARGIN,
+            rank * squareSize + TOP_MARGIN,
         )
 
 
-def squarePosition(square: int, colorPerspective: chess.Color):
+def squarePosition(
+    square: int, colorPerspective: chess.Color, squareSize: int = SQUARE_SIZE
+):
     rank = chess.square_rank(square)
     file = chess.square_file(square)
-    return squarePositionFromRankAndFile(rank, file, colorPerspective)
+    return squarePositionFromRankAndFile(rank, file, colorPerspective, squareSize)
+
+
+def isDarkSquare(square: chess.Square) -> bool:
+    return (chess.square_file(square) + chess.square_rank(square)) % 2 == 0
 
 
 class PieceWidget(QLabel):
     def __init__(self, chess_board: QWidget):
         super().__init__(chess_board)
+        # While a resize is waiting for the pixmaps at the new size, the previous
+        # ones are stretched to fit.
+        self.setScaledContents(True)
 
     def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
         if not self.isVisible():
@@ -114,34 +147,13 @@ class Piece:
     type: chess.PieceType
     rank: int
     file: int
+    pooled: bool
     widget: PieceWidget
 
-    def createPixmap(piece_name: str):
-        return QtGui.QIcon("pieces/" + piece_name + ".svg").pixmap(
-            SQUARE_SIZE, SQUARE_SIZE
-        )
-
-    IMAGE_MAP = None
-
     def image_map(type, color):
-        if Piece.IMAGE_MAP is None:
-            Piece.IMAGE_MAP = {
-                (chess.PAWN, chess.WHITE): Piece.createPixmap("white_pawn"),
-                (chess.BISHOP, chess.WHITE): Piece.createPixmap("white_bishop"),
-                (chess.KNIGHT, chess.WHITE): Piece.createPixmap("white_knight"),
-                (chess.ROOK, chess.WHITE): Piece.createPixmap("white_rook"),
-                (chess.QUEEN, chess.WHITE): Piece.createPixmap("white_queen"),
-                (chess.KING, chess.WHITE): Piece.createPixmap("white_king"),
-                (chess.PAWN, chess.BLACK): Piece.createPixmap("black_pawn"),
-                (chess.BISHOP, chess.BLACK): Piece.createPixmap("black_bishop"),
-                (chess.KNIGHT, chess.BLACK): Piece.createPixmap("black_knight"),
-                (chess.ROOK, chess.BLACK): Piece.createPixmap("black_rook"),
-                (chess.QUEEN, chess.BLACK): Piece.createPixmap("black_queen"),
-                (chess.KING, chess.BLACK): Piece.createPixmap("black_king"),
-            }
-
-        a = Piece.IMAGE_MAP[(type, color)]
-        return a
+        """Returns the pixmap for the piece at the default square size."""
+        devicePixelRatio = QtWidgets.QApplication.instance().devicePixelRatio()
+        return pieceAtlas().pixmaps(SQUARE_SIZE, devicePixelRatio)[(type, color)]
 
     def __init__(
         self,
@@ -152,75 +164,97 @@ class Piece:
         file: int,
         colorPerspective: chess.Color,
     ):
+        self.chess_board = chess_board
         self.color = color
         self.rank = rank
         self.file = file
+        self.pooled = False
         self.widget = PieceWidget(chess_board)
-        self.widget.resize(SQUARE_SIZE, SQUARE_SIZE)
-        self.widget.move(squarePositionFromRankAndFile(rank, file, colorPerspective))
+        self.rotate(colorPerspective)
         self.changeType(type)
 
-    def changeType(self, newType):
+    def changeType(self, newType, newColor=None):
+        if newColor is not None:
+            self.color = newColor
         self.type = newType
-        self.widget.setPixmap(Piece.image_map(newType, self.color))
+        self.updatePixmap()
+
+    def updatePixmap(self):
+        self.widget.setPixmap(self.chess_board.piecePixmap(self.type, self.color))
 
     def rotate(self, colorPerspective):
+        """Moves and sizes the widget to fit the piece's square."""
+        squareSize = self.chess_board.squareSize
+        self.widget.resize(squareSize, squareSize)
         self.widget.move(
-            squarePositionFromRankAndFile(self.rank, self.file, colorPerspective)
+            squarePositionFromRankAndFile(
+                self.rank, self.file, colorPerspective, squareSize
+            )
         )
 
 
 class ChessBoard(QLabel):
+    boardResized = QtCore.Signal(int)
+
     anim: QtCore.QAbstractAnimation
     positions: dict[int, Piece]
+    piecePool: list[Piece]
     firstClickSquare: Optional[int]
     dragPiece: Optional[Piece]
     validMoves: list[chess.Move]
     mouseOverSquare: Optional[chess.Square]
+    squareSize: int
+    piecePixmaps: PiecePixmaps
+    drawTimes: deque[float]
 
     def __init__(self):
         super().__init__()
 
         self.anim = None
         self.positions = {}
+        self.piecePool = []
         self.dragPiece = None
         self.firstClickSquare = None
         self.moveHandler = None
         self.lastMove = None
         self.checkSquare = None
         self.validMoves = []
+        self.validTargets = chess.BB_EMPTY
         self.mouseOverSquare = None
         self.colorPerspective = chess.WHITE
+        self.boardLayers = {}
+        self.paintedHighlights = {}
+        # Seconds taken by recent drawBoard calls that painted something.
+        self.drawTimes = deque(maxlen=DRAW_TIME_SAMPLES)
+        self.squareSize = SQUARE_SIZE
+        self.piecePixmaps = pieceAtlas().pixmaps(
+            self.squareSize, self.devicePixelRatioF()
+        )
+        pieceAtlas().rasterised.connect(self.piecePixmapsReady)
 
-        canvas = QtGui.QPixmap(WIDTH, HEIGHT)
-        canvas.fill(Qt.gray)
-        self.setPixmap(canvas)
-        self.setFixedSize(WIDTH, HEIGHT)
-        # Draw the A-H and 1-8 indicators once as they will never be overdrawn
-        self.drawRankAndFileIndicators()
+        self.setSizePolicy(
+            QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding
+        )
+        self.canvas = self.boardLayer().copy()
         self.drawBoard()
         self.dragWidget = None
 
     # Methods overridden from DragHandler
     def dragStart(self, pos: QtCore.QPoint) -> None:
         pos = self.mapFromGlobal(pos)
-        square = chess.square(
-            *fileAndRankFromCoords(pos.x(), pos.y(), self.colorPerspective)
-        )
+        square = self.squareAt(pos)
+        if square not in self.positions:
+            return
         self.mouseOverSquare = square
         piece = self.positions[square]
         if self.moveHandler.whoseTurn() == piece.color:
-            self.validMoves = self.moveHandler.getValidMoves(square)
-            self.dragPiece = Piece(
-                self,
-                piece.type,
-                piece.color,
-                chess.square_rank(square),
-                chess.square_file(square),
-                self.colorPerspective,
+            self.setValidMoves(self.moveHandler.getValidMoves(square))
+            self.dragPiece = self.acquirePiece(
+                chess.Piece(piece.type, piece.color), square
             )
+            self.dragPiece.widget.raise_()
             self.dragPiece.widget.move(
-                pos.x() - HALF_SQUARE_SIZE, pos.y() - HALF_SQUARE_SIZE
+                pos.x() - self.squareSize // 2, pos.y() - self.squareSize // 2
             )
             self.dragPiece.widget.show()
 
@@ -241,15 +275,13 @@ class ChessBoard(QLabel):
 
         pos = self.mapFromGlobal(pos)
         self.dragPiece.widget.move(
-            pos.x() - HALF_SQUARE_SIZE, pos.y() - HALF_SQUARE_SIZE
+            pos.x() - self.squareSize // 2, pos.y() - self.squareSize // 2
         )
 
-        square = chess.square(
-            *fileAndRankFromCoords(pos.x(), pos.y(), self.colorPerspective)
-        )
+        square = self.squareAt(pos)
         if square == self.mouseOverSquare:
             return
-        if not any(square == move.to_square for move in self.validMoves):
+        if square is None or not self.validTargets & chess.BB_SQUARES[square]:
             if self.mouseOverSquare is None:
                 return
             self.mouseOverSquare = None
@@ -263,32 +295,105 @@ class ChessBoard(QLabel):
 
         piece_widget = self.positions[self.firstClickSquare].widget
         piece_widget.setGraphicsEffect(None)
-        pos = self.mapFromGlobal(pos)
-        square = chess.square(
-            *fileAndRankFromCoords(pos.x(), pos.y(), self.colorPerspective)
-        )
-        if square != self.firstClickSquare:
+        square = self.squareAt(self.mapFromGlobal(pos))
+        if square is not None and square != self.firstClickSquare:
             self.makeMove(self.firstClickSquare, square, instant=True)
 
-        self.dragPiece.widget.setParent(None)
+        self.releasePiece(self.dragPiece)
         self.dragPiece = None
 
-    def setupBoard(self, board: chess.Board):
-        for piece in self.positions.values():
-            piece.widget.setParent(None)
-        self.positions = {}
-        for color in (chess.WHITE, chess.BLACK):
-            for type in (
-                chess.PAWN,
-                chess.KNIGHT,
-                chess.BISHOP,
-                chess.ROOK,
-                chess.QUEEN,
-                chess.KING,
+    @traced("board")
+    def setupBoard(self, board: chess.Board, animate=False):
+        """
+        Makes the pieces match the given position. Only squares whose piece changed
+        are touched: pieces that are still needed are moved (preferring the nearest
+        piece of the same kind) or retyped, and the rest are hidden and pooled for
+        reuse.
+
+        Args:
+            animate (bool, optional): Animate the moves and fade pieces in and out
+            rather than changing them instantly. Defaults to False.
+        """
+        target = board.piece_map()
+        spare = []
+        for square, piece in list(self.positions.items()):
+            wanted = target.get(square)
+            if (
+                wanted is None
+                or wanted.piece_type != piece.type
+                or wanted.color != piece.color
             ):
-                squares = board.pieces(type, color)
-                for square in squares:
-                    self.addPiece(square, chess.Piece(type, color))
+                spare.append((square, self.positions.pop(square)))
+
+        for square, wanted in target.items():
+            if square in self.positions:
+                continue
+
+            same = [
+                entry
+                for entry in spare
+                if entry[1].type == wanted.piece_type and entry[1].color == wanted.color
+            ]
+            if same:
+                entry = min(
+                    same, key=lambda entry: chess.square_distance(entry[0], square)
+                )
+                spare.remove(entry)
+                self.placePiece(entry[1], square, animate)
+            elif spare and not animate:
+                _, piece = spare.pop()
+                piece.changeType(wanted.piece_type, wanted.color)
+                self.placePiece(piece, square)
+            else:
+                self.addPiece(square, wanted, fadeIn=animate)
+
+        for _, piece in spare:
+            if animate:
+                self.addAnimation(self.createPieceFadeAnimation(piece))
+            else:
+                self.releasePiece(piece)
+
+    def placePiece(self, piece: Piece, square: chess.Square, animate=False):
+        piece.file, piece.rank = chess.square_file(square), chess.square_rank(square)
+        self.positions[square] = piece
+        if animate:
+            anim = QPropertyAnimation(piece.widget, b"pos")
+            anim.setEndValue(
+                squarePosition(square, self.colorPerspective, self.squareSize)
+            )
+            anim.setDuration(ANIMATION_DURATION)
+            anim.setEasingCurve(QtCore.QEasingCurve.InOutCubic)
+            self.addAnimation(anim)
+        else:
+            piece.rotate(self.colorPerspective)
+
+    def acquirePiece(self, chess_piece: chess.Piece, square: chess.Square) -> Piece:
+        """Gets a piece widget from the pool, or creates one if the pool is empty."""
+        if not self.piecePool:
+            return Piece(
+                self,
+                chess_piece.piece_type,
+                chess_piece.color,
+                chess.square_rank(square),
+                chess.square_file(square),
+                self.colorPerspective,
+            )
+
+        piece = self.piecePool.pop()
+        piece.pooled = False
+        piece.changeType(chess_piece.piece_type, chess_piece.color)
+        piece.file, piece.rank = chess.square_file(square), chess.square_rank(square)
+        piece.rotate(self.colorPerspective)
+        return piece
+
+    def releasePiece(self, piece: Piece):
+        """Hides a piece widget that's no longer needed and returns it to the pool."""
+        if piece.pooled:
+            return
+        piece.pooled = True
+        piece.widget.hide()
+        piece.widget.setGraphicsEffect(None)
+        self.piecePool.append(piece)
 
     def addAnimation(self, anim):
         if self.anim is None:
@@ -309,7 +414,7 @@ class ChessBoard(QLabel):
         piece.file, piece.rank = chess.square_file(toPos), chess.square_rank(toPos)
         self.positions[toPos] = self.positions.pop(fromPos)
         anim = QPropertyAnimation(piece.widget, b"pos")
-        anim.setEndValue(squarePosition(toPos, self.colorPerspective))
+        anim.setEndValue(squarePosition(toPos, self.colorPerspective, self.squareSize))
         anim.setDuration(ANIMATION_DURATION)
         anim.setEasingCurve(QtCore.QEasingCurve.InOutCubic)
         self.addAnimation(anim)
@@ -333,26 +438,18 @@ class ChessBoard(QLabel):
             fadeAnim.setStartValue(1)
             fadeAnim.setEndValue(0)
             fadeAnim.setEasingCurve(QEasingCurve.InQuad)
-            fadeAnim.finished.connect(lambda: piece.widget.setParent(None))
+            fadeAnim.finished.connect(lambda: self.releasePiece(piece))
         fadeAnim.setDuration(ANIMATION_DURATION)
         return fadeAnim
 
     def capturePiece(self, pos: int):
         piece = self.positions[pos]
         fadeAnim = self.createPieceFadeAnimation(piece)
-        fadeAnim.finished.connect(lambda: piece.widget.setParent(None))
         self.addAnimation(fadeAnim)
         del self.positions[pos]
 
     def addPiece(self, pos: int, chess_piece: chess.Piece, fadeIn=False) -> Piece:
-        piece = Piece(
-            self,
-            chess_piece.piece_type,
-            chess_piece.color,
-            chess.square_rank(pos),
-            chess.square_file(pos),
-            self.colorPerspective,
-        )
+        piece = self.acquirePiece(chess_piece, pos)
         self.positions[pos] = piece
         piece.widget.lower()
         piece.widget.show()
@@ -365,15 +462,21 @@ class ChessBoard(QLabel):
         the board.
         """
         self.firstClickSquare = None
-        self.validMoves = []
+        self.setValidMoves([])
+
+    def setValidMoves(self, moves: list[chess.Move]):
+        self.validMoves = moves
+        # Bitmask of the target squares so drawing doesn't have to search the list.
+        self.validTargets = chess.BB_EMPTY
+        for move in moves:
+            self.validTargets |= chess.BB_SQUARES[move.to_square]
 
     def mousePressEvent(self, ev: QtGui.QMouseEvent) -> None:
         if self.firstClickSquare is None:
             return
 
-        rank, file = rankAndFileFromCoords(ev.x(), ev.y(), self.colorPerspective)
-
-        if not self.makeMove(self.firstClickSquare, chess.square(file, rank)):
+        square = self.squareAt(ev.position().toPoint())
+        if square is None or not self.makeMove(self.firstClickSquare, square):
             self.clearClicks()
             self.drawBoard()
 
@@ -388,135 +491,263 @@ class ChessBoard(QLabel):
         self.lastMove = move
         self.checkSquare = checkSquare
 
-    def drawRankAndFileIndicators(self):
-        canvas = self.pixmap()
-        painter = QtGui.QPainter(canvas)
+    def boardLayer(self) -> QtGui.QPixmap:
+        """
+        Returns the static layer for the current orientation and size: the margins,
+        the rank and file indicators and the plain squares. It's drawn once per
+        orientation and size.
+        """
+        devicePixelRatio = self.devicePixelRatioF()
+        key = (self.colorPerspective, self.squareSize, devicePixelRatio)
+        layer = self.boardLayers.get(key)
+        if layer is not None:
+            return layer
+
+        width = boardWidth(self.squareSize)
+        height = boardHeight(self.squareSize)
+        halfSquareSize = self.squareSize // 2
+        layer = QtGui.QPixmap(
+            round(width * devicePixelRatio), round(height * devicePixelRatio)
+        )
+        layer.setDevicePixelRatio(devicePixelRatio)
+        layer.fill(Qt.gray)
+        painter = QtGui.QPainter(layer)
         fm = QtGui.QFontMetrics(painter.font())
         for y in range(0, 8):
-            textToDraw = str(y + 1)
+            rank = 7 - y if self.colorPerspective == chess.WHITE else y
+            textToDraw = chess.RANK_NAMES[rank]
             rect = fm.boundingRect(textToDraw)
             painter.drawStaticText(
                     (LEFT_MARGIN - rect.width()) // 2,
-                    y * SQUARE_SIZE
-                    + HALF_SQUARE_SIZE
+                    y * self.squareSize
+                    + halfSquareSize
                     + TOP_MARGIN
                     - rect.height() // 2,
                     QtGui.QStaticText(textToDraw),
             )
         for x in range(0, 8):
-            textToDraw = chr(x + 65)
+            file = x if self.colorPerspective == chess.WHITE else 7 - x
+            textToDraw = chess.FILE_NAMES[file].upper()
             rect = fm.boundingRect(textToDraw)
             painter.drawStaticText(
-                    x * SQUARE_SIZE
-                    + HALF_SQUARE_SIZE
+                    x * self.squareSize
+                    + halfSquareSize
                     + LEFT_MARGIN
                     - rect.width() // 2,
-                    HEIGHT - (TOP_MARGIN + rect.height()) // 2,
+                    height - (TOP_MARGIN + rect.height()) // 2,
                     QtGui.QStaticText(textToDraw),
             )
+        for square in chess.SQUARES:
+            painter.fillRect(self.squareRect(square), self.squareColor(square))
         painter.end()
-        self.setPixmap(canvas)
 
-    def drawBoard(self):
-        canvas = self.pixmap()
-        painter = QtGui.QPainter(canvas)
-        painter.setRenderHint(QtGui.QPainter.Antialiasing)
-        for y in range(0, 8):
-            for x in range(0, 8):
-                if self.colorPerspective == chess.WHITE:
-                    square = chess.square(x, 7 - y)
-                else:
-                    square = chess.square(7 - x, y)
-                if square == self.mouseOverSquare and self.firstClickSquare is not None:
-                    color = (
-                        ChessBoard.SELECTED_DARK_SQUARE
-                        if (x + y) % 2 == 1
-                        else ChessBoard.SELECTED_LIGHT_SQUARE
-                    )
-                elif self.lastMove is not None and (
-                    square == self.lastMove[0] or square == self.lastMove[1]
-                ):
-                    color = (
-                        ChessBoard.CHECK_DARK_SQUARE
-                        if (x + y) % 2 == 1
-                        else ChessBoard.CHECK_LIGHT_SQUARE
-                    )
-                elif square == self.firstClickSquare:
-                    color = (
-                        ChessBoard.SELECTED_DARK_SQUARE
-                        if (x + y) % 2 == 1
-                        else ChessBoard.SELECTED_LIGHT_SQUARE
-                    )
-                else:
-                    color = (
-                        ChessBoard.DARK_SQUARE
-                        if (x + y) % 2 == 1
-                        else ChessBoard.LIGHT_SQUARE
-                    )
-                painter.fillRect(
-                    x * SQUARE_SIZE + LEFT_MARGIN,
-                    y * SQUARE_SIZE + TOP_MARGIN,
-                    SQUARE_SIZE,
-                    SQUARE_SIZE,
-                    color,
+        self.boardLayers[key] = layer
+        return layer
+
+    def squareColor(self, square: chess.Square) -> QtGui.QColor:
+        if isDarkSquare(square):
+            return ChessBoard.DARK_SQUARE
+        return ChessBoard.LIGHT_SQUARE
+
+    def squareRect(self, square: chess.Square) -> QtCore.QRect:
+        return QtCore.QRect(
+            squarePosition(square, self.colorPerspective, self.squareSize),
+            QtCore.QSize(self.squareSize, self.squareSize),
+        )
+
+    def squareAt(self, pos: QtCore.QPoint) -> Optional[chess.Square]:
+        """Returns the square under the point, or None if it's off the board."""
+        x = pos.x() - LEFT_MARGIN
+        y = pos.y() - TOP_MARGIN
+        if not (0 <= x < self.squareSize * 8 and 0 <= y < self.squareSize * 8):
+            return None
+        return chess.square(
+            *fileAndRankFromCoords(
+                pos.x(), pos.y(), self.colorPerspective, self.squareSize
+            )
+        )
+
+    def highlights(self) -> dict[chess.Square, tuple]:
+        """
+        Returns the (background, check, target) highlight of every square that isn't
+        drawn plainly. Later assignments take precedence over earlier ones.
+        """
+        backgrounds = {}
+        if self.firstClickSquare is not None:
+            backgrounds[self.firstClickSquare] = HIGHLIGHT_SELECTED
+        if self.lastMove is not None:
+            backgrounds[self.lastMove[0]] = HIGHLIGHT_LAST_MOVE
+            backgrounds[self.lastMove[1]] = HIGHLIGHT_LAST_MOVE
+        if self.mouseOverSquare is not None and self.firstClickSquare is not None:
+            backgrounds[self.mouseOverSquare] = HIGHLIGHT_SELECTED
+
+        targets = {
+            square: TARGET_CAPTURE if square in self.positions else TARGET_MOVE
+            for square in chess.scan_forward(self.validTargets)
+        }
+
+        highlights = {}
+        for square in backgrounds.keys() | targets.keys() | {self.checkSquare}:
+            if square is not None:
+                highlights[square] = (
+                    backgrounds.get(square),
+                    square == self.checkSquare,
+                    targets.get(square),
                 )
+        return highlights
 
-                if square == self.checkSquare:
-                    # Create a red halo emanating from behind the king fading to the
-                    # square color actual.
-                    gradient = QtGui.QRadialGradient(
-                        QtCore.QPointF(
-                            x * SQUARE_SIZE + LEFT_MARGIN + HALF_SQUARE_SIZE,
-                            y * SQUARE_SIZE + TOP_MARGIN + HALF_SQUARE_SIZE,
-                        ),
-                        HALF_SQUARE_SIZE * 1.414,
-                    )
-                    gradient.setColorAt(0, QColorConstants.Red)
-                    gradient.setColorAt(1, QtGui.QColor(255, 0, 0, 0))
-                    painter.fillRect(
-                        QtCore.QRectF(
-                            x * SQUARE_SIZE + LEFT_MARGIN,
-                            y * SQUARE_SIZE + TOP_MARGIN,
-                            SQUARE_SIZE,
-                            SQUARE_SIZE,
-                        ),
-                        gradient,
-                    )
+    def paintSquare(self, painter: QtGui.QPainter, square: chess.Square, highlight):
+        rect = self.squareRect(square)
+        painter.fillRect(rect, self.squareColor(square))
+        if highlight is None:
+            return
 
-                # The lookup loops over the list which could be avoided if we drew the squares in
-                # the right order and maintained our position in this list.
-                if any(square == move.to_square for move in self.validMoves):
-                    radius = VALID_MOVE_CIRCLE_RADIUS
-                    if square in self.positions:
-                        radius = VALID_CAPTURE_CIRCLE_RADIUS
-                    color = (
-                        ChessBoard.DARK_SQUARE
-                        if (x + y) % 2 == 1
-                        else ChessBoard.LIGHT_SQUARE
-                    )
+        background, check, target = highlight
+        dark = isDarkSquare(square)
+        center = QtCore.QRectF(rect).center()
+        if background == HIGHLIGHT_SELECTED:
+            painter.fillRect(
+                rect,
+                ChessBoard.SELECTED_DARK_SQUARE
+                if dark
+                else ChessBoard.SELECTED_LIGHT_SQUARE,
+            )
+        elif background == HIGHLIGHT_LAST_MOVE:
+            painter.fillRect(
+                rect,
+                ChessBoard.CHECK_DARK_SQUARE if dark else ChessBoard.CHECK_LIGHT_SQUARE,
+            )
 
-                    validHighlight = QColorConstants.DarkYellow
-                    validHighlight.setAlphaF(0.7)
-                    painter.setPen(Qt.NoPen)
-                    painter.setBrush(validHighlight)
-                    painter.setClipRect(
-                        x * SQUARE_SIZE + LEFT_MARGIN,
-                        y * SQUARE_SIZE + TOP_MARGIN,
-                        SQUARE_SIZE,
-                        SQUARE_SIZE,
-                    )
-                    painter.drawEllipse(
-                        QtCore.QPointF(
-                            x * SQUARE_SIZE + LEFT_MARGIN + HALF_SQUARE_SIZE,
-                            y * SQUARE_SIZE + TOP_MARGIN + HALF_SQUARE_SIZE,
-                        ),
-                        radius,
-                        radius,
-                    )
-                    painter.setClipping(False)
+        if check:
+            # Create a red halo emanating from behind the king fading to the
+            # square color actual.
+            gradient = QtGui.QRadialGradient(
+                center,
+                self.squareSize / 2 * 1.414,
+            )
+            gradient.setColorAt(0, QColorConstants.Red)
+            gradient.setColorAt(1, QtGui.QColor(255, 0, 0, 0))
+            painter.fillRect(QtCore.QRectF(rect), gradient)
+
+        if target is not None:
+            radius = self.squareSize * (
+                VALID_CAPTURE_CIRCLE_RATIO
+                if target == TARGET_CAPTURE
+                else VALID_MOVE_CIRCLE_RATIO
+            )
+            validHighlight = QtGui.QColor(QColorConstants.DarkYellow)
+            validHighlight.setAlphaF(0.7)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(validHighlight)
+            painter.setClipRect(rect)
+            painter.drawEllipse(
+                center,
+                radius,
+                radius,
+            )
+            painter.setClipping(False)
+
+    @traced("board")
+    def drawBoard(self):
+        """
+        Brings the canvas up to date with the current highlights, repainting only
+        the squares whose highlight changed since the last draw.
+        """
+        start = time.perf_counter()
+        highlights = self.highlights()
+        dirty = [
+            square
+            for square in highlights.keys() | self.paintedHighlights.keys()
+            if highlights.get(square) != self.paintedHighlights.get(square)
+        ]
+        if not dirty:
+            return
+
+        painter = QtGui.QPainter(self.canvas)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        for square in dirty:
+            self.paintSquare(painter, square, highlights.get(square))
+            self.update(self.squareRect(square))
+        painter.end()
+
+        self.paintedHighlights = highlights
+        self.drawTimes.append(time.perf_counter() - start)
+
+    def redrawBoard(self):
+        """Repaints the whole canvas, e.g. after the orientation changes."""
+        self.canvas = self.boardLayer().copy()
+        self.paintedHighlights = {}
+        self.drawBoard()
+        self.update()
 
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        # Qt clips this to the region being repainted.
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(0, 0, self.canvas)
         painter.end()
-        self.setPixmap(canvas)
+
+    def sizeHint(self) -> QtCore.QSize:
+        return QtCore.QSize(WIDTH, HEIGHT)
+
+    def minimumSizeHint(self) -> QtCore.QSize:
+        return QtCore.QSize(boardWidth(MIN_SQUARE_SIZE), boardHeight(MIN_SQUARE_SIZE))
+
+    def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
+        super().resizeEvent(event)
+        squareSize = min(
+            (event.size().width() - LEFT_MARGIN - RIGHT_MARGIN) // 8,
+            (event.size().height() - TOP_MARGIN - BOTTOM_MARGIN) // 8,
+        )
+        self.setSquareSize(max(MIN_SQUARE_SIZE, squareSize))
+
+    def event(self, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.Type.DevicePixelRatioChange:
+            # Moved to a screen with a different scale factor.
+            self.requestPiecePixmaps()
+            self.redrawBoard()
+        return super().event(event)
+
+    def setSquareSize(self, squareSize: int):
+        """
+        Lays the board out with squares of the given size. Until the pieces have
+        been rasterised at the new size the existing pixmaps are scaled.
+        """
+        if squareSize == self.squareSize:
+            return
+
+        self.cancelAnimation()
+        self.squareSize = squareSize
+        self.boardLayers = {}
+        self.requestPiecePixmaps()
+        self.redrawBoard()
+        for piece in self.positions.values():
+            piece.rotate(self.colorPerspective)
+        if self.dragPiece is not None:
+            self.dragPiece.widget.resize(squareSize, squareSize)
+        self.boardResized.emit(boardHeight(squareSize))
+
+    def requestPiecePixmaps(self):
+        key = (self.squareSize, self.devicePixelRatioF())
+        if pieceAtlas().get(*key) is not None:
+            self.piecePixmapsReady(key)
+        else:
+            pieceAtlas().request(*key)
+
+    def piecePixmapsReady(self, key: tuple[int, float]):
+        if key != (self.squareSize, self.devicePixelRatioF()):
+            return
+        self.piecePixmaps = pieceAtlas().get(*key)
+        for piece in self.positions.values():
+            piece.updatePixmap()
+        if self.dragPiece is not None:
+            self.dragPiece.updatePixmap()
+
+    def piecePixmap(self, type: chess.PieceType, color: chess.Color) -> QtGui.QPixmap:
+        """
+        Returns the most recently rasterised pixmap for the piece, which is at the
+        current size unless a resize is still waiting for the atlas.
+        """
+        return self.piecePixmaps[(type, color)]
 
     def cancelAnimation(self):
         if self.anim is not None:
@@ -524,6 +755,15 @@ class ChessBoard(QLabel):
                 self.anim.setCurrentTime(self.anim.duration())
             self.anim = None
 
+    def animationRemaining(self) -> int:
+        """Returns the number of milliseconds left of the running animation."""
+        if (
+            self.anim is None
+            or self.anim.state() != QtCore.QAbstractAnimation.State.Running
+        ):
+            return 0
+        return self.anim.duration() - self.anim.currentTime()
+
     def clearAnimation(self):
         self.anim = None
 
@@ -536,7 +776,7 @@ class ChessBoard(QLabel):
         if self.colorPerspective != colorPerspective:
             self.colorPerspective = colorPerspective
             self.clearClicks()
-            self.drawBoard()
+            self.redrawBoard()
             for piece in self.positions.values():
                 piece.rotate(colorPerspective)
 
@@ -0,0 +1,116 @@
+import argparse
+import os
+import sqlite3
+
+import zstandard
+
+from pgn_compression import DICTIONARIES_SCHEMA, frameDictId, loadCodec
+
+# Compresses the PGNs in raw_games and games with a zstd dictionary trained on a
+# sample of them (see pgn_compression.py). Rows are converted in batches, each
+# committed as it's done, so the migration can be stopped and run again. Running
+# it again also compresses games imported since, which are otherwise compressed as
+# they're imported once there's a dictionary. --retrain trains a new dictionary and
+# recompresses everything with it.
+
+# The (table, key) of each PGN column.
+PGN_COLUMNS = (("raw_games", "id"), ("games", "game_id"))
+
+DICTIONARY_SIZE = 112640
+TRAINING_SAMPLES = 5000
+BATCH_SIZE = 1000
+
+
+def train_dictionary(con, codec, samples=TRAINING_SAMPLES, size=DICTIONARY_SIZE):
+    """Trains a dictionary on a random sample of the games, returning its data."""
+    pgns = [
+        codec.decompress(pgn).encode()
+        for (pgn,) in con.execute(
+            "SELECT pgn FROM raw_games ORDER BY RANDOM() LIMIT ?", (samples,)
+        )
+    ]
+    return zstandard.train_dictionary(size, pgns).as_bytes()
+
+
+def add_dictionary(con, codec, data) -> int:
+    dict_id = codec.addDictionary(data)
+    con.execute(
+        "INSERT OR IGNORE INTO pgn_dictionaries (dict_id, data) VALUES (?, ?)",
+        (dict_id, data),
+    )
+    con.commit()
+    return dict_id
+
+
+def compress_table(con, table, key, codec, batch_size=BATCH_SIZE, verbose=True):
+    """
+    Compresses the PGNs in the table that aren't already compressed with the
+    codec's newest dictionary.
+
+    Returns:
+        int: The number of PGNs compressed.
+    """
+    total = 0
+    last = None
+    while True:
+        rows = con.execute(
+            f"""
+            SELECT {key}, pgn FROM {table}
+            WHERE pgn IS NOT NULL AND ({key} > ? OR ? IS NULL)
+            ORDER BY {key}
+            LIMIT ?
+            """,
+            (last, last, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        updates = [
+            (codec.compress(codec.decompress(pgn)), row_key)
+            for (row_key, pgn) in rows
+            if isinstance(pgn, str) or frameDictId(pgn) != codec.dictId
+        ]
+        con.executemany(f"UPDATE {table} SET pgn = ? WHERE {key} = ?", updates)
+        con.commit()
+        total += len(updates)
+        if verbose:
+            print(f"{table}: {total}", end="\r")
+    if verbose:
+        print(f"Compressed {total} PGNs in {table}")
+    return total
+
+
+def compress_pgns(con, retrain=False, verbose=True) -> int:
+    """
+    Compresses the database's PGNs, training a dictionary first if it doesn't
+    have one.
+
+    Returns:
+        int: The number of PGNs compressed.
+    """
+    con.executescript(DICTIONARIES_SCHEMA)
+    codec = loadCodec(con)
+    if retrain or codec.dictId is None:
+        dict_id = add_dictionary(con, codec, train_dictionary(con, codec))
+        if verbose:
+            print(f"Trained dictionary {dict_id}")
+    return sum(
+        compress_table(con, table, key, codec, verbose=verbose)
+        for (table, key) in PGN_COLUMNS
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compresses a games database's PGNs.")
+    parser.add_argument("games", nargs="?", default="/Users/dan/github/chess/games.db")
+    parser.add_argument("--retrain", action="store_true", help="Train a new dictionary")
+    args = parser.parse_args()
+
+    before = os.path.getsize(args.games)
+    con = sqlite3.connect(args.games)
+    compress_pgns(con, args.retrain)
+    # Reclaims the space the text took.
+    con.execute("VACUUM")
+    con.close()
+    after = os.path.getsize(args.games)
+    print(f"{args.games}: {before / (1 << 20):.1f}MB -> {after / (1 << 20):.1f}MB")
@@ -1,7 +1,17 @@
 import yaml
 
-with open('config.yaml', 'r') as file:
-    __CONFIG__ = yaml.safe_load(file)
+__CONFIG__ = None
+
 
 def config():
+    global __CONFIG__
+    if __CONFIG__ is None:
+        with open("config.yaml", "r") as file:
+            __CONFIG__ = yaml.safe_load(file)
     return __CONFIG__
+
+
+def setConfig(values: dict):
+    """Uses the given settings instead of reading config.yaml, e.g. for benchmarks."""
+    global __CONFIG__
+    __CONFIG__ = values
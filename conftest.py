@@ -0,0 +1,22 @@
+import sqlite3
+from typing import Iterator
+
+import pytest
+
+import generate_databases
+import update_positions
+
+
+@pytest.fixture
+def games_database(tmp_path) -> Iterator[tuple[str, sqlite3.Connection]]:
+    """A generated games.db with its positions, and a connection to it."""
+    games_file = str(tmp_path / "games.db")
+    con = sqlite3.connect(games_file)
+    generate_databases.generateGames(con, 30, seed=1)
+    update_positions.update_positions(con, verbose=False)
+    # Results SQL's SUMs treat differently.
+    con.execute("UPDATE games SET result = NULL WHERE game_id = 1")
+    con.execute("UPDATE games SET result = '*' WHERE game_id = 2")
+    con.commit()
+    yield games_file, con
+    con.close()
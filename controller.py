@@ -1,17 +1,41 @@
 import asyncio
+import time
+from collections import deque
+from typing import Optional
+
 import chess.engine
 
 from PySide6.QtWidgets import QLabel, QPushButton
 
 import chess
 from config import config
+from analysis_cache import DEFAULT_CACHE_SIZE, AnalysisCache, CandidateCache
 from chess_board import ChessBoard
 from database import GameDatabase, OpeningDatabase
 from database_pane import DatabasePane
+from engine_output import DEFAULT_MAX_FPS, EngineOutput, scoreText
 from eval_bar import EvalBar
 from game import Game
 from move_list import MoveList
+from move_encoding import decodeMove, encodeMove
+from navigation import NavigationQueue
+from scheduler import StagedScheduler
 from openings_pane import OpeningsPane
+from tracing import asyncSpan, traced
+
+DEFAULT_QUICK_DEPTH = 14
+DEFAULT_MAX_DEPTH = 30
+DEFAULT_DWELL_SECONDS = 1.0
+DEFAULT_CANDIDATE_DEPTH = 20
+DEFAULT_LOOKUP_DELAY = 0.15
+DEFAULT_ANALYSIS_DELAY = 0.3
+DEFAULT_ENGINE_COMMAND = "stockfish"
+READY_SAMPLES = 20
+
+BOARD_STAGE = "board"
+LOOKUP_STAGE = "lookup"
+CANDIDATES_STAGE = "candidates"
+ANALYSIS_STAGE = "analysis"
 
 
 class Controller:
@@ -26,6 +50,8 @@ class Controller:
     engine: chess.engine.SimpleEngine
     backgroundTasks: set[asyncio.Task]
     userColor: chess.Color
+    navigatedAt: Optional[float]
+    readyLatencies: deque[float]
 
     def __init__(
         self,
@@ -41,7 +67,19 @@ class Controller:
         last: QPushButton,
         rotate: QPushButton,
         analysis_widget: QLabel,
+        *,
+        engine_command=None,
+        games_database: str = "games.db",
+        openings_database: str = "openings.db",
+        username: Optional[str] = None,
     ):
+        """
+        Args:
+            engine_command: The UCI engine to run, as a path or an argument list.
+                Defaults to the engine command in the config, or stockfish.
+            username: The user's name in the games database. Defaults to the
+                lichess username in the config.
+        """
         self.game = game
         self.chess_board = chess_board
         self.eval_bar = eval_bar
@@ -57,13 +95,49 @@ class Controller:
         self.currentTurnAndNumber = (chess.WHITE, 0)
         self.backgroundTasks = set()
         self.engine = None
-        self.examineTasks = []
+        self.engine_start = None
+        self.engine_command = engine_command or config().get("engine", {}).get(
+            "command", DEFAULT_ENGINE_COMMAND
+        )
         self.userColor = chess.WHITE
+        self.engine_output = EngineOutput(
+            analysis_widget,
+            eval_bar,
+            max_fps=config().get("engine", {}).get("max_fps", DEFAULT_MAX_FPS),
+        )
+        self.analysis_cache = AnalysisCache(
+            config().get("engine", {}).get("cache_size", DEFAULT_CACHE_SIZE)
+        )
+        self.candidate_cache = CandidateCache(
+            config().get("engine", {}).get("cache_size", DEFAULT_CACHE_SIZE)
+        )
+        self.candidate_engine = None
+        navigation_config = config().get("navigation", {})
+        self.scheduler = StagedScheduler(self.scheduleTask)
+        self.scheduler.addStage(BOARD_STAGE, 0)
+        self.scheduler.addStage(
+            LOOKUP_STAGE,
+            navigation_config.get("lookup_delay", DEFAULT_LOOKUP_DELAY),
+        )
+        self.scheduler.addStage(CANDIDATES_STAGE, 0)
+        self.scheduler.addStage(
+            ANALYSIS_STAGE,
+            navigation_config.get("analysis_delay", DEFAULT_ANALYSIS_DELAY),
+        )
+        self.navigation = NavigationQueue()
+        self.navigationFlush = None
+        # When the user last navigated, until both panes show the position.
+        self.navigatedAt = None
+        self.readyLatencies = deque(maxlen=READY_SAMPLES)
 
+        database_config = config().get("database") or {}
         self.game_database = GameDatabase(
-            database_file="games.db", username=config()["lichess"]["username"]
+            database_file=games_database,
+            username=username or config()["lichess"]["username"],
+            position_index=database_config.get("position_index"),
+            columns=database_config.get("columns", False),
         )
-        self.opening_database = OpeningDatabase(database_file="openings.db")
+        self.opening_database = OpeningDatabase(database_file=openings_database)
         self.first.clicked.connect(self.firstMove)
         self.previous.clicked.connect(self.previousMove)
         self.next.clicked.connect(self.nextMove)
@@ -71,22 +145,22 @@ class Controller:
         self.rotate.clicked.connect(self.rotateBoard)
 
         self.move_list.setMoves(self, game.getMoves())
-        b = game.board.copy()
-        positions = [b.epd()]
-        for m in game.getMoves():
-            b.push_uci(m.uci())
-            positions.append(b.epd())
+        self.scheduleLookupPositions(positions=game.getMainlineEpds())
 
-        self.scheduleLookupPositions(positions=positions)
-
-        asyncio.create_task(self.startEngine())
+        self.startEngine()
 
         self.updateMoveListPosition()
         self.chess_board.setupBoard(game.board)
         self.chess_board.moveHandler = self
 
-    async def startEngine(self):
-        self.transport, self.engine = await chess.engine.popen_uci("stockfish")
+    def startEngine(self):
+        # Started once and shared, so that the engine is only spawned once however
+        # many analyses are waiting for it.
+        if self.engine_start is None:
+            self.engine_start = asyncio.ensure_future(
+                chess.engine.popen_uci(self.engine_command)
+            )
+        return self.engine_start
 
     async def lookupGamePositions(self, positions, color):
         self.game_database_pane.setMovesLoading()
@@ -94,26 +168,25 @@ class Controller:
         filtered_moves = [
             move for move in moves if move[2] == (self.userColor == chess.WHITE)
         ]
-        self.game_database_pane.setMoves(filtered_moves, self)
+        # Lookups aren't cancelled (their results are cached), so one for a position
+        # that's been left since mustn't overwrite the pane.
+        if positions[0] == self.game.getEpd():
+            self.game_database_pane.setMoves(filtered_moves, self)
+        return filtered_moves
 
     async def lookupOpeningPositions(self, positions, color, ply, *, lookupAllBookMoves=False):
         self.opening_database_pane.setMovesLoading()
+        first_position = positions[0]
         if lookupAllBookMoves:
-            first_position = positions[0]
-            positions = []
-            current_node = self.game.game.root()
-            while next_node := current_node.next():
-                positions.append(current_node.board().epd())
-                current_node = next_node
-            else:
-                positions.append(current_node.board().epd())
+            positions = self.game.getMainlineEpds()
             ply = 0
             await self.opening_database.lookupPositions(positions, color)
             moves = await self.opening_database.lookupPositions([first_position], color)
         else:
             moves = await self.opening_database.lookupPositions(positions, color)
 
-        self.opening_database_pane.setMoves(moves, self)
+        if first_position == self.game.getEpd():
+            self.opening_database_pane.setMoves(moves, self)
 
         if ply == 0:
             # Cut off the first position since it's the starting position.
@@ -126,68 +199,141 @@ class Controller:
                 ply - 1, self.opening_database.getBookMoves(positions, color)
             )
 
+        return moves
+
     async def getEngine(self):
         if self.engine:
             return self.engine
 
-        await self.startEngine()
+        # Shielded so that cancelling an analysis doesn't cancel the engine starting.
+        self.transport, self.engine = await asyncio.shield(self.startEngine())
         return self.engine
 
-    async def examinePosition(self, board: chess.Board):
+    async def getCandidateEngine(self):
+        # A separate engine process so that the candidate move search doesn't
+        # interrupt the main analysis.
+        if self.candidate_engine is None:
+            self.candidate_engine = asyncio.ensure_future(
+                chess.engine.popen_uci(self.engine_command)
+            )
+        _, engine = await self.candidate_engine
+        return engine
+
+    def showCandidateEvals(self, board: chess.Board):
+        evals = {
+            encodeMove(move): scoreText(analysis.score)
+            for move, analysis in self.candidate_cache.get(board.epd()).items()
+        }
+        self.game_database_pane.setMoveEvals(evals)
+        self.opening_database_pane.setMoveEvals(evals)
+
+    @traced("analysis")
+    async def evaluateCandidates(self, board: chess.Board, lookups: list[asyncio.Task]):
+        """
+        Evaluates every move shown in the game and openings panes with a single
+        MultiPV search restricted to those moves, annotating the panes after each
+        completed depth. The lookups must have finished.
+        """
         try:
-            engine = await self.getEngine()
-
-            if asyncio.current_task() != self.examineTasks[-1]:
+            # A lookup that failed has no moves to evaluate.
+            rows = [
+                move
+                for task in lookups
+                if not task.cancelled() and task.exception() is None
+                for move in task.result()
+            ]
+            moves = []
+            for code in {move[0] for move in rows}:
+                if code is not None and board.is_legal(decodeMove(code)):
+                    moves.append(decodeMove(code))
+            if not moves:
                 return
 
-            if len(self.examineTasks) > 1:
-                for i in range(0, len(self.examineTasks) - 1):
-                    task: asyncio.Task = self.examineTasks[i]
-                    if not task.cancelled():
-                        task.cancel()
-                        await task
+            epd = board.epd()
+            self.showCandidateEvals(board)
 
-            del self.examineTasks[0:-1]
-
-            # A new task could have been scheduled while we were waiting on cancelling the other
-            # tasks.
-            if asyncio.current_task() != self.examineTasks[-1]:
+            depth = config().get("engine", {}).get(
+                "candidate_depth", DEFAULT_CANDIDATE_DEPTH
+            )
+            if self.candidate_cache.depth(epd, moves) >= depth:
                 return
 
-            with await engine.analysis(board, chess.engine.Limit(depth=25)) as analysis:
+            engine = await self.getCandidateEngine()
+            with await engine.analysis(
+                board,
+                chess.engine.Limit(depth=depth),
+                multipv=len(moves),
+                root_moves=moves,
+            ) as analysis:
                 async for info in analysis:
-                    score = info.get("score")
-                    if score is not None:
-                        score = score
-                        if score.is_mate():
-                            mate = score.white().mate()
-                            if mate == 0:
-                                score_text = "Checkmate"
-                            elif mate > 0:
-                                score_text = f"M+{mate}"
-                            else:
-                                score_text = f"M-{-mate}"
-                        else:
-                            score_text = "{:.2f}".format(
-                                score.pov(chess.WHITE).score() / 100.0
-                            )
-
-                        depth = info.get("depth")
-
-                        if board.is_game_over():
-                            self.analysis_widget.setText(board.result(claim_draw=True))
-                        else:
-                            move = board.variation_san(info.get("pv"))
-                            self.analysis_widget.setText(
-                                f"{score_text} depth: {depth} {move}\n"
-                            )
-                        self.eval_bar.updateBar(score)
-
-                    # Arbitrary stop condition.
-                    if info.get("depth", 0) > 30:
-                        break
-
-            self.examineTasks.remove(asyncio.current_task())
+                    self.candidate_cache.update(epd, info)
+                    if info.get("multipv") == len(moves):
+                        self.showCandidateEvals(board)
+
+            self.showCandidateEvals(board)
+        except asyncio.CancelledError:
+            pass
+
+    def analysisBudgets(self, epd: str, haveStoredEval=False) -> list[tuple[float, int]]:
+        """
+        Returns the (dwell seconds, depth) searches to run on a position. A cheap
+        search starts straight away, and the deep one only once the user has stayed
+        on the position for the dwell time. Searches that the cache already covers
+        are skipped, as is the cheap search if there's an evaluation stored from
+        an imported game (unless configured otherwise).
+        """
+        engine_config = config().get("engine", {})
+        budgets = [
+            (
+                engine_config.get("dwell_seconds", DEFAULT_DWELL_SECONDS),
+                engine_config.get("max_depth", DEFAULT_MAX_DEPTH),
+            ),
+        ]
+        if not haveStoredEval or not engine_config.get(
+            "stored_eval_replaces_quick_search", True
+        ):
+            budgets.insert(
+                0, (0, engine_config.get("quick_depth", DEFAULT_QUICK_DEPTH))
+            )
+        cached_depth = self.analysis_cache.depth(epd)
+        return [(dwell, depth) for dwell, depth in budgets if depth > cached_depth]
+
+    @traced("analysis", lambda self, board, entered: {"epd": board.epd()})
+    async def examinePosition(self, board: chess.Board, entered: float):
+        """
+        Analyses the position, which was entered at the given time. Runs as the
+        analysis stage, so it's cancelled as soon as the position changes.
+        """
+        try:
+            epd = board.epd()
+            stored = None
+            if self.analysis_cache.get(epd) is None:
+                # Evaluations from imported lichess games are an instant first answer.
+                with asyncSpan("lookupEval", "analysis"):
+                    stored = await self.game_database.lookupEval(epd)
+                if stored is not None:
+                    score, depth = stored
+                    self.engine_output.submit(
+                        board, {"score": score, "depth": depth, "source": "lichess"}
+                    )
+
+            with asyncSpan("getEngine", "analysis"):
+                engine = await self.getEngine()
+
+            for dwell, depth in self.analysisBudgets(epd, stored is not None):
+                remaining = entered + dwell - time.monotonic()
+                if remaining > 0:
+                    with asyncSpan("dwell", "analysis", seconds=remaining):
+                        await asyncio.sleep(remaining)
+
+                # The engine keeps its hash table between searches, so going back over
+                # depths that are already cached is quick and those infos are not shown.
+                limit = chess.engine.Limit(depth=depth)
+                with asyncSpan("search", "analysis", depth=depth):
+                    with await engine.analysis(board, limit) as analysis:
+                        async for info in analysis:
+                            if self.analysis_cache.update(epd, info):
+                                self.engine_output.submit(board, info)
         except asyncio.CancelledError:
             pass
 
@@ -198,31 +344,78 @@ class Controller:
         return task
 
     def taskDone(self, task):
-        if task.exception():
+        # Tasks that are cancelled before they start never get to catch the
+        # CancelledError themselves.
+        if not task.cancelled() and task.exception():
             raise task.exception()
         self.backgroundTasks.discard(task)
 
     def scheduleLookupPositions(self, positions=None, *, lookupAllBookMoves=False):
         if positions is None:
-            positions = [self.game.board.epd()]
-        self.scheduleTask(self.lookupGamePositions(positions, self.userColor))
-        self.scheduleTask(
-            self.lookupOpeningPositions(
-                positions,
-                self.userColor,
-                self.game.ply,
+            positions = [self.game.getEpd()]
+        return [
+            self.scheduleTask(self.lookupGamePositions(positions, self.userColor)),
+            self.scheduleTask(
+                self.lookupOpeningPositions(
+                    positions,
+                    self.userColor,
+                    self.game.ply,
+                    lookupAllBookMoves=lookupAllBookMoves
+                )
+            ),
+        ]
+
+    def requestLookups(self, *, lookupAllBookMoves=False):
+        """
+        Looks up the position in the databases once navigation has been idle for
+        the lookup delay, then evaluates the moves found.
+        """
+
+        ply = self.game.ply
+
+        async def lookup():
+            board = self.game.analysisBoard(ply)
+            lookups = self.scheduleLookupPositions(
                 lookupAllBookMoves=lookupAllBookMoves
             )
-        )
+            # Not gather, so that cancelling this doesn't cancel the lookups.
+            await asyncio.wait(lookups)
+            if self.navigatedAt is not None and board.epd() == self.game.getEpd():
+                self.readyLatencies.append(time.monotonic() - self.navigatedAt)
+                self.navigatedAt = None
+            self.scheduler.request(
+                CANDIDATES_STAGE, lambda: self.evaluateCandidates(board, lookups)
+            )
 
-    def updateMoveListPosition(self):
-        new = self.game.getTurnAndNumber()
-        self.move_list.setCurrentMove(new, self.currentTurnAndNumber)
-        self.currentTurnAndNumber = new
+        self.scheduler.cancel(CANDIDATES_STAGE)
+        self.scheduler.request(LOOKUP_STAGE, lookup)
 
-        self.scheduleLookupPositions()
-        self.examineTasks.append(
-            self.scheduleTask(self.examinePosition(self.game.board.copy()))
+    def updateMoveListPosition(self):
+        """
+        Brings everything else up to date with the position on the board: the move
+        list and any cached analysis straight away, then the database lookups and
+        the engine analysis after their delays.
+        """
+        entered = time.monotonic()
+        board = self.game.board.copy()
+
+        def updateNow():
+            new = self.game.getTurnAndNumber()
+            self.move_list.setCurrentMove(new, self.currentTurnAndNumber)
+            self.currentTurnAndNumber = new
+
+            self.engine_output.clear()
+            cached = self.analysis_cache.get(board.epd())
+            if cached is not None:
+                self.engine_output.submit(board, cached.info())
+
+        self.scheduler.runNow(BOARD_STAGE, updateNow)
+        self.requestLookups()
+        # The board with its moves is only built once navigation has paused.
+        ply = self.game.ply
+        self.scheduler.request(
+            ANALYSIS_STAGE,
+            lambda: self.examinePosition(self.game.analysisBoard(ply), entered),
         )
 
     def updateBoard(self):
@@ -256,7 +449,13 @@ class Controller:
         if instant:
             self.chess_board.cancelAnimation()
 
+    def navigated(self):
+        """Notes that the user navigated, timing how long until the panes are ready."""
+        self.navigatedAt = time.monotonic()
+
     def firstMove(self):
+        self.navigated()
+        self.cancelNavigation()
         self.chess_board.cancelAnimation()
 
         self.game.goToStart()
@@ -265,6 +464,8 @@ class Controller:
         self.updateBoard()
 
     def lastMove(self):
+        self.navigated()
+        self.cancelNavigation()
         self.chess_board.cancelAnimation()
 
         self.game.goToEnd()
@@ -273,20 +474,71 @@ class Controller:
         self.updateBoard()
 
     def nextMove(self):
-        self.chess_board.cancelAnimation()
+        self.queueNavigation(1)
 
-        if not self.game.hasMoreMoves():
+    def previousMove(self):
+        self.queueNavigation(-1)
+
+    def queueNavigation(self, plies: int):
+        """
+        Queues a step through the game. If the board is still animating the previous
+        step then input is outpacing the animations, so the step is held until the
+        animation finishes and any further steps that arrive meanwhile are applied
+        together.
+        """
+        self.navigated()
+        self.navigation.push(plies)
+        if self.navigationFlush is None:
+            self.navigationFlush = asyncio.get_running_loop().call_later(
+                self.chess_board.animationRemaining() / 1000, self.flushNavigation
+            )
+
+    def cancelNavigation(self):
+        """Drops queued steps, e.g. because the user jumped to another move."""
+        if self.navigationFlush is not None:
+            self.navigationFlush.cancel()
+            self.navigationFlush = None
+        self.navigation.clear()
+
+    def flushNavigation(self):
+        """
+        Applies the queued steps. The board jumps straight to the position before
+        the target and only the final step is animated.
+        """
+        self.navigationFlush = None
+        plies = self.navigation.take()
+        if plies == 0:
             return
 
-        self.makeMove()
+        self.chess_board.cancelAnimation()
+        start = self.game.ply
+        if plies > 0:
+            self.game.advance(plies - 1)
+        else:
+            self.game.goToPly(max(0, start + plies + 1))
+        skipped = abs(self.game.ply - start)
+        if skipped:
+            self.chess_board.setupBoard(self.game.board)
+
+        animated = self.stepForward() if plies > 0 else self.stepBack()
+        if not animated:
+            if not skipped:
+                return
+            self.updateBoard()
 
         self.updateMoveListPosition()
+        self.navigation.record(abs(self.game.ply - start), skipped)
 
-    def previousMove(self):
-        self.chess_board.cancelAnimation()
+    def stepForward(self) -> bool:
+        if not self.game.hasMoreMoves():
+            return False
+
+        self.makeMove()
+        return True
 
+    def stepBack(self) -> bool:
         if not self.game.goBack():
-            return
+            return False
 
         (fromPos, toPos) = self.game.getFromSquare(), self.game.getToSquare()
 
@@ -310,14 +562,15 @@ class Controller:
             )
 
         self.chess_board.startAnimation()
-
-        self.updateMoveListPosition()
+        return True
 
     def move(self, move: chess.Move, instant=False):
         if self.game.board.is_legal(move):
+            self.navigated()
+            self.cancelNavigation()
             old = self.currentTurnAndNumber
             self.game.replaceNextMove(move)
-            move_text = self.game.game.next().san()
+            move_text = self.game.board.san(move)
             self.makeMove(instant=instant)
             self.currentTurnAndNumber = self.game.getTurnAndNumber()
             self.move_list.removeMoves(self.currentTurnAndNumber)
@@ -328,11 +581,12 @@ class Controller:
         else:
             return False
 
-    def moveFromSan(self, san):
+    def moveFromCode(self, code: int):
+        """Plays a move from the databases, encoded as in move_encoding.py."""
         self.chess_board.cancelAnimation()
         self.chess_board.clearClicks()
 
-        return self.move(self.game.board.parse_san(san))
+        return self.move(decodeMove(code))
 
     def getValidMoves(self, fromPos: chess.Square):
         return self.game.getValidMoves(fromPos)
@@ -342,16 +596,38 @@ class Controller:
 
     async def stop(self):
         self.stopped = True
+        self.cancelNavigation()
+        for name in self.scheduler.stages:
+            self.scheduler.cancel(name)
         await self.game_database.close()
         await self.opening_database.close()
 
+        engines = []
+        starts = [self.engine_start, self.candidate_engine]
+        self.engine_start = self.candidate_engine = None
+        for start in starts:
+            if start is None or start.cancelled():
+                continue
+            # One still starting is waited for rather than cancelled, which could
+            # leave its process running.
+            try:
+                _, engine = await start
+                engines.append(engine)
+            except (chess.engine.EngineError, OSError):
+                pass
+        for engine in engines:
+            if engine is not None:
+                try:
+                    await engine.quit()
+                except chess.engine.EngineError:
+                    pass
+
     def selectMove(self, turn, number):
+        self.navigated()
+        self.cancelNavigation()
         self.chess_board.cancelAnimation()
 
-        self.game.goToStart()
-        self.game.advance(number * 2 - 1)
-        if turn == chess.BLACK:
-            self.game.advance()
+        self.game.goToPly((number - 1) * 2 + 1 + (turn == chess.BLACK))
 
         self.chess_board.setupBoard(self.game.board)
         self.updateMoveListPosition()
@@ -360,4 +636,4 @@ class Controller:
     def rotateBoard(self):
         self.userColor = chess.WHITE if self.userColor == chess.BLACK else chess.BLACK
         self.chess_board.rotate(self.userColor)
-        self.scheduleLookupPositions(lookupAllBookMoves=True)
+        self.requestLookups(lookupAllBookMoves=True)
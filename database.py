@@ -1,9 +1,20 @@
 import abc
 import aiosqlite
 import asyncio
+import logging
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 
 import chess
+import chess.engine
 import chess.pgn
+from migrate_move_codes import MOVE_CODES_VERSION
+from pgn_compression import DICTIONARIES_SQL, PgnCodec
+from position_index import SOURCE_SQL, IndexSource, PositionIndex
+from tracing import traced
 
 # Open a database from a given file name
 
@@ -12,6 +23,10 @@ import chess.pgn
 # b) successor moves
 
 
+class NotMigratedError(RuntimeError):
+    """The database stores moves as SAN rather than move codes."""
+
+
 class ChessDatabase(object):
     __metaclass__ = abc.ABCMeta
 
@@ -23,11 +38,47 @@ class ChessDatabase(object):
         self.cache = {}
         self.file = database_file
         self.con = None
+        # Positions looked up that were cached or already being queried, positions
+        # that had to be queried, and the queries running.
+        self.hits = 0
+        self.misses = 0
+        self.inFlight = 0
+
+    def traceArgs(self, epds: list[str]) -> dict:
+        return {"database": type(self).__name__, "positions": len(epds)}
 
     async def conn(self):
         if self.con is None:
-            self.con = asyncio.ensure_future(aiosqlite.connect(self.file))
-        return await self.con
+            self.con = asyncio.ensure_future(self.connect())
+        con = self.con
+        try:
+            return await con
+        except Exception:
+            # Connecting is tried again next time, e.g. once the database has been
+            # migrated.
+            if self.con is con:
+                self.con = None
+            raise
+
+    async def connect(self):
+        con = await aiosqlite.connect(self.file)
+        async with con.execute("PRAGMA user_version") as cur:
+            (version,) = await cur.fetchone()
+        if version < MOVE_CODES_VERSION:
+            async with con.execute(
+                "SELECT COUNT(1) FROM sqlite_master WHERE type = 'table'"
+            ) as cur:
+                (tables,) = await cur.fetchone()
+            if tables:
+                await con.close()
+                raise NotMigratedError(
+                    f"{self.file} stores moves as SAN, run migrate_move_codes.py on it"
+                )
+            # A new database, e.g. created by connecting to a missing file, which
+            # will be written with move codes.
+            await con.execute(f"PRAGMA user_version = {MOVE_CODES_VERSION}")
+            await con.commit()
+        return con
 
     @abc.abstractmethod
     async def findMultipleEpdsFromTable(self, cur, color: chess.Color):
@@ -43,11 +94,12 @@ class ChessDatabase(object):
             DELETE FROM temp_positions;
             """
         )
+        # Positions repeated in a mainline would otherwise be counted again.
         await cur.executemany(
             """
             INSERT INTO temp_positions VALUES (?);
             """,
-            [(epd,) for epd in epds],
+            [(epd,) for epd in dict.fromkeys(epds)],
         )
         await self.findMultipleEpdsFromTable(cur, color)
 
@@ -56,29 +108,30 @@ class ChessDatabase(object):
         """Given a single EPD, find all the lines that contain that position."""
         pass
 
+    @traced("database", lambda self, epds, color: self.traceArgs(epds))
     async def populateCache(self, epds: list[str], color: chess.Color):
         future = asyncio.get_event_loop().create_future()
         for epd in epds:
             self.cache[(color, epd)] = future
 
-        con = await self.conn()
-
-        async with con.cursor() as cur:
-            if len(epds) > 1:
-                await self.findMultipleEpds(cur, epds, color)
+        self.inFlight += 1
+        try:
+            await self.queryPositions(epds, color)
+        except BaseException as e:
+            # Forgets the positions so that they're queried again next time, and
+            # passes the failure on to lookups waiting for them.
+            for epd in epds:
+                if self.cache.get((color, epd)) is future:
+                    del self.cache[(color, epd)]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
             else:
-                await self.findSingleEpd(cur, epds[0], color)
-
-            results = {}
-            async for (epd, next_move, count, user_plays_white, *extras) in cur:
-                row = (next_move, count, user_plays_white, *extras)
-                color_epd = (user_plays_white, epd)
-                if color_epd not in results:
-                    results[color_epd] = set()
-                results[color_epd].add(row)
-
-            for color_epd, row in results.items():
-                self.cache[color_epd] = row
+                future.set_exception(e)
+                # Retrieved so it isn't logged as unhandled if nothing was waiting.
+                future.exception()
+            raise
+        finally:
+            self.inFlight -= 1
 
         for epd in epds:
             if self.cache[(color, epd)] == future:
@@ -86,6 +139,34 @@ class ChessDatabase(object):
 
         future.set_result(True)
 
+    async def queryPositions(self, epds: list[str], color: chess.Color):
+        results = {}
+        rows = await self.fetchRows(epds, color)
+        for (epd, next_move, count, user_plays_white, *extras) in rows:
+            row = (next_move, count, user_plays_white, *extras)
+            color_epd = (user_plays_white, epd)
+            if color_epd not in results:
+                results[color_epd] = set()
+            results[color_epd].add(row)
+
+        for color_epd, row in results.items():
+            self.cache[color_epd] = row
+
+    async def fetchRows(self, epds: list[str], color: chess.Color) -> list[tuple]:
+        """
+        Finds the moves played from the positions, as rows of (epd, next_move,
+        count, user_plays_white, *extras).
+        """
+        con = await self.conn()
+
+        async with con.cursor() as cur:
+            if len(epds) > 1:
+                await self.findMultipleEpds(cur, epds, color)
+            else:
+                await self.findSingleEpd(cur, epds[0], color)
+            return await cur.fetchall()
+
+    @traced("database", lambda self, epds, color: self.traceArgs(epds))
     async def lookupPositions(self, epds: list[str], color: chess.Color):
         unknown_epds = [
             epd for epd in epds if type(self.cache.get((color, epd))) is not set
@@ -93,6 +174,8 @@ class ChessDatabase(object):
         really_unknown_epds = [
             epd for epd in unknown_epds if self.cache.get((color, epd)) is None
         ]
+        self.misses += len(really_unknown_epds)
+        self.hits += len(epds) - len(really_unknown_epds)
 
         if really_unknown_epds:
             await self.populateCache(really_unknown_epds, color)
@@ -107,16 +190,377 @@ class ChessDatabase(object):
         return self.cache[(color, epds[0])]
 
     async def close(self):
-        if self.con is not None:
-            await (await self.conn()).close()
+        if self.con is None:
+            return
+        try:
+            con = await self.con
+        except NotMigratedError:
+            # It was never opened, see connect.
+            return
+        await con.close()
+
+
+GAME_LIST_PAGE_SIZE = 200
+EVAL_CACHE_SIZE = 4096
+
+# Each filter's index ends with the list's sort order, so a page of filtered games is
+# read straight off an index instead of sorting every match.
+GAME_LIST_INDEXES = """
+CREATE INDEX IF NOT EXISTS games_date ON games (date, game_id);
+CREATE INDEX IF NOT EXISTS games_white_date ON games (white, date, game_id);
+CREATE INDEX IF NOT EXISTS games_black_date ON games (black, date, game_id);
+CREATE INDEX IF NOT EXISTS games_time_control_date
+ON games (time_control, date, game_id);
+CREATE INDEX IF NOT EXISTS games_eco_date ON games (eco, date, game_id);
+CREATE INDEX IF NOT EXISTS games_opening ON games (opening);
+"""
+
+ECO_REGEX = re.compile(r"^[A-Ea-e][0-9]{0,2}$")
+
+
+class GameFilter(NamedTuple):
+    """Which of the user's games to list. None matches anything."""
+
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    opponent: Optional[str] = None
+    color: Optional[chess.Color] = None
+    # "win", "draw" or "loss" from the user's side.
+    result: Optional[str] = None
+    time_control: Optional[str] = None
+    # An ECO code (or the start of one) or the start of the opening's name.
+    opening: Optional[str] = None
+
+
+class GameSummary(NamedTuple):
+    game_id: int
+    date: str
+    white: str
+    black: str
+    result: str
+    time_control: Optional[str]
+    eco: Optional[str]
+    opening: Optional[str]
+
+
+def prefixRange(prefix: str) -> tuple[str, str]:
+    """Returns bounds [low, high) of the strings that start with prefix."""
+    return (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def gameListQuery(
+    filter: GameFilter,
+    username: str,
+    after: Optional[tuple[str, int]] = None,
+    limit: int = GAME_LIST_PAGE_SIZE,
+) -> tuple[str, list]:
+    """
+    Builds the query for a page of games, newest first.
+
+    Pages are keyed on the (date, game_id) of the last game of the previous page
+    rather than using OFFSET, so later pages cost the same as the first.
+
+    Returns:
+        tuple[str, list]: The SQL and its parameters.
+    """
+    conditions = []
+    params = []
+
+    if filter.date_from:
+        conditions.append("date >= ?")
+        params.append(filter.date_from)
+    if filter.date_to:
+        # Dates have times, so everything on the last day is before the next one.
+        conditions.append("date < date(?, '+1 day')")
+        params.append(filter.date_to)
+
+    # Every game is the user's, so an index on their name doesn't narrow anything
+    # down. The unary + stops SQLite using one so it picks a selective index.
+    if filter.color == chess.WHITE:
+        conditions.append("+white = ?")
+        params.append(username)
+    elif filter.color == chess.BLACK:
+        conditions.append("+black = ?")
+        params.append(username)
+
+    if filter.opponent:
+        if filter.color == chess.WHITE:
+            conditions.append("black = ?")
+            params.append(filter.opponent)
+        elif filter.color == chess.BLACK:
+            conditions.append("white = ?")
+            params.append(filter.opponent)
+        else:
+            conditions.append(
+                "((+white = ? AND black = ?) OR (+black = ? AND white = ?))"
+            )
+            params += [username, filter.opponent, username, filter.opponent]
+
+    if filter.result == "draw":
+        conditions.append("result = '1/2-1/2'")
+    elif filter.result in ("win", "loss"):
+        white_result, black_result = (
+            ("1-0", "0-1") if filter.result == "win" else ("0-1", "1-0")
+        )
+        if filter.color == chess.WHITE:
+            conditions.append("result = ?")
+            params.append(white_result)
+        elif filter.color == chess.BLACK:
+            conditions.append("result = ?")
+            params.append(black_result)
+        else:
+            conditions.append(
+                "((+white = ? AND result = ?) OR (+black = ? AND result = ?))"
+            )
+            params += [username, white_result, username, black_result]
+
+    if filter.time_control:
+        conditions.append("time_control = ?")
+        params.append(filter.time_control)
+
+    if filter.opening:
+        column = "eco" if ECO_REGEX.match(filter.opening) else "opening"
+        prefix = filter.opening.upper() if column == "eco" else filter.opening
+        conditions.append(f"{column} >= ? AND {column} < ?")
+        params += prefixRange(prefix)
+
+    if after is not None:
+        conditions.append("(date, game_id) < (?, ?)")
+        params += after
+
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    sql = f"""
+        SELECT game_id, date, white, black, result, time_control, eco, opening
+        FROM games
+        {where}
+        ORDER BY date DESC, game_id DESC
+        LIMIT ?
+        """
+    params.append(limit)
+    return sql, params
 
 
 class GameDatabase(ChessDatabase):
-    def __init__(self, database_file, *, username=None):
+    def __init__(
+        self, database_file, *, username=None, position_index=None, columns=False
+    ):
+        """
+        Args:
+            position_index: A file built by position_index.py to look positions up
+                in instead of the database, while it's up to date with it.
+            columns: Whether to load the games' moves into memory with
+                game_columns.py when first looked up, and look positions up there.
+        """
         super(GameDatabase, self).__init__(
             database_file=database_file,
         )
         self.username = username
+        # Least recently looked up first.
+        self.evalCache = OrderedDict()
+        self.hasGameListIndexes = False
+        self.positionIndexFile = position_index
+        self.useColumns = columns
+        self.pgnCodec = None
+        # What positions are looked up in instead of the SQL, once it's opened.
+        self.backend = None
+
+    async def openBackend(self):
+        """
+        Opens what positions are looked up in instead of the SQL, or returns None if
+        there isn't anything usable. Either has a rows method like fetchRows.
+        """
+        if self.useColumns:
+            # Checks the database stores move codes, see connect.
+            await self.conn()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, self.loadColumns
+                )
+            except (ImportError, sqlite3.Error) as e:
+                logging.warning("Not loading the games into memory: %s", e)
+        if self.positionIndexFile is not None:
+            try:
+                return await self.openPositionIndex()
+            except sqlite3.Error as e:
+                logging.warning("Not using the position index: %s", e)
+        return None
+
+    def loadColumns(self):
+        # Imported here so that NumPy is only needed by those using it.
+        from game_columns import GameColumns
+
+        start = time.perf_counter()
+        con = sqlite3.connect(self.file)
+        try:
+            columns = GameColumns.load(con, self.username)
+        finally:
+            con.close()
+        logging.info(
+            "Loaded %d game positions into %.1fMB in %.1fs",
+            len(columns.hashes),
+            columns.nbytes() / (1 << 20),
+            time.perf_counter() - start,
+        )
+        return columns
+
+    def backendBytes(self) -> Optional[int]:
+        """The memory the loaded game columns take, if they're being used."""
+        if self.backend is None or not self.backend.done():
+            return None
+        backend = self.backend.result()
+        return backend.nbytes() if hasattr(backend, "nbytes") else None
+
+    async def openPositionIndex(self) -> Optional[PositionIndex]:
+        """Opens the position index, or returns None if it can't be used."""
+        try:
+            index = PositionIndex(self.positionIndexFile)
+        except (OSError, ValueError) as e:
+            logging.warning("Not using the position index: %s", e)
+            return None
+
+        con = await self.conn()
+        async with con.execute(SOURCE_SQL) as cur:
+            source = IndexSource(self.username, *await cur.fetchone())
+        if index.source != source:
+            logging.warning(
+                "Not using the position index %s as it was built from different "
+                "games, run position_index.py to rebuild it",
+                self.positionIndexFile,
+            )
+            index.close()
+            return None
+        return index
+
+    async def fetchRows(self, epds: list[str], color: chess.Color) -> list[tuple]:
+        if self.backend is None:
+            self.backend = asyncio.ensure_future(self.openBackend())
+        opening = self.backend
+        try:
+            backend = await opening
+        except Exception:
+            # Opened again next time, e.g. once the database has been migrated.
+            if self.backend is opening:
+                self.backend = None
+            raise
+        if backend is None:
+            return await super().fetchRows(epds, color)
+        # A whole game's positions are looked up in one call.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, backend.rows, epds
+        )
+
+    async def close(self):
+        if self.backend is not None:
+            try:
+                backend = await self.backend
+            except Exception:
+                backend = None
+            if isinstance(backend, PositionIndex):
+                backend.close()
+            self.backend = None
+        await super().close()
+
+    async def ensureGameListIndexes(self):
+        """Creates the indexes behind the game list's filters, if they're missing."""
+        if self.hasGameListIndexes:
+            return
+        con = await self.conn()
+        await con.executescript(GAME_LIST_INDEXES)
+        await con.commit()
+        self.hasGameListIndexes = True
+
+    async def listGames(
+        self,
+        filter: GameFilter,
+        after: Optional[tuple[str, int]] = None,
+        limit: int = GAME_LIST_PAGE_SIZE,
+    ) -> list[GameSummary]:
+        """
+        Gets a page of the games matching the filter, newest first.
+
+        Args:
+            after: The (date, game_id) of the last game of the previous page.
+        """
+        await self.ensureGameListIndexes()
+        sql, params = gameListQuery(filter, self.username, after, limit)
+        con = await self.conn()
+        async with con.execute(sql, params) as cur:
+            return [GameSummary(*row) for row in await cur.fetchall()]
+
+    async def loadPgnCodec(self) -> PgnCodec:
+        con = await self.conn()
+        try:
+            async with con.execute(DICTIONARIES_SQL) as cur:
+                return PgnCodec([data for (data,) in await cur.fetchall()])
+        except sqlite3.OperationalError:
+            # The PGNs haven't been compressed, see compress_pgns.py.
+            return PgnCodec()
+
+    async def loadGamePgn(self, game_id: int) -> Optional[str]:
+        con = await self.conn()
+        async with con.execute(
+            "SELECT pgn FROM games WHERE game_id = ?", (game_id,)
+        ) as cur:
+            row = await cur.fetchone()
+        if row is None:
+            return None
+        if self.pgnCodec is None:
+            self.pgnCodec = await self.loadPgnCodec()
+        try:
+            return self.pgnCodec.decompress(row[0])
+        except ValueError:
+            # Compressed with a dictionary added since the codec was loaded.
+            self.pgnCodec = await self.loadPgnCodec()
+            return self.pgnCodec.decompress(row[0])
+
+    async def lookupEval(self, epd: str) -> Optional[tuple[chess.engine.PovScore, int]]:
+        """
+        Looks up the evaluation of a position stored from the [%eval] annotations of
+        imported games.
+
+        Returns:
+            Optional[tuple[PovScore, int]]: The score and search depth (which may be
+            None), or None if no game had an evaluation for the position.
+        """
+        if epd in self.evalCache:
+            self.evalCache.move_to_end(epd)
+            return self.evalCache[epd]
+
+        try:
+            con = await self.conn()
+        except NotMigratedError:
+            # Not cached, so that evaluations are found once it's migrated.
+            return None
+        try:
+            async with con.execute(
+                """
+                SELECT cp, mate, depth
+                FROM positions p
+                JOIN position_evals e
+                ON p.pos_id = e.pos_id
+                WHERE p.epd = ?
+                """,
+                (epd,),
+            ) as cur:
+                row = await cur.fetchone()
+        except sqlite3.OperationalError:
+            # Databases created before evaluations were stored don't have the table.
+            row = None
+
+        if row is None:
+            result = None
+        else:
+            cp, mate, depth = row
+            if mate is not None:
+                score = chess.engine.Mate(mate)
+            else:
+                score = chess.engine.Cp(cp)
+            result = (chess.engine.PovScore(score, chess.WHITE), depth)
+
+        self.evalCache[epd] = result
+        while len(self.evalCache) > EVAL_CACHE_SIZE:
+            self.evalCache.popitem(last=False)
+        return result
 
     async def findMultipleEpdsFromTable(self, cur, color: chess.Color):
         await cur.execute(
@@ -165,6 +609,32 @@ class GameDatabase(ChessDatabase):
 class OpeningDatabase(ChessDatabase):
     def __init__(self, database_file):
         super(OpeningDatabase, self).__init__(database_file=database_file)
+        self.hasMoveEvals = None
+
+    async def moveEvalsSql(self, cur) -> tuple[str, str]:
+        """
+        Returns the (select columns, join) SQL adding the flagged and drop_cp columns
+        written by verify_openings.py, or NULL columns if it hasn't been run.
+        """
+        if self.hasMoveEvals is None:
+            await cur.execute(
+                """
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name = 'opening_move_evals'
+                """
+            )
+            self.hasMoveEvals = await cur.fetchone() is not None
+
+        if not self.hasMoveEvals:
+            return "NULL AS flagged, NULL AS drop_cp", ""
+
+        return (
+            "MAX(m.flagged) AS flagged, MAX(m.drop_cp) AS drop_cp",
+            """
+            LEFT JOIN opening_move_evals m
+            ON m.pos_id = p.pos_id AND m.next_move = g.next_move
+            """,
+        )
 
     async def findMultipleEpds(self, cur, epds: list[str], color: chess.Color):
         await cur.executescript(
@@ -177,13 +647,15 @@ class OpeningDatabase(ChessDatabase):
             """
             INSERT INTO temp_positions VALUES (?);
             """,
-            [(epd,) for epd in epds],
+            [(epd,) for epd in dict.fromkeys(epds)],
         )
 
+        eval_columns, eval_join = await self.moveEvalsSql(cur)
         await cur.execute(
             f"""
             SELECT p.epd,
-                next_move, COUNT(1) AS count, o.for_white AS user_plays_white
+                g.next_move, COUNT(1) AS count, o.for_white AS user_plays_white,
+                {eval_columns}
             FROM positions p
             JOIN opening_positions g
             ON p.pos_id = g.pos_id
@@ -191,25 +663,29 @@ class OpeningDatabase(ChessDatabase):
             ON o.opening_id = g.opening_id
             JOIN temp_positions
             ON p.epd = temp_positions.epd
+            {eval_join}
             WHERE o.for_white = ?
-            GROUP BY p.epd, next_move
+            GROUP BY p.epd, g.next_move
             ORDER BY p.epd, count DESC
             """,
             (int(color == chess.WHITE),),
         )
 
     async def findSingleEpd(self, cur, epd: str, color: chess.Color):
+        eval_columns, eval_join = await self.moveEvalsSql(cur)
         await cur.execute(
             f"""
             SELECT p.epd,
-                next_move, COUNT(1) AS count, o.for_white AS user_plays_white
+                g.next_move, COUNT(1) AS count, o.for_white AS user_plays_white,
+                {eval_columns}
             FROM positions p
             JOIN opening_positions g
             ON p.pos_id = g.pos_id
             JOIN openings o
             ON o.opening_id = g.opening_id
+            {eval_join}
             WHERE p.epd = ? AND o.for_white = ?
-            GROUP BY next_move
+            GROUP BY g.next_move
             ORDER BY p.epd, count DESC
             """,
             (epd, int(color == chess.WHITE)),
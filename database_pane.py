@@ -1,7 +1,23 @@
+from typing import NamedTuple, Optional
+
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtCore import QRectF, Qt
 from PySide6.QtGui import QColor, QColorConstants
-from PySide6.QtWidgets import QLabel, QWidget, QSizePolicy
+
+from move_encoding import codeSan
+from tracing import traced
+
+MOVE_COLUMN = 0
+TOTAL_COLUMN = 1
+WIN_DRAW_LOSS_COLUMN = 2
+EVAL_COLUMN = 3
+
+NUM_COLUMNS = 4
+
+DEFAULT_VISIBLE_MOVES = 10
+BAR_HEIGHT = 20
+
+MOVE_STATS_ROLE = Qt.UserRole
 
 
 def roundedPercentage(value):
@@ -9,54 +25,210 @@ def roundedPercentage(value):
     return round(value)
 
 
-class ClickableLabel(QLabel):
-    def __init__(self, text, callback):
-        super().__init__(text)
-        self.callback = callback
+class MoveStats(NamedTuple):
+    """One row of a moves pane: how often a move was played and how it went."""
 
-    def mousePressEvent(self, ev: QtGui.QMouseEvent) -> None:
-        self.callback()
+    # The move, encoded as in move_encoding.py.
+    code: int
+    total: int
+    wins: int
+    draws: int
+    losses: int
+    # Set by verify_openings.py for book moves the engine disagrees with.
+    flagged: bool = False
+    drop_cp: Optional[int] = None
 
 
-class TableLabel(ClickableLabel):
-    MOVE_STYLE = """
-    padding: 4px 4px 4px 2px;
-    color: white;
+class MovesModel(QtCore.QAbstractTableModel):
+    """
+    The moves played from a position, most popular first. Only the first limit
+    moves are shown, followed by a row to show the rest. New moves are diffed
+    against the current rows so unchanged rows stay put.
     """
 
-    def __init__(self, callback, text, align):
-        super().__init__(text, callback)
-        self.setStyleSheet(TableLabel.MOVE_STYLE)
-        self.setAlignment(align | QtCore.Qt.AlignVCenter)
+    FLAGGED_MOVE_COLOR = QColor(0xFF6F60)
+
+    moves: list[MoveStats]
+    rows: list[MoveStats]
+    evals: dict[int, str]
+    expanderShown: bool
+    epd: Optional[str]
+
+    def __init__(self, limit: int = DEFAULT_VISIBLE_MOVES):
+        super().__init__()
+        self.moves = []
+        self.rows = []
+        self.evals = {}
+        self.expanderShown = False
+        self.epd = None
+        self.defaultLimit = limit
+        self.limit = limit
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.rows) + self.expanderShown
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else NUM_COLUMNS
+
+    def hiddenMoves(self) -> int:
+        return len(self.moves) - len(self.rows)
+
+    def isExpander(self, index: QtCore.QModelIndex) -> bool:
+        return index.row() == len(self.rows)
+
+    def moveAt(self, index: QtCore.QModelIndex) -> Optional[MoveStats]:
+        return None if self.isExpander(index) else self.rows[index.row()]
+
+    def data(self, index: QtCore.QModelIndex, role=Qt.DisplayRole):
+        column = index.column()
+        move = self.moveAt(index)
+        if move is None:
+            if role == Qt.DisplayRole and column == WIN_DRAW_LOSS_COLUMN:
+                return f"Show {self.hiddenMoves()} more moves"
+            return None
+
+        if role == Qt.DisplayRole:
+            if column == MOVE_COLUMN:
+                # Only the rows shown are converted to SAN.
+                return codeSan(self.epd, move.code)
+            elif column == TOTAL_COLUMN:
+                return str(move.total)
+            elif column == EVAL_COLUMN:
+                return self.evals.get(move.code, "")
+        elif role == MOVE_STATS_ROLE:
+            return move
+        elif role == Qt.TextAlignmentRole:
+            align = Qt.AlignLeft if column == MOVE_COLUMN else Qt.AlignRight
+            return align | Qt.AlignVCenter
+        elif role == Qt.ForegroundRole:
+            if column == MOVE_COLUMN and move.flagged:
+                return MovesModel.FLAGGED_MOVE_COLOR
+            return QColorConstants.White
+        elif role == Qt.ToolTipRole:
+            if column == MOVE_COLUMN and move.flagged:
+                return f"Engine evaluation drops by {move.drop_cp / 100:.2f}"
+        return None
+
+    def setMoves(self, epd: str, moves: list[MoveStats]):
+        """
+        Shows the moves for a new position. Rows for moves that are still present
+        are moved or updated in place rather than the model being reset.
+        """
+        had_evals = bool(self.evals)
+        self.evals = {}
+        self.limit = self.defaultLimit
+        moved = epd != self.epd
+        self.epd = epd
+        self.moves = sorted(moves, key=lambda move: (-move.total, move.code))
+        self.diffRows(self.moves[: self.limit])
+        if moved and self.rows:
+            # A row kept for the same move code may have different SAN here.
+            self.dataChanged.emit(
+                self.index(0, MOVE_COLUMN), self.index(len(self.rows) - 1, MOVE_COLUMN)
+            )
+        if had_evals and self.rows:
+            # Rows diffRows kept unchanged would otherwise still show the old evals.
+            self.dataChanged.emit(
+                self.index(0, EVAL_COLUMN), self.index(len(self.rows) - 1, EVAL_COLUMN)
+            )
+
+    def expand(self):
+        """Shows all of the moves rather than just the most popular ones."""
+        self.limit = len(self.moves)
+        self.diffRows(self.moves)
+
+    def diffRows(self, rows: list[MoveStats]):
+        if self.expanderShown:
+            self.beginRemoveRows(QtCore.QModelIndex(), len(self.rows), len(self.rows))
+            self.expanderShown = False
+            self.endRemoveRows()
+
+        wanted = {row.code for row in rows}
+        for i in reversed(range(len(self.rows))):
+            if self.rows[i].code not in wanted:
+                self.beginRemoveRows(QtCore.QModelIndex(), i, i)
+                del self.rows[i]
+                self.endRemoveRows()
+
+        for i, row in enumerate(rows):
+            current = next(
+                (j for j in range(i, len(self.rows)) if self.rows[j].code == row.code),
+                None,
+            )
+            if current is None:
+                self.beginInsertRows(QtCore.QModelIndex(), i, i)
+                self.rows.insert(i, row)
+                self.endInsertRows()
+                continue
+            if current != i:
+                self.beginMoveRows(
+                    QtCore.QModelIndex(), current, current, QtCore.QModelIndex(), i
+                )
+                self.rows.insert(i, self.rows.pop(current))
+                self.endMoveRows()
+            if self.rows[i] != row:
+                self.rows[i] = row
+                self.dataChanged.emit(self.index(i, 0), self.index(i, NUM_COLUMNS - 1))
+
+        if self.hiddenMoves() > 0:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self.rows), len(self.rows))
+            self.expanderShown = True
+            self.endInsertRows()
+
+    def setEvals(self, evals: dict[int, str]):
+        self.evals = evals
+        if self.rows:
+            self.dataChanged.emit(
+                self.index(0, EVAL_COLUMN), self.index(len(self.rows) - 1, EVAL_COLUMN)
+            )
+
 
+class WinDrawLossDelegate(QtWidgets.QStyledItemDelegate):
+    """Paints a move's wins, draws and losses as a bar of percentages."""
 
-class WinDrawLossWidget(ClickableLabel):
     WIN_COLOR = QColor(0x3E9833)
     DRAW_COLOR = QColorConstants.Gray
     LOSS_COLOR = QColor(0xD32F2F)
 
-    win_percentage: int
-    draw_percentage: int
-    loss_percentage: int
-
-    def draw(self):
-        width = self.width()
-        win_width = round(width / 100 * self.win_percentage)
-        draw_width = round(width / 100 * self.draw_percentage)
+    def paint(
+        self,
+        painter: QtGui.QPainter,
+        option: QtWidgets.QStyleOptionViewItem,
+        index: QtCore.QModelIndex,
+    ) -> None:
+        move = index.data(MOVE_STATS_ROLE)
+        if move is None:
+            # The row that expands the list.
+            painter.setPen(QColorConstants.White)
+            painter.drawText(option.rect, Qt.AlignCenter, index.data())
+            return
+
+        win_percentage = roundedPercentage(move.wins / move.total)
+        draw_percentage = roundedPercentage(move.draws / move.total)
+        loss_percentage = roundedPercentage(move.losses / move.total)
+
+        left = option.rect.left()
+        top = option.rect.top() + (option.rect.height() - BAR_HEIGHT) // 2
+        width = option.rect.width()
+        win_width = round(width / 100 * win_percentage)
+        draw_width = round(width / 100 * draw_percentage)
         loss_width = width - win_width - draw_width
-        canvas = QtGui.QPixmap(width, 20)
-        painter = QtGui.QPainter(canvas)
-        painter.fillRect(0, 0, win_width, 20, self.WIN_COLOR)
-        painter.fillRect(win_width, 0, draw_width, 20, self.DRAW_COLOR)
+
+        painter.fillRect(left, top, win_width, BAR_HEIGHT, self.WIN_COLOR)
         painter.fillRect(
-            win_width + draw_width,
-            0,
+            left + win_width, top, draw_width, BAR_HEIGHT, self.DRAW_COLOR
+        )
+        painter.fillRect(
+            left + win_width + draw_width,
+            top,
             loss_width,
-            20,
+            BAR_HEIGHT,
             self.LOSS_COLOR,
         )
 
-        def drawPercentageText(left, width, value, color):
+        def drawPercentageText(offset, width, value, color):
             MINIMUM_WIDTH = 18
             MINIMUM_WIDTH_WITH_SIGN = 30
             if width > MINIMUM_WIDTH:
@@ -65,117 +237,129 @@ class WinDrawLossWidget(ClickableLabel):
                     text += "%"
                 painter.setPen(color)
                 painter.drawText(
-                    QRectF(left, 0, width, 20),
+                    QRectF(left + offset, top, width, BAR_HEIGHT),
                     Qt.AlignCenter,
                     text,
                 )
 
-        drawPercentageText(0, win_width, self.win_percentage, QColorConstants.White)
+        drawPercentageText(0, win_width, win_percentage, QColorConstants.White)
         drawPercentageText(
             win_width,
             draw_width,
-            self.draw_percentage,
+            draw_percentage,
             QColorConstants.Black,
         )
         drawPercentageText(
             width - loss_width,
             loss_width,
-            self.loss_percentage,
+            loss_percentage,
             QColorConstants.White,
         )
 
-        painter.end()
-        self.setPixmap(canvas)
-
-    def __init__(self, callback, wins, draws, losses, total_moves):
-        super().__init__(None, callback)
-        self.win_percentage = roundedPercentage(wins / total_moves)
-        self.draw_percentage = roundedPercentage(draws / total_moves)
-        self.loss_percentage = roundedPercentage(losses / total_moves)
 
-        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-        self.draw()
-
-    def sizeHint(self) -> QtCore.QSize:
-        return QtCore.QSize(100, 20)
-
-    def minimumSizeHint(self) -> QtCore.QSize:
-        return QtCore.QSize(100, 20)
+class MovesPane(QtWidgets.QTableView):
+    """
+    Table of the moves played from the current position. Clicking a move plays it
+    on the board.
+    """
 
-    def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
-        self.draw()
-        return super().resizeEvent(event)
+    PADDING = QtCore.QMargins(2, 4, 4, 4)
 
+    movesModel: MovesModel
+    placeholder: str
 
-class DatabasePane(QtWidgets.QScrollArea):
     def __init__(self):
         super().__init__()
-        self.setMoves([], None)
-        self.setWidgetResizable(True)
-        (left, _, right, _) = self.move_grid.getContentsMargins()
-        self.setMinimumWidth(50 + 60 + 100 + left + right + 2)
+        self.controller = None
+        self.placeholder = ""
+        self.movesModel = MovesModel()
+        self.setModel(self.movesModel)
+        self.setItemDelegateForColumn(WIN_DRAW_LOSS_COLUMN, WinDrawLossDelegate(self))
+
+        self.horizontalHeader().hide()
+        self.verticalHeader().hide()
+        self.setShowGrid(False)
+        self.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setFocusPolicy(Qt.NoFocus)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 
-    def setMovesText(self, text):
-        self.widget = QLabel(text)
-        self.widget.setAlignment(Qt.AlignTop | Qt.AlignHCenter)
-        self.setWidget(self.widget)
-        self.widget.setContentsMargins(0, 5, 0, 0)
+        vertical = self.verticalHeader()
+        vertical.setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        vertical.setDefaultSectionSize(
+            max(BAR_HEIGHT, self.fontMetrics().height())
+            + MovesPane.PADDING.top()
+            + MovesPane.PADDING.bottom()
+        )
+        horizontal = self.horizontalHeader()
+        horizontal.setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        horizontal.setSectionResizeMode(
+            WIN_DRAW_LOSS_COLUMN, QtWidgets.QHeaderView.Stretch
+        )
+        for column, width in (
+            (MOVE_COLUMN, 50),
+            (TOTAL_COLUMN, 60),
+            (WIN_DRAW_LOSS_COLUMN, 100),
+            (EVAL_COLUMN, 50),
+        ):
+            self.setColumnWidth(column, width)
+        self.setMinimumWidth(50 + 60 + 100 + 50 + 2)
+
+        self.clicked.connect(self.moveClicked)
+        self.setPlaceholder("No moves found in database")
+
+    def moveStats(self, move) -> MoveStats:
+        """Converts a row from the database lookup into a MoveStats."""
+        (code, total, _, wins, draws, losses) = move[:6]
+        return MoveStats(code, total, wins, draws, losses)
+
+    def moveClicked(self, index: QtCore.QModelIndex):
+        move = self.movesModel.moveAt(index)
+        if move is None:
+            self.movesModel.expand()
+        elif self.controller is not None:
+            self.controller.moveFromCode(move.code)
+
+    def setPlaceholder(self, text: str):
+        """Sets the text shown while there are no moves to show."""
+        self.placeholder = text
+        self.viewport().update()
 
     def setMovesLoading(self):
-        self.setMovesText("Loading moves...")
-
+        # The previous moves stay until the new ones arrive rather than flickering.
+        self.setPlaceholder("Loading moves...")
+
+    def setMoveEvals(self, evals: dict[int, str]):
+        """Annotates each move row with the engine evaluation of that move."""
+        self.movesModel.setEvals(evals)
+
+    @traced(
+        "pane",
+        lambda self, moves, controller: {
+            "pane": type(self).__name__,
+            "moves": len(moves),
+        },
+    )
     def setMoves(self, moves, controller):
-        if not moves:
-            self.setMovesText("No moves found in database")
-
-        self.widget = QWidget()
-        self.setWidget(self.widget)
-        self.move_grid = QtWidgets.QGridLayout()
-        self.widget.setLayout(self.move_grid)
-
-        self.move_grid.setSpacing(0)
-        self.move_grid.setColumnStretch(0, 0)
-        self.move_grid.setColumnStretch(1, 0)
-        self.move_grid.setColumnStretch(2, 1)
-        self.move_grid.setColumnMinimumWidth(0, 50)
-        self.move_grid.setColumnMinimumWidth(1, 60)
-        self.move_grid.setColumnMinimumWidth(2, 100)
-        self.move_grid.setSizeConstraint(QtWidgets.QLayout.SetMinimumSize)
-
-        if moves:
-            for move, row in zip(
-                sorted(moves, key=lambda move: move[1], reverse=True), range(len(moves))
-            ):
-                move_text = move[0]
-                if move_text is None:
-                    continue
-                callback = lambda move_text=move_text: controller.moveFromSan(move_text)
-
-                move_label = TableLabel(callback, move_text, QtCore.Qt.AlignLeft)
-                self.move_grid.addWidget(move_label, row, 0)
-
-                total_moves = move[1]
-                for_white = move[2]
-                (win, draw, loss) = move[3:6]
-                total_label = TableLabel(
-                    callback, str(total_moves), QtCore.Qt.AlignRight
-                )
-                self.move_grid.addWidget(total_label, row, 1)
-
-                self.move_grid.addWidget(
-                    WinDrawLossWidget(callback, win, draw, loss, total_moves),
-                    row,
-                    2,
-                )
-        else:
-            self.move_grid.addWidget(
-                QLabel("No moves found in database"),
-                0,
-                0,
-                1,
-                -1,
-                QtCore.Qt.AlignHCenter,
+        self.controller = controller
+        self.movesModel.setMoves(
+            controller.game.getEpd(),
+            [self.moveStats(move) for move in moves if move[0] is not None],
+        )
+        self.setPlaceholder("No moves found in database")
+
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        super().paintEvent(event)
+        if self.movesModel.rowCount() == 0:
+            painter = QtGui.QPainter(self.viewport())
+            painter.drawText(
+                self.viewport().rect().adjusted(0, 5, 0, 0),
+                Qt.AlignTop | Qt.AlignHCenter,
+                self.placeholder,
             )
+            painter.end()
+
 
-        self.move_grid.setRowStretch(len(moves) + 1, 1)
+class DatabasePane(MovesPane):
+    """The moves played from the position in the user's games."""
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from PySide6.QtWidgets import QLabel
+
+import chess
+import chess.engine
+from eval_bar import EvalBar
+from tracing import traced
+
+DEFAULT_MAX_FPS = 10
+SAN_CACHE_SIZE = 4096
+
+
+def scoreText(score: chess.engine.PovScore) -> str:
+    if score.is_mate():
+        mate = score.white().mate()
+        if mate == 0:
+            return "Checkmate"
+        elif mate > 0:
+            return f"M+{mate}"
+        else:
+            return f"M-{-mate}"
+    else:
+        return "{:.2f}".format(score.pov(chess.WHITE).score() / 100.0)
+
+
+class SanCache:
+    """
+    Caches the SAN of principal variations keyed by (position, pv prefix).
+
+    Successive infos from the engine mostly share a prefix with the previous PV, so
+    only the moves after the longest cached prefix need to be converted.
+    """
+
+    entries: OrderedDict[tuple[str, tuple[chess.Move, ...]], list[str]]
+
+    def __init__(self, maxsize: int = SAN_CACHE_SIZE):
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+
+    def sanList(self, board: chess.Board, pv: list[chess.Move]) -> list[str]:
+        fen = board.fen()
+        pv = tuple(pv)
+
+        prefix = len(pv)
+        while prefix > 0 and (fen, pv[:prefix]) not in self.entries:
+            prefix -= 1
+
+        if prefix > 0:
+            self.entries.move_to_end((fen, pv[:prefix]))
+            sans = list(self.entries[(fen, pv[:prefix])])
+        else:
+            sans = []
+
+        if prefix == len(pv):
+            return sans
+
+        board = board.copy(stack=False)
+        for move in pv[:prefix]:
+            board.push(move)
+        for i in range(prefix, len(pv)):
+            sans.append(board.san(pv[i]))
+            board.push(pv[i])
+            self.entries[(fen, pv[: i + 1])] = sans[: i + 1]
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+        return sans
+
+    def variationSan(self, board: chess.Board, pv: list[chess.Move]) -> str:
+        """Same output as chess.Board.variation_san but using the cache."""
+        text = []
+        turn = board.turn
+        number = board.fullmove_number
+        for san in self.sanList(board, pv):
+            if turn == chess.WHITE:
+                text.append(f"{number}. {san}")
+            elif not text:
+                text.append(f"{number}...{san}")
+            else:
+                text.append(san)
+            if turn == chess.BLACK:
+                number += 1
+            turn = not turn
+        return " ".join(text)
+
+
+class EngineOutput:
+    """
+    Coalesces engine info updates and publishes only the latest one to the analysis
+    label and eval bar, at most max_fps times a second. SAN conversion of the PV is
+    done in an executor so it doesn't hold up the Qt thread.
+    """
+
+    analysis_widget: QLabel
+    eval_bar: EvalBar
+    sanCache: SanCache
+    pending: tuple[chess.Board, dict]
+    flushTask: asyncio.Task
+    lastInfo: Optional[dict]
+
+    def __init__(
+        self, analysis_widget: QLabel, eval_bar: EvalBar, max_fps=DEFAULT_MAX_FPS
+    ):
+        self.analysis_widget = analysis_widget
+        self.eval_bar = eval_bar
+        self.interval = 1.0 / max_fps
+        self.sanCache = SanCache()
+        self.pending = None
+        self.flushTask = None
+        self.lastPublish = 0.0
+        self.generation = 0
+        # The latest info shown, for the depth and speed of the current search.
+        self.lastInfo = None
+
+    def submit(self, board: chess.Board, info: dict) -> None:
+        """
+        Queue an engine info for display, replacing any info that hasn't been
+        published yet. The board must not be modified afterwards.
+        """
+        if info.get("score") is None:
+            return
+
+        self.pending = (board, info)
+        if self.flushTask is None or self.flushTask.done():
+            self.flushTask = asyncio.create_task(self.flush())
+
+    def clear(self) -> None:
+        """Drop any queued or in-progress update, e.g. because the position changed."""
+        self.pending = None
+        self.generation += 1
+        self.lastInfo = None
+
+    @traced("engine", lambda self, board, info: {"depth": info.get("depth")})
+    def formatInfo(self, board: chess.Board, info: dict) -> str:
+        if board.is_game_over():
+            return board.result(claim_draw=True)
+
+        if "source" in info:
+            # A stored evaluation rather than one from the engine, so there's no PV.
+            depth = "" if info.get("depth") is None else f" depth: {info['depth']}"
+            return f"{scoreText(info['score'])}{depth} ({info['source']})\n"
+
+        moves = self.sanCache.variationSan(board, info.get("pv", []))
+        return f"{scoreText(info['score'])} depth: {info.get('depth')} {moves}\n"
+
+    async def flush(self) -> None:
+        while self.pending is not None:
+            delay = self.lastPublish + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.pending is None:
+                return
+
+            board, info = self.pending
+            self.pending = None
+            generation = self.generation
+            text = await asyncio.get_running_loop().run_in_executor(
+                None, self.formatInfo, board, info
+            )
+            if generation != self.generation:
+                continue
+
+            self.lastPublish = time.monotonic()
+            self.lastInfo = info
+            self.analysis_widget.setText(text)
+            self.eval_bar.updateBar(info["score"])
@@ -10,16 +10,21 @@ WIDTH = 10
 
 class EvalBar(QLabel):
     eval: float
+    barHeight: int
 
     def __init__(self):
         super().__init__()
 
         self.eval = 0.0
+        self.setBoardHeight(HEIGHT)
 
-        canvas = QtGui.QPixmap(WIDTH, HEIGHT)
+    def setBoardHeight(self, height: int):
+        """Resizes the bar to match the height of the board."""
+        self.barHeight = height
+        canvas = QtGui.QPixmap(WIDTH, height)
         canvas.fill(Qt.gray)
         self.setPixmap(canvas)
-        self.setFixedSize(WIDTH, HEIGHT)
+        self.setFixedSize(WIDTH, height)
         self.drawBar()
 
     def updateBar(self, eval):
@@ -35,8 +40,8 @@ class EvalBar(QLabel):
 
         eval = (10.0 + max(-10.0, min(10.0, self.eval))) / 20
 
-        white_height = int(HEIGHT * eval)
-        black_height = HEIGHT - white_height
+        white_height = int(self.barHeight * eval)
+        black_height = self.barHeight - white_height
 
         painter = QtGui.QPainter(canvas)
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
@@ -0,0 +1,170 @@
+"""
+A fake UCI engine whose output depends only on the position, for benchmarks and
+tests that need an engine without depending on stockfish's speed or version.
+
+    python fake_uci_engine.py [--depth-time SECONDS] [--startup-time SECONDS]
+
+Each depth takes --depth-time to "search". Scores and principal variations are
+derived from a hash of the position, so the same position always gets the same
+analysis.
+"""
+import argparse
+import sys
+import threading
+import time
+
+import chess
+import chess.polyglot
+
+MAX_PV_LENGTH = 4
+
+
+def moveHash(board: chess.Board, move: chess.Move) -> int:
+    key = chess.polyglot.zobrist_hash(board)
+    return ((key ^ (move.from_square * 64 + move.to_square)) * 0x9E3779B1) >> 32
+
+
+def moveOrder(board: chess.Board) -> list[chess.Move]:
+    """The legal moves in the deterministic order the engine prefers them."""
+    return sorted(board.legal_moves, key=lambda move: moveHash(board, move) & 0xFFFF)
+
+
+def score(board: chess.Board, move: chess.Move, depth: int) -> int:
+    return moveHash(board, move) % 200 - 100 + depth
+
+
+def principalVariation(board: chess.Board, move: chess.Move) -> list[chess.Move]:
+    board = board.copy(stack=False)
+    pv = [move]
+    board.push(move)
+    while len(pv) < MAX_PV_LENGTH:
+        replies = moveOrder(board)
+        if not replies:
+            break
+        pv.append(replies[0])
+        board.push(replies[0])
+    return pv
+
+
+class FakeEngine:
+    def __init__(self, depth_time: float):
+        self.depth_time = depth_time
+        self.board = chess.Board()
+        self.multipv = 1
+        self.stopping = threading.Event()
+        self.search = None
+        self.lock = threading.Lock()
+
+    def send(self, line: str):
+        with self.lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def setPosition(self, tokens: list[str]):
+        if tokens[0] == "startpos":
+            self.board = chess.Board()
+            rest = tokens[1:]
+        else:
+            end = tokens.index("moves") if "moves" in tokens else len(tokens)
+            self.board = chess.Board(" ".join(tokens[1:end]))
+            rest = tokens[end:]
+        for uci in rest[1:]:
+            self.board.push_uci(uci)
+
+    def go(self, tokens: list[str]):
+        depth = None
+        root_moves = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] == "depth":
+                depth = int(tokens[i + 1])
+                i += 2
+            elif tokens[i] == "searchmoves":
+                i += 1
+                while i < len(tokens):
+                    try:
+                        root_moves.append(chess.Move.from_uci(tokens[i]))
+                    except ValueError:
+                        break
+                    i += 1
+            else:
+                i += 1
+
+        self.stopSearch()
+        self.stopping.clear()
+        board = self.board.copy()
+        self.search = threading.Thread(
+            target=self.run, args=(board, depth, root_moves), daemon=True
+        )
+        self.search.start()
+
+    def run(self, board: chess.Board, depth, root_moves):
+        moves = [
+            move for move in moveOrder(board) if not root_moves or move in root_moves
+        ]
+        if not moves:
+            result = "mate 0" if board.is_check() else "cp 0"
+            self.send(f"info depth 0 score {result}")
+            self.send("bestmove (none)")
+            return
+
+        start = time.monotonic()
+        current = 1
+        while depth is None or current <= depth:
+            if self.stopping.wait(self.depth_time):
+                break
+            elapsed = int((time.monotonic() - start) * 1000)
+            ranked = sorted(moves, key=lambda move: -score(board, move, current))
+            for rank, move in enumerate(ranked[: self.multipv]):
+                pv = " ".join(move.uci() for move in principalVariation(board, move))
+                self.send(
+                    f"info depth {current} seldepth {current} multipv {rank + 1} "
+                    f"score cp {score(board, move, current)} nodes {current * 1000} "
+                    f"nps 1000000 time {elapsed} pv {pv}"
+                )
+            current += 1
+        self.send(f"bestmove {moves[0].uci()}")
+
+    def stopSearch(self):
+        if self.search is not None:
+            self.stopping.set()
+            self.search.join()
+            self.search = None
+
+    def loop(self):
+        for line in sys.stdin:
+            tokens = line.split()
+            if not tokens:
+                continue
+            command = tokens[0]
+            if command == "uci":
+                self.send("id name Fake")
+                self.send("id author chess analyzer")
+                self.send("option name MultiPV type spin default 1 min 1 max 500")
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "setoption" and "MultiPV" in tokens:
+                self.multipv = int(tokens[-1])
+            elif command == "position":
+                self.setPosition(tokens[1:])
+            elif command == "go":
+                self.go(tokens[1:])
+            elif command == "stop":
+                self.stopSearch()
+            elif command == "quit":
+                break
+        self.stopSearch()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--depth-time", type=float, default=0.005)
+    parser.add_argument("--startup-time", type=float, default=0.0)
+    args = parser.parse_args()
+    time.sleep(args.startup_time)
+    FakeEngine(args.depth_time).loop()
+
+
+if __name__ == "__main__":
+    main()
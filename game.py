@@ -9,16 +9,30 @@ from chess import Square
 
 
 class Game:
+    """
+    A game being stepped through. The nodes and boards of the mainline are
+    indexed by ply as they're first reached, so moving to a ply that's been
+    visited before doesn't replay the game. The board must not be modified.
+    """
+
     board: chess.Board
     pgn: chess.pgn
     game: chess.pgn.Game
     ply: int
+    nodes: list[chess.pgn.GameNode]
+    boards: list[chess.Board]
+    epds: dict[int, str]
+    validMoves: dict[int, dict[Square, list[chess.Move]]]
 
     def __init__(self, board: chess.Board, pgn: chess.pgn.Game):
         self.board = board
         self.pgn = pgn
         self.game = self.pgn.game()
         self.ply = 0
+        self.nodes = [self.game]
+        self.boards = [board]
+        self.epds = {}
+        self.validMoves = {}
 
     def fromPgnText(pgn_text) -> Game:
         if isinstance(pgn_text, str):
@@ -35,6 +49,43 @@ class Game:
     def getToSquare(self) -> Square:
         return self.game.next().move.to_square
 
+    def indexTo(self, ply: int) -> bool:
+        """
+        Extends the index of the mainline up to the given ply.
+
+        Returns:
+            bool: False if the game ends before that ply.
+        """
+        while len(self.boards) <= ply:
+            node = self.nodes[-1].next()
+            if node is None:
+                return False
+            board = self.boards[-1].copy(stack=False)
+            board.push(node.move)
+            self.nodes.append(node)
+            self.boards.append(board)
+        return True
+
+    def indexToEnd(self):
+        while self.indexTo(len(self.boards)):
+            pass
+
+    def goToPly(self, ply: int) -> bool:
+        """
+        Moves to the given ply of the mainline.
+
+        Returns:
+            bool: False if the game is shorter than that, in which case the position
+            is left at the end of the game.
+        """
+        reached = self.indexTo(ply)
+        if not reached:
+            ply = len(self.boards) - 1
+        self.ply = ply
+        self.game = self.nodes[ply]
+        self.board = self.boards[ply]
+        return reached
+
     def advance(self, plies: int = 1) -> None:
         """
         Advance the position.
@@ -48,22 +99,14 @@ class Game:
             if there were game ended before that (leaving the position where it
             ended).
         """
-        while self.game.next() is not None and plies > 0:
-            self.game = self.game.next()
-            self.board.push(self.game.move)
-            plies = plies - 1
-            self.ply = self.ply + 1
-        return plies == 0
+        return self.goToPly(self.ply + plies)
 
     def goToStart(self):
-        self.game = self.game.root()
-        self.ply = 0
-        self.board = self.game.board()
+        self.goToPly(0)
 
     def goToEnd(self):
-        self.game = self.game.end()
-        self.ply = self.game.ply()
-        self.board = self.game.board()
+        self.indexToEnd()
+        self.goToPly(len(self.boards) - 1)
 
     def goBack(self) -> bool:
         """
@@ -72,14 +115,39 @@ class Game:
         Returns:
             bool: True if it wasn't already at the start of the game.
         """
-        if self.game.parent is None:
+        if self.ply == 0:
             return False
 
-        self.game = self.game.parent
-        self.ply = self.ply - 1
+        return self.goToPly(self.ply - 1)
 
-        self.board = self.game.board()
-        return True
+    def analysisBoard(self, ply: Optional[int] = None) -> chess.Board:
+        """
+        Returns a new board at the ply, by default the current one, with the moves
+        that led to it, so that an engine sees repetitions and draw claims. The
+        indexed boards don't keep their moves, as they're only shown.
+        """
+        if ply is None:
+            ply = self.ply
+        self.indexTo(ply)
+        board = self.boards[0].copy()
+        for node in self.nodes[1 : ply + 1]:
+            board.push(node.move)
+        return board
+
+    def getEpd(self, ply: Optional[int] = None) -> str:
+        """Returns the EPD of the position at the ply, by default the current one."""
+        if ply is None:
+            ply = self.ply
+        epd = self.epds.get(ply)
+        if epd is None:
+            self.indexTo(ply)
+            epd = self.epds[ply] = self.boards[ply].epd()
+        return epd
+
+    def getMainlineEpds(self) -> list[str]:
+        """Returns the EPD of every position in the mainline, from the start."""
+        self.indexToEnd()
+        return [self.getEpd(ply) for ply in range(len(self.boards))]
 
     def getCapturedSquare(self) -> Optional[Square]:
         """
@@ -141,20 +209,28 @@ class Game:
         return self.game.mainline()
 
     def getTurnAndNumber(self) -> Optional[tuple[chess.Color, int]]:
-        if self.game.parent is None:
+        if self.ply == 0:
             return None
         else:
-            parent = self.game.parent
-            return (parent.turn(), parent.board().fullmove_number)
+            parent = self.boards[self.ply - 1]
+            return (parent.turn, parent.fullmove_number)
 
     def replaceNextMove(self, move) -> None:
         if not self.game.is_end():
             self.game.remove_variation(0)
         self.game.add_main_variation(move)
 
+        # Forget everything indexed after the current position.
+        del self.nodes[self.ply + 1 :]
+        del self.boards[self.ply + 1 :]
+        for index in (self.epds, self.validMoves):
+            for ply in [ply for ply in index if ply > self.ply]:
+                del index[ply]
+
     def getValidMoves(self, square) -> list[Square]:
-        return [
-            move
-            for move in self.board.legal_moves
-            if move.from_square == square
-        ]
+        validMoves = self.validMoves.get(self.ply)
+        if validMoves is None:
+            validMoves = self.validMoves[self.ply] = {}
+            for move in self.board.legal_moves:
+                validMoves.setdefault(move.from_square, []).append(move)
+        return validMoves.get(square, [])
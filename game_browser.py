@@ -0,0 +1,254 @@
+import asyncio
+import re
+from typing import Optional
+
+from PySide6 import QtCore, QtGui, QtWidgets
+from PySide6.QtCore import Qt
+
+import chess
+from database import GAME_LIST_PAGE_SIZE, GameDatabase, GameFilter, GameSummary
+
+COLUMNS = (
+    ("Date", "date"),
+    ("White", "white"),
+    ("Black", "black"),
+    ("Result", "result"),
+    ("Time", "time_control"),
+    ("ECO", "eco"),
+    ("Opening", "opening"),
+)
+
+FILTER_DELAY = 0.3
+
+DATE_REGEX = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class GamesModel(QtCore.QAbstractTableModel):
+    """
+    The games matching a filter, fetched a page at a time as the view scrolls. The
+    page after the last one shown is always fetched ahead, so scrolling down shows
+    it immediately instead of waiting on the database.
+    """
+
+    games: list[GameSummary]
+    pending: list[GameSummary]
+    filter: GameFilter
+    fetching: Optional[asyncio.Task]
+
+    def __init__(self, database: GameDatabase, page_size: int = GAME_LIST_PAGE_SIZE):
+        super().__init__()
+        self.database = database
+        self.page_size = page_size
+        self.games = []
+        self.pending = []
+        self.filter = GameFilter()
+        self.fetching = None
+        self.exhausted = False
+        self.wanted = False
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.games)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index: QtCore.QModelIndex, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        game = self.games[index.row()]
+        return getattr(game, COLUMNS[index.column()][1])
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        return COLUMNS[section][0]
+
+    def gameAt(self, index: QtCore.QModelIndex) -> GameSummary:
+        return self.games[index.row()]
+
+    def setFilter(self, filter: GameFilter):
+        """Lists the games matching a new filter, starting from the first page."""
+        if self.fetching is not None:
+            self.fetching.cancel()
+            self.fetching = None
+        self.beginResetModel()
+        self.filter = filter
+        self.games = []
+        self.pending = []
+        self.exhausted = False
+        # The first page is shown as soon as it arrives.
+        self.wanted = True
+        self.endResetModel()
+        self.requestPage()
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and (bool(self.pending) or not self.exhausted)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()) -> None:
+        self.wanted = True
+        self.showPending()
+
+    def showPending(self):
+        if not self.wanted or not self.pending:
+            return
+        self.wanted = False
+        first = len(self.games)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(self.pending) - 1)
+        self.games += self.pending
+        self.pending = []
+        self.endInsertRows()
+        self.requestPage()
+
+    def requestPage(self):
+        """Fetches the page after the games that are shown or pending."""
+        if self.exhausted or self.pending:
+            return
+        if self.fetching is not None and not self.fetching.done():
+            return
+        last = self.games[-1] if self.games else None
+        after = None if last is None else (last.date, last.game_id)
+        self.fetching = asyncio.ensure_future(self.fetchPage(self.filter, after))
+
+    async def fetchPage(self, filter: GameFilter, after: Optional[tuple[str, int]]):
+        games = await self.database.listGames(filter, after, self.page_size)
+        if filter != self.filter:
+            return
+        self.fetching = None
+        self.exhausted = len(games) < self.page_size
+        self.pending = games
+        self.showPending()
+
+
+class GameBrowser(QtWidgets.QWidget):
+    """
+    Lists the user's games from the database, filtered by date, opponent, colour,
+    result, time control and opening. Clicking a game opens it.
+    """
+
+    gameSelected = QtCore.Signal(str)
+
+    gamesModel: GamesModel
+    filterTimer: Optional[asyncio.TimerHandle]
+
+    def __init__(self, database: GameDatabase):
+        super().__init__()
+        self.database = database
+        self.gamesModel = GamesModel(database)
+        self.filterTimer = None
+        self.started = False
+
+        self.date_from = QtWidgets.QLineEdit()
+        self.date_from.setPlaceholderText("From YYYY-MM-DD")
+        self.date_to = QtWidgets.QLineEdit()
+        self.date_to.setPlaceholderText("To YYYY-MM-DD")
+        self.opponent = QtWidgets.QLineEdit()
+        self.opponent.setPlaceholderText("Opponent")
+        self.time_control = QtWidgets.QLineEdit()
+        self.time_control.setPlaceholderText("Time control")
+        self.opening = QtWidgets.QLineEdit()
+        self.opening.setPlaceholderText("ECO or opening")
+        self.color = QtWidgets.QComboBox()
+        for text, color in (
+            ("Any colour", None),
+            ("White", chess.WHITE),
+            ("Black", chess.BLACK),
+        ):
+            self.color.addItem(text, color)
+        self.result = QtWidgets.QComboBox()
+        for text, result in (
+            ("Any result", None),
+            ("Won", "win"),
+            ("Drew", "draw"),
+            ("Lost", "loss"),
+        ):
+            self.result.addItem(text, result)
+
+        for edit in (
+            self.date_from,
+            self.date_to,
+            self.opponent,
+            self.time_control,
+            self.opening,
+        ):
+            edit.textChanged.connect(self.filterChanged)
+        self.color.currentIndexChanged.connect(self.filterChanged)
+        self.result.currentIndexChanged.connect(self.filterChanged)
+
+        filters = QtWidgets.QGridLayout()
+        filters.addWidget(self.date_from, 0, 0)
+        filters.addWidget(self.date_to, 0, 1)
+        filters.addWidget(self.color, 0, 2)
+        filters.addWidget(self.opponent, 1, 0)
+        filters.addWidget(self.time_control, 1, 1)
+        filters.addWidget(self.result, 1, 2)
+        filters.addWidget(self.opening, 2, 0, 1, 3)
+
+        self.view = QtWidgets.QTableView()
+        self.view.setModel(self.gamesModel)
+        self.view.verticalHeader().hide()
+        self.view.setShowGrid(False)
+        self.view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.view.setFocusPolicy(Qt.NoFocus)
+        # Fixed row heights let the view lay out only the visible rows.
+        self.view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(
+            self.fontMetrics().height() + 6
+        )
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.clicked.connect(self.gameClicked)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(filters)
+        layout.addWidget(self.view)
+        self.setLayout(layout)
+
+    def showEvent(self, event: QtGui.QShowEvent) -> None:
+        super().showEvent(event)
+        # Nothing is queried until the list is first shown.
+        if not self.started:
+            self.started = True
+            self.gamesModel.setFilter(self.currentFilter())
+
+    def currentFilter(self) -> GameFilter:
+        def text(edit: QtWidgets.QLineEdit) -> Optional[str]:
+            return edit.text().strip() or None
+
+        def date(edit: QtWidgets.QLineEdit) -> Optional[str]:
+            value = text(edit)
+            return value if value and DATE_REGEX.match(value) else None
+
+        return GameFilter(
+            date_from=date(self.date_from),
+            date_to=date(self.date_to),
+            opponent=text(self.opponent),
+            color=self.color.currentData(),
+            result=self.result.currentData(),
+            time_control=text(self.time_control),
+            opening=text(self.opening),
+        )
+
+    def filterChanged(self):
+        # Wait for typing to pause rather than querying on every key.
+        if self.filterTimer is not None:
+            self.filterTimer.cancel()
+        self.filterTimer = asyncio.get_event_loop().call_later(
+            FILTER_DELAY, self.applyFilter
+        )
+
+    def applyFilter(self):
+        self.filterTimer = None
+        filter = self.currentFilter()
+        if filter != self.gamesModel.filter or not self.started:
+            self.started = True
+            self.gamesModel.setFilter(filter)
+
+    def gameClicked(self, index: QtCore.QModelIndex):
+        asyncio.ensure_future(self.openGame(self.gamesModel.gameAt(index).game_id))
+
+    async def openGame(self, game_id: int):
+        pgn = await self.database.loadGamePgn(game_id)
+        if pgn is not None:
+            self.gameSelected.emit(pgn)
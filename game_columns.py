@@ -0,0 +1,144 @@
+"""
+The games database's moves loaded into memory as sorted NumPy columns, one row
+per position of every game, so that looking positions up is a binary search
+instead of SQL joins. Loading takes a few seconds at startup, and games added to
+games.db afterwards aren't seen until it's loaded again.
+
+NumPy is only needed when GameDatabase is asked to use this.
+"""
+import sqlite3
+from typing import Optional
+
+import numpy as np
+
+from position_index import OTHER_RESULT, USER_WHITE, gameFlags, positionHash
+
+# Stored moves are the move code plus one, leaving 0 for games that ended there.
+NO_MOVE = 0
+RESULT_CODES = OTHER_RESULT + 1
+
+
+class GameColumns:
+    """
+    Each game position's hash, move, result and whether the user played white,
+    sorted by hash and then by the (user played white, move) groups the SQL
+    aggregates by.
+    """
+
+    hashes: np.ndarray
+    moves: np.ndarray
+    user_white: np.ndarray
+    results: np.ndarray
+
+    def __init__(self, hashes, moves, user_white, results):
+        order = np.lexsort((moves, user_white, hashes))
+        self.hashes = hashes[order]
+        self.moves = moves[order]
+        self.user_white = user_white[order]
+        self.results = results[order]
+
+    @classmethod
+    def load(cls, con: sqlite3.Connection, username: Optional[str]) -> "GameColumns":
+        (max_pos_id,) = con.execute(
+            "SELECT COALESCE(MAX(pos_id), 0) FROM positions"
+        ).fetchone()
+        position_hashes = np.zeros(max_pos_id + 1, dtype=np.uint64)
+        for pos_id, epd in con.execute("SELECT pos_id, epd FROM positions"):
+            position_hashes[pos_id] = positionHash(epd)
+
+        (max_game_id,) = con.execute(
+            "SELECT COALESCE(MAX(game_id), 0) FROM games"
+        ).fetchone()
+        game_flags = np.zeros(max_game_id + 1, dtype=np.uint8)
+        for game_id, white, result in con.execute(
+            "SELECT game_id, white, result FROM games"
+        ):
+            game_flags[game_id] = gameFlags(white, result, username)
+
+        rows = np.array(
+            con.execute(
+                """
+                SELECT g.pos_id, g.game_id, COALESCE(g.next_move + 1, 0)
+                FROM game_positions g
+                JOIN games ON games.game_id = g.game_id
+                """
+            ).fetchall(),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        flags = game_flags[rows[:, 1]]
+        return cls(
+            position_hashes[rows[:, 0]],
+            rows[:, 2].astype(np.uint16),
+            (flags >> 3).astype(np.uint8),
+            (flags & 7).astype(np.uint8),
+        )
+
+    def nbytes(self) -> int:
+        return sum(
+            column.nbytes
+            for column in (self.hashes, self.moves, self.user_white, self.results)
+        )
+
+    def rows(self, epds: list[str]) -> list[tuple]:
+        """
+        The same rows as GameDatabase's SQL: (epd, next_move, count,
+        user_plays_white, win, draw, loss) for each move played from each position
+        by each side, found for all the positions at once.
+        """
+        epds = list(dict.fromkeys(epds))
+        keys = np.array([positionHash(epd) for epd in epds], dtype=np.uint64)
+        starts = np.searchsorted(self.hashes, keys, side="left")
+        lengths = np.searchsorted(self.hashes, keys, side="right") - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return []
+
+        # The rows of every position, one position after another.
+        ends = np.cumsum(lengths)
+        selected = np.arange(total) + np.repeat(starts - (ends - lengths), lengths)
+        position = np.repeat(np.arange(len(epds)), lengths)
+        moves = self.moves[selected]
+        user_white = self.user_white[selected]
+
+        # Rows are sorted by group within each position, so a group starts wherever
+        # the position, side or move changes.
+        changes = np.ones(total, dtype=bool)
+        changes[1:] = (
+            (np.diff(position) != 0)
+            | (np.diff(user_white) != 0)
+            | (np.diff(moves.astype(np.int32)) != 0)
+        )
+        group = np.cumsum(changes) - 1
+        groups = int(group[-1]) + 1
+        results = np.bincount(
+            group * RESULT_CODES + self.results[selected],
+            minlength=groups * RESULT_CODES,
+        ).reshape(groups, RESULT_CODES)
+        counts = results.sum(axis=1)
+
+        first = np.flatnonzero(changes)
+        rows = []
+        for (epd_index, move, side), count, group_results in zip(
+            zip(
+                position[first].tolist(),
+                moves[first].tolist(),
+                user_white[first].tolist(),
+            ),
+            counts.tolist(),
+            results.tolist(),
+        ):
+            # Like SQL's SUM, the totals are NULL when every result is.
+            if group_results[0] == count:
+                totals = (None, None, None)
+            else:
+                totals = tuple(group_results[1:OTHER_RESULT])
+            rows.append(
+                (
+                    epds[epd_index],
+                    None if move == NO_MOVE else move - 1,
+                    count,
+                    USER_WHITE[side],
+                    *totals,
+                )
+            )
+        return rows
@@ -0,0 +1,40 @@
+import asyncio
+
+import chess
+from truth.truth import AssertThat
+
+import generate_databases
+from database import GameDatabase
+from game_columns import GameColumns
+
+
+def testColumnsFindTheSameRowsAsSql(games_database):
+    games_file, con = games_database
+    epds = [epd for (epd,) in con.execute("SELECT epd FROM positions")]
+    con.close()
+
+    async def lookupRows(epds, **kwargs):
+        database = GameDatabase(
+            games_file, username=generate_databases.DEFAULT_USERNAME, **kwargs
+        )
+        try:
+            rows = await database.fetchRows(epds, chess.WHITE)
+            return sorted(rows, key=repr), database.backendBytes()
+        finally:
+            await database.close()
+
+    expected, _ = asyncio.run(lookupRows(epds))
+    rows, nbytes = asyncio.run(lookupRows(epds, columns=True))
+    AssertThat(rows).IsEqualTo(expected)
+    AssertThat(nbytes).IsGreaterThan(0)
+    AssertThat(asyncio.run(lookupRows(epds[:1], columns=True))[0]).IsEqualTo(
+        asyncio.run(lookupRows(epds[:1]))[0]
+    )
+
+
+def testUnknownPositions(games_database):
+    _, con = games_database
+    columns = GameColumns.load(con, generate_databases.DEFAULT_USERNAME)
+    con.close()
+
+    AssertThat(columns.rows(["8/8/8/8/8/8/8/8 w - -"])).IsEmpty()
@@ -0,0 +1,111 @@
+from typing import Optional
+
+from PySide6 import QtCore, QtWidgets
+from PySide6.QtCore import Qt
+
+from pgn_index import INDEXED_TAGS, GameEntry
+
+NUMBER_COLUMN = 0
+
+
+class GameListModel(QtCore.QAbstractTableModel):
+    """The games of an indexed PGN file, one per row, with their headers."""
+
+    games: list[GameEntry]
+
+    def __init__(self):
+        super().__init__()
+        self.games = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.games)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(INDEXED_TAGS) + 1
+
+    def data(self, index: QtCore.QModelIndex, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if index.column() == NUMBER_COLUMN:
+            return str(index.row() + 1)
+        tag = INDEXED_TAGS[index.column() - 1]
+        return self.games[index.row()].headers.get(tag, "?")
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        return "#" if section == NUMBER_COLUMN else INDEXED_TAGS[section - 1]
+
+    def appendGames(self, games: list[GameEntry]):
+        if not games:
+            return
+        first = len(self.games)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(games) - 1)
+        self.games.extend(games)
+        self.endInsertRows()
+
+
+class GamePicker(QtWidgets.QDialog):
+    """
+    Lists the games of a PGN file to choose one to open. Games can be added while
+    the dialog is showing, so a large file can be picked from as it's indexed.
+    """
+
+    gamesModel: GameListModel
+    progress: QtWidgets.QProgressBar
+
+    def __init__(self, title: str, parent: Optional[QtWidgets.QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(700, 500)
+
+        self.gamesModel = GameListModel()
+        self.view = QtWidgets.QTableView()
+        self.view.setModel(self.gamesModel)
+        self.view.verticalHeader().hide()
+        self.view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        # Fixed row heights keep the view fast with thousands of games.
+        self.view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.doubleClicked.connect(self.accept)
+
+        self.progress = QtWidgets.QProgressBar()
+        self.progress.setFormat("Indexing games... %p%")
+        self.progress.hide()
+
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.Open | QtWidgets.QDialogButtonBox.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.view)
+        layout.addWidget(self.progress)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def addGames(self, games: list[GameEntry]):
+        wasEmpty = self.gamesModel.rowCount() == 0
+        self.gamesModel.appendGames(games)
+        if wasEmpty and games:
+            self.view.selectRow(0)
+
+    def setIndexing(self, size: int):
+        """Shows the indexing progress through a file of the given size."""
+        self.progress.setRange(0, max(size, 1))
+        self.progress.setValue(0)
+        self.progress.show()
+
+    def setProgress(self, position: int):
+        self.progress.setValue(position)
+
+    def indexingFinished(self):
+        self.progress.hide()
+        self.view.resizeColumnsToContents()
+
+    def selectedGame(self) -> Optional[int]:
+        rows = self.view.selectionModel().selectedRows()
+        return rows[0].row() if rows else None
@@ -193,3 +193,76 @@ def testGetValidMoves():
     AssertThat(game.getValidMoves(chess.F1)).IsEmpty()
     # But black can
     AssertThat(game.getValidMoves(chess.E7)).ContainsExactly(chess.E6, chess.E5)
+
+
+def testGoToPly():
+    game = Game.fromPgnText(SCHOLARS_MATE_PGN)
+    AssertThat(game.goToPly(5)).IsTrue()
+    AssertThat(game.ply).IsEqualTo(5)
+    AssertThat(game.getPreviousMove()).IsEqualTo((chess.F1, chess.C4))
+    AssertThat(game.goToPly(2)).IsTrue()
+    AssertThat(game.getPreviousMove()).IsEqualTo((chess.E7, chess.E5))
+    AssertThat(game.board.fen()).IsEqualTo(
+        "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+    )
+    # Past the end leaves the position at the end of the game.
+    AssertThat(game.goToPly(20)).IsFalse()
+    AssertThat(game.ply).IsEqualTo(7)
+    AssertThat(game.hasMoreMoves()).IsFalse()
+
+
+def testGoBackRestoresBoard():
+    game = Game.fromPgnText(SCHOLARS_MATE_PGN)
+    game.advance(3)
+    fen = game.board.fen()
+    game.advance()
+    AssertThat(game.goBack()).IsTrue()
+    AssertThat(game.board.fen()).IsEqualTo(fen)
+    game.goToStart()
+    AssertThat(game.goBack()).IsFalse()
+    AssertThat(game.board).IsEqualTo(chess.Board())
+
+
+def testGetEpd():
+    game = Game.fromPgnText(SCHOLARS_MATE_PGN)
+    expected = [game.game.board().epd()] + [
+        node.board().epd() for node in game.game.mainline()
+    ]
+    AssertThat(game.getMainlineEpds()).IsEqualTo(expected)
+    game.advance(3)
+    AssertThat(game.getEpd()).IsEqualTo(expected[3])
+
+
+def testGetTurnAndNumber():
+    game = Game.fromPgnText(SCHOLARS_MATE_PGN)
+    AssertThat(game.getTurnAndNumber()).IsNone()
+    game.advance()
+    AssertThat(game.getTurnAndNumber()).IsEqualTo((chess.WHITE, 1))
+    game.advance(3)
+    AssertThat(game.getTurnAndNumber()).IsEqualTo((chess.BLACK, 2))
+
+
+def testReplaceNextMove():
+    game = Game.fromPgnText(SCHOLARS_MATE_PGN)
+    game.goToEnd()
+    game.goToPly(2)
+    game.replaceNextMove(chess.Move.from_uci("g1f3"))
+    AssertThat(game.getToSquare()).IsEqualTo(chess.F3)
+    AssertThat(game.advance()).IsTrue()
+    AssertThat(game.getPreviousMove()).IsEqualTo((chess.G1, chess.F3))
+    AssertThat(game.advance()).IsFalse()
+
+
+def testAnalysisBoardHasMoves():
+    game = Game.fromPgnText("1. Nf3 Nf6 2. Ng1 Ng8 3. Nf3 Nf6 4. Ng1 Ng8 1/2-1/2")
+    game.goToEnd()
+    board = game.analysisBoard()
+    AssertThat(board).IsEqualTo(game.board)
+    AssertThat(board.move_stack).HasSize(8)
+    AssertThat(board.is_repetition()).IsTrue()
+    AssertThat(game.analysisBoard(4).move_stack).HasSize(4)
+
+    with open("long_draw.pgn") as f:
+        game = Game.fromPgnText(f)
+    game.goToEnd()
+    AssertThat(game.analysisBoard().can_claim_draw()).IsTrue()
@@ -0,0 +1,237 @@
+"""
+Builds games.db and openings.db fixtures of a given size for benchmarks and
+testing, from random legal games or from the games in PGN files.
+
+    python generate_databases.py [--games N] [--openings N] [--seed N]
+        [--pgn file]... [directory]
+
+The same arguments always generate the same databases. Games and opening lines
+share their first moves, so looking positions up finds moves in both.
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+from typing import Iterator, Optional
+
+import chess
+import chess.engine
+import chess.pgn
+
+import import_openings
+import move_encoding
+import update_positions
+
+DEFAULT_USERNAME = "bench_user"
+
+GAMES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw_games (id INTEGER PRIMARY KEY, date TEXT, pgn TEXT);
+CREATE TABLE IF NOT EXISTS games (
+    game_id INTEGER PRIMARY KEY,
+    pgn TEXT,
+    date TEXT,
+    result TEXT,
+    white TEXT,
+    black TEXT,
+    time_control TEXT,
+    variant TEXT,
+    white_elo TEXT,
+    black_elo TEXT,
+    eco TEXT,
+    opening TEXT,
+    termination TEXT,
+    moves BLOB
+);
+CREATE TABLE IF NOT EXISTS positions (pos_id INTEGER PRIMARY KEY, epd TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS game_positions (
+    game_pos_id INTEGER PRIMARY KEY,
+    pos_id INTEGER,
+    ply INTEGER,
+    game_id INTEGER,
+    last_game_pos_id INTEGER,
+    next_move INTEGER
+);
+"""
+
+# Moves in the opening are picked from the first few legal moves so that games
+# share positions, like real games do.
+OPENING_PLIES = 10
+OPENING_CHOICES = 3
+
+TIME_CONTROLS = ("60+0", "180+0", "180+2", "300+0", "600+0", "600+5")
+START_DATE = datetime.datetime(2020, 1, 1)
+
+
+def randomMoves(rng: random.Random, max_plies: int) -> list[chess.Move]:
+    board = chess.Board()
+    moves = []
+    while len(moves) < max_plies and not board.is_game_over():
+        legal = sorted(board.legal_moves, key=lambda move: move.uci())
+        if len(moves) < OPENING_PLIES:
+            move = rng.choice(legal[:OPENING_CHOICES])
+        else:
+            move = rng.choice(legal)
+        moves.append(move)
+        board.push(move)
+    return moves
+
+
+def randomGame(rng: random.Random, evals: bool) -> chess.pgn.Game:
+    game = chess.pgn.Game()
+    node = game
+    for move in randomMoves(rng, rng.randint(20, 120)):
+        node = node.add_variation(move)
+        if evals:
+            score = chess.engine.PovScore(
+                chess.engine.Cp(rng.randint(-300, 300)), chess.WHITE
+            )
+            node.set_eval(score, rng.randint(10, 30))
+    board = node.board()
+    outcome = board.outcome()
+    game.headers["Result"] = (
+        outcome.result() if outcome else rng.choice(("1-0", "0-1", "1/2-1/2"))
+    )
+    return game
+
+
+def pgnGames(pgns: list[str]) -> Iterator[chess.pgn.Game]:
+    """Cycles through the games of the PGN files forever."""
+    while True:
+        for pgn in pgns:
+            with open(pgn) as f:
+                while (game := chess.pgn.read_game(f)) is not None:
+                    yield game
+
+
+def generateGames(
+    con: sqlite3.Connection,
+    count: int,
+    seed: int = 0,
+    pgns: Optional[list[str]] = None,
+    username: str = DEFAULT_USERNAME,
+    eval_fraction: float = 0.2,
+) -> None:
+    """
+    Adds count games to raw_games and games, as import_games.py and
+    update_games.py would. Their positions are added by update_positions.py.
+    """
+    rng = random.Random(seed)
+    con.executescript(GAMES_SCHEMA)
+    source = pgnGames(pgns) if pgns else None
+    first_id = con.execute("SELECT COALESCE(MAX(id), 0) FROM raw_games").fetchone()[0]
+
+    rows = []
+    for i in range(count):
+        game_id = first_id + i + 1
+        if source is not None:
+            game = next(source)
+        else:
+            game = randomGame(rng, rng.random() < eval_fraction)
+        opponent = f"opponent_{rng.randint(1, max(1, count // 20))}"
+        user_white = rng.random() < 0.5
+        white, black = (username, opponent) if user_white else (opponent, username)
+        date = START_DATE + datetime.timedelta(minutes=37 * game_id)
+        headers = game.headers
+        headers["White"] = white
+        headers["Black"] = black
+        headers["UTCDate"] = date.strftime("%Y.%m.%d")
+        headers["UTCTime"] = date.strftime("%H:%M:%S")
+        headers["TimeControl"] = rng.choice(TIME_CONTROLS)
+        headers["ECO"] = f"{rng.choice('ABCDE')}{rng.randint(0, 99):02d}"
+        pgn = str(game)
+        rows.append(
+            (
+                game_id,
+                date.strftime("%Y-%m-%d %H:%M:%S"),
+                pgn,
+                headers.get("Result"),
+                white,
+                black,
+                headers["TimeControl"],
+                headers["ECO"],
+                move_encoding.encodeGame(game),
+            )
+        )
+
+    con.executemany(
+        "INSERT INTO raw_games (id, date, pgn) VALUES (?, ?, ?)",
+        [(game_id, date, pgn) for (game_id, date, pgn, *_) in rows],
+    )
+    con.executemany(
+        """
+        INSERT INTO games (
+            game_id, date, pgn, result, white, black, time_control, variant, eco,
+            moves)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'Standard', ?, ?)
+        """,
+        rows,
+    )
+    con.commit()
+
+
+def generateVariations(count: int, seed: int = 0) -> list[dict]:
+    """
+    Generates opening lines in the format of the scraped chapter files read by
+    import_openings.py.
+    """
+    rng = random.Random(seed + 1)
+    variations = []
+    for i in range(count):
+        moves = randomMoves(rng, rng.randint(4, 16))
+        variations.append(
+            {
+                "name": f"Line {i}",
+                "variation": chess.Board().variation_san(moves),
+                "link": f"line-{i}",
+                "type": "line",
+                "book": f"Book {i % 5}",
+                "chapter": f"Chapter {i % 17}",
+                "paused": 0,
+                "learned": 0,
+            }
+        )
+    return variations
+
+
+def generateOpenings(con: sqlite3.Connection, count: int, seed: int = 0) -> None:
+    import_openings.create_tables(con)
+    import_openings.import_variations(
+        con.cursor(), generateVariations(count, seed), verbose=False
+    )
+    con.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", nargs="?", default=".")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--openings", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--pgn", action="append", help="Take games from this file (repeatable)"
+    )
+    parser.add_argument("--username", default=DEFAULT_USERNAME)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    games_file = os.path.join(args.directory, "games.db")
+    openings_file = os.path.join(args.directory, "openings.db")
+    for file in (games_file, openings_file):
+        if os.path.exists(file):
+            os.remove(file)
+
+    con = sqlite3.connect(games_file)
+    generateGames(con, args.games, args.seed, args.pgn, args.username)
+    moves = update_positions.update_positions(con, verbose=False)
+    con.close()
+    print(f"Generated {args.games} games with {moves} positions in {games_file}")
+
+    con = sqlite3.connect(openings_file)
+    generateOpenings(con, args.openings, args.seed)
+    con.close()
+    print(f"Generated {args.openings} opening lines in {openings_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import yaml
 import chess
 import chess.pgn
 from config import config
+from pgn_compression import loadCodec
 
 board = chess.Board()
 
@@ -19,6 +20,8 @@ con = sqlite3.connect("/Users/dan/github/chess/games.db")
 cur = con.cursor()
 cur.execute("CREATE TABLE IF NOT EXISTS raw_games (date TEXT, pgn TEXT);")
 con.commit()
+# Compresses the games once compress_pgns.py has trained a dictionary.
+codec = loadCodec(con)
 
 last_date = None
 last_timestamp = None
@@ -46,7 +49,9 @@ for game in games:
     headers = chess.pgn.read_game(io.StringIO(game)).headers
     date = headers["UTCDate"].replace(".", "-") + " " + headers["UTCTime"]
     print(f"Getting game {index} {date}", end="\r")
-    cur.execute("INSERT INTO raw_games (date, pgn) VALUES (?, ?)", (date, game))
+    cur.execute(
+        "INSERT INTO raw_games (date, pgn) VALUES (?, ?)", (date, codec.compress(game))
+    )
     index = index + 1
 
 print(f"{' ':80}", end="\r")
@@ -5,49 +5,52 @@ import sqlite3
 
 import chess
 import chess.pgn
-from config import config
 
-board = chess.Board()
+import migrate_move_codes
+from move_encoding import encodeMove
 
 openings_dir = "/Users/dan/github/scraper/books/"
 
-con = sqlite3.connect("/Users/dan/github/chess/openings.db")
-cur = con.cursor()
-cur.execute(
-    """CREATE TABLE IF NOT EXISTS openings (
-            opening_id INTEGER PRIMARY KEY,
-            name TEXT,
-            variation TEXT,
-            link TEXT,
-            type TEXT,
-            book TEXT,
-            chapter TEXT,
-            paused INTEGER,
-            learned INTEGER,
-            for_white INTEGER,
-            UNIQUE(name, book, chapter, link)
-            );
-"""
-)
-cur.execute(
-    """CREATE TABLE IF NOT EXISTS positions (
-            pos_id INTEGER PRIMARY KEY,
-            epd TEXT UNIQUE
-            );
-"""
-)
-cur.execute(
-    """CREATE TABLE IF NOT EXISTS opening_positions (
-            opening_pos_id INTEGER PRIMARY KEY,
-            pos_id INTEGER,
-            ply INTEGER,
-            opening_id INTEGER,
-            last_opening_pos_id INTEGER,
-            next_move TEXT
-            );
-"""
-)
-con.commit()
+
+def create_tables(con):
+    cur = con.cursor()
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS openings (
+                opening_id INTEGER PRIMARY KEY,
+                name TEXT,
+                variation TEXT,
+                link TEXT,
+                type TEXT,
+                book TEXT,
+                chapter TEXT,
+                paused INTEGER,
+                learned INTEGER,
+                for_white INTEGER,
+                UNIQUE(name, book, chapter, link)
+                );
+    """
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS positions (
+                pos_id INTEGER PRIMARY KEY,
+                epd TEXT UNIQUE
+                );
+    """
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS opening_positions (
+                opening_pos_id INTEGER PRIMARY KEY,
+                pos_id INTEGER,
+                ply INTEGER,
+                opening_id INTEGER,
+                last_opening_pos_id INTEGER,
+                next_move INTEGER
+                );
+    """
+    )
+    con.commit()
+    migrate_move_codes.migrate(con, verbose=False)
+
 
 def import_line(cur, variation, game, opening_id):
     ply = 0
@@ -62,7 +65,7 @@ def import_line(cur, variation, game, opening_id):
         ).fetchone()[0]
 
         next = game.next()
-        next_move = None if next is None else board.san(next.move)
+        next_move = None if next is None else encodeMove(next.move)
 
         cur.execute(
             """
@@ -77,76 +80,96 @@ def import_line(cur, variation, game, opening_id):
         ply += 1
         game = next
 
-# Get list of directories in the openings directory
-main_scanner = os.scandir(openings_dir)
-print("Files and Directories in '% s':" % openings_dir)
-index = 0
-lastrowid = cur.lastrowid
-for book_entry in main_scanner:
-    if book_entry.is_dir() or book_entry.is_file():
-        book_dir = os.path.join(openings_dir, book_entry.name)
-        dir_scanner = os.scandir(book_dir)
-        for chapter_entry in dir_scanner:
-            if chapter_entry.is_file():
-                chapter_path = os.path.join(book_dir, chapter_entry.name)
-                print(chapter_path)
-                with open(chapter_path) as f:
-                    data = json.load(f)
-                    for variation in data:
-                        if (
-                            not variation["variation"]
-                            or variation["type"] == "informational"
-                        ):
-                            continue
-                        line = variation["variation"]
-                        game = chess.pgn.read_game(io.StringIO(line))
-                        # if the last move in the PGN is a white move, then at the end of the
-                        # main-line, it will be black to play. Opening variations always end with a
-                        # move from the color they were designed for.
-                        for_white = game.end().turn() == chess.BLACK
-                        if game.errors:
-                            print(game.errors)
-                        if game.is_end():
-                            continue
-
-                        # Insert each variation into the database
-                        cur.execute(
-                            """INSERT OR IGNORE INTO openings (
-                                 name,
-                                 variation,
-                                 link,
-                                 type,
-                                 book,
-                                 chapter,
-                                 paused,
-                                 learned,
-                                 for_white)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (
-
-                                variation["name"],
-                                variation["variation"],
-                                variation.get("link", ""),
-                                variation["type"],
-                                variation["book"],
-                                variation["chapter"],
-                                variation["paused"],
-                                variation["learned"],
-                                for_white,
-                            ),
-                        )
-
-                        if cur.lastrowid != lastrowid:
-                            lastrowid = cur.lastrowid
-                            index = index + 1
-                            print(
-                                f"{index}: {variation['book']} {variation['chapter']} {variation['name']} {variation.get('link')} for {'white' if for_white else 'black'}"
-                            )
-
-                            import_line(cur, variation, game, lastrowid)
-
-
-# print(f"{' ':80}", end="\r")
-print(f"Parsed {index} lines")
-
-con.commit()
+
+def import_variations(cur, variations, verbose=True) -> int:
+    """
+    Adds the variations (as scraped into each chapter's JSON file) that aren't
+    already in the database, along with their positions.
+
+    Returns:
+        int: The number of variations added.
+    """
+    index = 0
+    lastrowid = cur.lastrowid
+    for variation in variations:
+        if not variation["variation"] or variation["type"] == "informational":
+            continue
+        line = variation["variation"]
+        game = chess.pgn.read_game(io.StringIO(line))
+        # if the last move in the PGN is a white move, then at the end of the
+        # main-line, it will be black to play. Opening variations always end with a
+        # move from the color they were designed for.
+        for_white = game.end().turn() == chess.BLACK
+        if game.errors:
+            print(game.errors)
+        if game.is_end():
+            continue
+
+        # Insert each variation into the database
+        cur.execute(
+            """INSERT OR IGNORE INTO openings (
+                 name,
+                 variation,
+                 link,
+                 type,
+                 book,
+                 chapter,
+                 paused,
+                 learned,
+                 for_white)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                variation["name"],
+                variation["variation"],
+                variation.get("link", ""),
+                variation["type"],
+                variation["book"],
+                variation["chapter"],
+                variation["paused"],
+                variation["learned"],
+                for_white,
+            ),
+        )
+
+        if cur.lastrowid != lastrowid:
+            lastrowid = cur.lastrowid
+            index = index + 1
+            if verbose:
+                print(
+                    f"{index}: {variation['book']} {variation['chapter']} "
+                    f"{variation['name']} {variation.get('link')} "
+                    f"for {'white' if for_white else 'black'}"
+                )
+
+            import_line(cur, variation, game, lastrowid)
+    return index
+
+
+def import_books(con, openings_dir) -> int:
+    """Imports the chapters of every book in openings_dir."""
+    cur = con.cursor()
+    index = 0
+    # Get list of directories in the openings directory
+    main_scanner = os.scandir(openings_dir)
+    print("Files and Directories in '% s':" % openings_dir)
+    for book_entry in main_scanner:
+        if book_entry.is_dir() or book_entry.is_file():
+            book_dir = os.path.join(openings_dir, book_entry.name)
+            dir_scanner = os.scandir(book_dir)
+            for chapter_entry in dir_scanner:
+                if chapter_entry.is_file():
+                    chapter_path = os.path.join(book_dir, chapter_entry.name)
+                    print(chapter_path)
+                    with open(chapter_path) as f:
+                        index += import_variations(cur, json.load(f))
+    con.commit()
+    return index
+
+
+if __name__ == "__main__":
+    con = sqlite3.connect("/Users/dan/github/chess/openings.db")
+    create_tables(con)
+    index = import_books(con, openings_dir)
+
+    # print(f"{' ':80}", end="\r")
+    print(f"Parsed {index} lines")
@@ -0,0 +1,145 @@
+"""
+Watches the event loop shared by asyncio and Qt for work that blocks it. A beat is
+scheduled on the loop every interval, and how late it runs is the loop's lag. When
+the loop hasn't run a beat for longer than the threshold, a watchdog thread
+captures the stack the loop's thread is stuck in, so the blocking call can be found
+and moved off the loop.
+"""
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import NamedTuple, Optional
+
+import tracing
+
+DEFAULT_INTERVAL = 0.05
+DEFAULT_THRESHOLD = 0.1
+LAG_SAMPLES = 200
+STALL_HISTORY = 20
+
+logger = logging.getLogger(__name__)
+
+
+def percentileMs(samples, fraction: float) -> float:
+    """The nearest-rank percentile of samples in seconds, in milliseconds."""
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+class Stall(NamedTuple):
+    """A time the loop was blocked for longer than the threshold."""
+
+    at: float
+    seconds: float
+    stack: list[str]
+
+
+class LagMonitor:
+    interval: float
+    threshold: float
+    lags: deque[float]
+    stalls: deque[Stall]
+    beat: Optional[asyncio.TimerHandle]
+    watchdog: Optional[threading.Thread]
+
+    def __init__(
+        self, interval: float = DEFAULT_INTERVAL, threshold: float = DEFAULT_THRESHOLD
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = deque(maxlen=LAG_SAMPLES)
+        self.stalls = deque(maxlen=STALL_HISTORY)
+        self.beats = 0
+        self.stallCount = 0
+        self.maxLag = 0.0
+        self.expected = 0.0
+        self.loop = None
+        self.loopThread = None
+        self.beat = None
+        self.watchdog = None
+        self.stopping = threading.Event()
+        # Set by the watchdog, while the loop is blocked, for the next beat to report.
+        self.blockedStack = None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Starts monitoring the loop, which must run on the calling thread."""
+        self.loop = loop or asyncio.get_event_loop()
+        self.loopThread = threading.get_ident()
+        self.stopping.clear()
+        self.scheduleBeat()
+        self.watchdog = threading.Thread(
+            target=self.watch, name="lag monitor", daemon=True
+        )
+        self.watchdog.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.beat is not None:
+            self.beat.cancel()
+            self.beat = None
+
+    def scheduleBeat(self):
+        self.expected = time.monotonic() + self.interval
+        self.beat = self.loop.call_later(self.interval, self.onBeat)
+
+    def onBeat(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self.expected)
+        self.beats += 1
+        self.lags.append(lag)
+        self.maxLag = max(self.maxLag, lag)
+
+        stack, self.blockedStack = self.blockedStack, None
+        if stack is not None and lag > self.threshold:
+            self.recordStall(now, lag, stack)
+        self.scheduleBeat()
+
+    def recordStall(self, now: float, lag: float, stack: list[str]):
+        self.stallCount += 1
+        self.stalls.append(Stall(now, lag, stack))
+        logger.warning(
+            "Event loop blocked for %.0fms in:\n%s", lag * 1000, "".join(stack)
+        )
+        current = tracing.tracer()
+        if current is not None:
+            current.complete(
+                "stall",
+                "lag",
+                current.now() - lag * 1e6,
+                {"stack": "".join(stack[-5:])},
+            )
+
+    def watch(self):
+        """Runs on the watchdog thread, catching the loop while it's blocked."""
+        while not self.stopping.wait(self.interval):
+            blocked = time.monotonic() - self.expected
+            if blocked > self.threshold and self.blockedStack is None:
+                frame = sys._current_frames().get(self.loopThread)
+                if frame is not None:
+                    self.blockedStack = traceback.format_stack(frame)
+
+    def report(self) -> dict:
+        lags = self.lags
+        return {
+            "beats": self.beats,
+            "stalls": self.stallCount,
+            "mean_lag_ms": statistics.fmean(lags) * 1000 if lags else None,
+            "p99_lag_ms": percentileMs(lags, 0.99) if lags else None,
+            "max_lag_ms": self.maxLag * 1000,
+            "last_stall_ms": self.stalls[-1].seconds * 1000 if self.stalls else None,
+        }
+
+    def statusText(self) -> str:
+        report = self.report()
+        if report["mean_lag_ms"] is None:
+            return "Event loop lag: -"
+        return (
+            f"Event loop lag: {report['mean_lag_ms']:.0f}ms "
+            f"(p99 {report['p99_lag_ms']:.0f}ms, max {report['max_lag_ms']:.0f}ms, "
+            f"{report['stalls']} stalls)"
+        )
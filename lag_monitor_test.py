@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+from truth.truth import AssertThat
+
+from lag_monitor import LagMonitor, percentileMs
+
+
+def blockTheLoop():
+    time.sleep(0.3)
+
+
+def testStallCapturesBlockingStack():
+    monitor = LagMonitor(interval=0.02, threshold=0.1)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        asyncio.get_running_loop().call_soon(blockTheLoop)
+        await asyncio.sleep(0.2)
+        monitor.stop()
+
+    asyncio.run(run())
+
+    AssertThat(monitor.stallCount).IsEqualTo(1)
+    stall = monitor.stalls[-1]
+    AssertThat(stall.seconds).IsAtLeast(0.2)
+    AssertThat("".join(stall.stack)).Contains("blockTheLoop")
+    AssertThat(monitor.report()["max_lag_ms"]).IsAtLeast(200)
+
+
+def testNoStallsWhenIdle():
+    monitor = LagMonitor(interval=0.01, threshold=0.1)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.2)
+        monitor.stop()
+
+    asyncio.run(run())
+
+    AssertThat(monitor.stallCount).IsEqualTo(0)
+    AssertThat(monitor.beats).IsAtLeast(5)
+
+
+def testPercentileMs():
+    samples = [0.004, 0.001, 0.003, 0.002]
+    AssertThat(percentileMs(samples, 0.5)).IsEqualTo(3.0)
+    AssertThat(percentileMs(samples, 0.99)).IsEqualTo(4.0)
+    AssertThat(percentileMs([0.01], 0.9)).IsEqualTo(10.0)
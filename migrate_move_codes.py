@@ -0,0 +1,136 @@
+import os
+import re
+import sqlite3
+
+import chess
+
+from move_encoding import encodeMove
+
+# Converts the next_move columns of games.db and openings.db from SAN text to the
+# 16-bit move codes of move_encoding.py, which are smaller and don't need a legal
+# move generation per ply to write. SAN is only generated for the moves the panes
+# show. Databases that have been converted have their user_version set, and
+# update_positions.py and import_openings.py convert a database before adding to
+# it.
+
+MOVE_CODES_VERSION = 1
+
+MOVE_TABLES = ("game_positions", "opening_positions", "opening_move_evals")
+
+
+def uses_move_codes(con) -> bool:
+    return con.execute("PRAGMA user_version").fetchone()[0] >= MOVE_CODES_VERSION
+
+
+def table_exists(con, table) -> bool:
+    return (
+        con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        is not None
+    )
+
+
+def migrate_table(con, table, verbose=True):
+    """
+    Rebuilds the table with next_move as an INTEGER column holding move codes, as
+    SQLite would otherwise store the codes as text in a TEXT column.
+    """
+    # The SAN of a move depends only on the position, so each distinct one is
+    # converted once however many games played it.
+    con.execute("DROP TABLE IF EXISTS temp.move_codes")
+    con.execute(
+        """
+        CREATE TEMPORARY TABLE move_codes (
+            pos_id INTEGER, san TEXT, code INTEGER, PRIMARY KEY (pos_id, san))
+        """
+    )
+    moves = con.execute(
+        f"""
+        SELECT DISTINCT t.pos_id, p.epd, t.next_move
+        FROM {table} t JOIN positions p ON p.pos_id = t.pos_id
+        WHERE t.next_move IS NOT NULL
+        """
+    ).fetchall()
+    con.executemany(
+        "INSERT INTO move_codes VALUES (?, ?, ?)",
+        [
+            (pos_id, san, encodeMove(chess.Board(epd).parse_san(san)))
+            for (pos_id, epd, san) in moves
+        ],
+    )
+
+    (create_sql,) = con.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    index_sqls = [
+        sql
+        for (sql,) in con.execute(
+            """
+            SELECT sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+            """,
+            (table,),
+        )
+    ]
+    columns = [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+
+    create_sql = re.sub(
+        r"\bnext_move\s+TEXT\b", "next_move INTEGER", create_sql, flags=re.IGNORECASE
+    )
+    create_sql = create_sql.replace(table, f"{table}_new", 1)
+    selected = [
+        (
+            "(SELECT code FROM move_codes m"
+            " WHERE m.pos_id = t.pos_id AND m.san = t.next_move)"
+        )
+        if column == "next_move"
+        else f"t.{column}"
+        for column in columns
+    ]
+    con.execute(create_sql)
+    con.execute(
+        f"""
+        INSERT INTO {table}_new ({", ".join(columns)})
+        SELECT {", ".join(selected)} FROM {table} t
+        """
+    )
+    con.execute(f"DROP TABLE {table}")
+    con.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in index_sqls:
+        con.execute(sql)
+    con.execute("DROP TABLE temp.move_codes")
+    if verbose:
+        print(f"Converted {len(moves)} distinct moves in {table}")
+
+
+def migrate(con, verbose=True) -> bool:
+    """
+    Converts the database's moves to move codes if it hasn't been already.
+
+    Returns:
+        bool: Whether the database was converted.
+    """
+    if uses_move_codes(con):
+        return False
+    for table in MOVE_TABLES:
+        if table_exists(con, table):
+            migrate_table(con, table, verbose)
+    con.execute(f"PRAGMA user_version = {MOVE_CODES_VERSION}")
+    con.commit()
+    return True
+
+
+if __name__ == "__main__":
+    for file in (
+        "/Users/dan/github/chess/games.db",
+        "/Users/dan/github/chess/openings.db",
+    ):
+        before = os.path.getsize(file)
+        con = sqlite3.connect(file)
+        if migrate(con):
+            # Reclaims the space the SAN text took.
+            con.execute("VACUUM")
+        con.close()
+        after = os.path.getsize(file)
+        print(f"{file}: {before / (1 << 20):.1f}MB -> {after / (1 << 20):.1f}MB")
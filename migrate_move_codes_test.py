@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+
+import chess
+from truth.truth import AssertThat
+
+from database import GameDatabase, NotMigratedError
+from migrate_move_codes import MOVE_CODES_VERSION, migrate, uses_move_codes
+from move_encoding import codeSan, decodeMove
+
+
+def sanDatabase():
+    """A database written before moves were stored as codes."""
+    con = sqlite3.connect(":memory:")
+    con.executescript(
+        """
+        CREATE TABLE positions (pos_id INTEGER PRIMARY KEY, epd TEXT UNIQUE);
+        CREATE TABLE game_positions (
+            game_pos_id INTEGER PRIMARY KEY,
+            pos_id INTEGER,
+            ply INTEGER,
+            game_id INTEGER,
+            last_game_pos_id INTEGER,
+            next_move TEXT
+        );
+        CREATE INDEX game_positions_pos ON game_positions (pos_id);
+        """
+    )
+    board = chess.Board()
+    last = None
+    for ply, san in enumerate(["e4", "e5", "Nf3", "Nc6", "Bb5", None]):
+        con.execute("INSERT OR IGNORE INTO positions (epd) VALUES (?)", (board.epd(),))
+        (pos_id,) = con.execute(
+            "SELECT pos_id FROM positions WHERE epd = ?", (board.epd(),)
+        ).fetchone()
+        cur = con.execute(
+            """
+            INSERT INTO game_positions (
+                pos_id, ply, game_id, last_game_pos_id, next_move)
+            VALUES (?, ?, 1, ?, ?)
+            """,
+            (pos_id, ply, last, san),
+        )
+        last = cur.lastrowid
+        if san is not None:
+            board.push_san(san)
+    return con
+
+
+def testMigrateConvertsSanToCodes():
+    con = sanDatabase()
+
+    AssertThat(migrate(con, verbose=False)).IsTrue()
+
+    rows = con.execute(
+        """
+        SELECT p.epd, g.next_move, typeof(g.next_move)
+        FROM game_positions g JOIN positions p ON p.pos_id = g.pos_id
+        ORDER BY g.ply
+        """
+    ).fetchall()
+    AssertThat([codeSan(epd, code) for (epd, code, _) in rows[:-1]]).IsEqualTo(
+        ["e4", "e5", "Nf3", "Nc6", "Bb5"]
+    )
+    AssertThat({kind for (_, _, kind) in rows[:-1]}).IsEqualTo({"integer"})
+    AssertThat(rows[-1][1]).IsNone()
+    AssertThat(decodeMove(rows[0][1])).IsEqualTo(chess.Move.from_uci("e2e4"))
+
+    indexes = [
+        name
+        for (name,) in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )
+    ]
+    AssertThat(indexes).Contains("game_positions_pos")
+    AssertThat(con.execute("PRAGMA user_version").fetchone()[0]).IsEqualTo(
+        MOVE_CODES_VERSION
+    )
+
+
+def testMigrateOnlyOnce():
+    con = sanDatabase()
+    migrate(con, verbose=False)
+
+    AssertThat(uses_move_codes(con)).IsTrue()
+    AssertThat(migrate(con, verbose=False)).IsFalse()
+
+
+def testNewDatabaseUsesMoveCodes(tmp_path):
+    games_file = str(tmp_path / "games.db")
+
+    async def lookupEval():
+        database = GameDatabase(games_file)
+        try:
+            await database.conn()
+            return await database.lookupEval(chess.Board().epd())
+        finally:
+            await database.close()
+
+    AssertThat(asyncio.run(lookupEval())).IsNone()
+    con = sqlite3.connect(games_file)
+    AssertThat(uses_move_codes(con)).IsTrue()
+
+
+def testUnmigratedDatabaseConnectsOnceMigrated(tmp_path):
+    games_file = str(tmp_path / "games.db")
+    con = sqlite3.connect(games_file)
+    source = sanDatabase()
+    source.commit()
+    source.backup(con)
+
+    async def connect(database):
+        try:
+            await database.conn()
+            return None
+        except NotMigratedError as e:
+            return e
+
+    async def retry():
+        database = GameDatabase(games_file)
+        try:
+            AssertThat(await database.lookupEval(chess.Board().epd())).IsNone()
+            AssertThat(await connect(database)).IsInstanceOf(NotMigratedError)
+            migrate(con, verbose=False)
+            AssertThat(await connect(database)).IsNone()
+        finally:
+            await database.close()
+
+    asyncio.run(retry())
+
+
+def testLookupIsRetriedOnceMigrated(tmp_path):
+    lookupRetriedOnceMigrated(str(tmp_path / "games.db"))
+
+
+def testColumnsAreLoadedOnceMigrated(tmp_path):
+    lookupRetriedOnceMigrated(str(tmp_path / "games.db"), columns=True)
+
+
+def lookupRetriedOnceMigrated(games_file, **kwargs):
+    con = sqlite3.connect(games_file)
+    source = sanDatabase()
+    source.commit()
+    source.backup(con)
+    con.execute("CREATE TABLE games (game_id INTEGER PRIMARY KEY, white, result)")
+    con.execute("INSERT INTO games VALUES (1, 'me', '1-0')")
+    con.commit()
+    epds = [chess.Board().epd()]
+
+    async def lookup(database):
+        try:
+            return await asyncio.wait_for(
+                database.lookupPositions(epds, chess.WHITE), timeout=5
+            )
+        except NotMigratedError as e:
+            return e
+
+    async def retry():
+        database = GameDatabase(games_file, username="me", **kwargs)
+        try:
+            AssertThat(await lookup(database)).IsInstanceOf(NotMigratedError)
+            AssertThat(await lookup(database)).IsInstanceOf(NotMigratedError)
+            migrate(con, verbose=False)
+            return await lookup(database)
+        finally:
+            await database.close()
+
+    [(code, count, user_plays_white, win, draw, loss)] = asyncio.run(retry())
+    AssertThat(decodeMove(code)).IsEqualTo(chess.Move.from_uci("e2e4"))
+    AssertThat((count, user_plays_white, win, draw, loss)).IsEqualTo((1, 1, 1, 0, 0))
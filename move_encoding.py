@@ -0,0 +1,76 @@
+"""
+Compact binary encoding of a game's mainline, so that replaying a stored game
+doesn't need its PGN to be parsed.
+
+Each move is a little-endian 16-bit code: the from square in the low 6 bits, the to
+square in the next 6 and the promotion piece type (or 0) in the 3 above them.
+Moves are from the standard starting position.
+"""
+import functools
+import sys
+from array import array
+from typing import Iterable, Iterator, Optional
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+MOVE_BYTES = 2
+SAN_CACHE_SIZE = 4096
+
+
+def encodeMove(move: chess.Move) -> int:
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+@functools.lru_cache(maxsize=None)
+def decodeMove(code: int) -> chess.Move:
+    # At most 64 * 64 * 5 distinct moves, so they're all worth keeping.
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+@functools.lru_cache(maxsize=SAN_CACHE_SIZE)
+def codeSan(epd: str, code: int) -> str:
+    """The SAN of the encoded move from the position, for showing stored moves."""
+    return chess.Board(epd).san(decodeMove(code))
+
+
+def encodeMoves(moves: Iterable[chess.Move]) -> bytes:
+    codes = array("H", (encodeMove(move) for move in moves))
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return codes.tobytes()
+
+
+def decodeMoves(blob: bytes) -> list[chess.Move]:
+    codes = array("H", blob)
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return [decodeMove(code) for code in codes]
+
+
+def encodeGame(game: chess.pgn.Game) -> Optional[bytes]:
+    """Encodes the game's mainline, or returns None if it has a custom start."""
+    if "FEN" in game.headers:
+        return None
+    return encodeMoves(game.mainline_moves())
+
+
+def replay(blob: bytes, board: Optional[chess.Board] = None) -> Iterator[chess.Board]:
+    """
+    Yields the board at each ply, starting with the position before the first move.
+    The same board is yielded each time, with the next move pushed onto it, so it
+    must be copied to be kept.
+    """
+    if board is None:
+        board = chess.Board()
+    yield board
+    for move in decodeMoves(blob):
+        board.push(move)
+        yield board
+
+
+def zobristHashes(blob: bytes) -> Iterator[int]:
+    """Yields the polyglot Zobrist hash of the position at each ply."""
+    for board in replay(blob):
+        yield chess.polyglot.zobrist_hash(board)
@@ -0,0 +1,57 @@
+import io
+
+import chess
+import chess.pgn
+import chess.polyglot
+from truth.truth import AssertThat
+
+from move_encoding import (
+    MOVE_BYTES,
+    decodeMove,
+    decodeMoves,
+    encodeGame,
+    encodeMove,
+    encodeMoves,
+    replay,
+    zobristHashes,
+)
+
+
+def testEncodeMoveRoundTrips():
+    for uci in ("e2e4", "a1h8", "h8a1", "e1g1", "e7e8q", "b2a1n", "g7g8r", "c7c8b"):
+        move = chess.Move.from_uci(uci)
+        AssertThat(encodeMove(move)).IsLessThan(1 << 16)
+        AssertThat(decodeMove(encodeMove(move))).IsEqualTo(move)
+
+
+def testEncodeMovesIsTwoBytesPerMove():
+    board = chess.Board()
+    moves = []
+    for san in ("e4", "e5", "Nf3", "Nc6", "Bc4", "Nf6", "O-O"):
+        moves.append(board.push_san(san))
+
+    blob = encodeMoves(moves)
+
+    AssertThat(blob).HasSize(len(moves) * MOVE_BYTES)
+    AssertThat(decodeMoves(blob)).IsEqualTo(moves)
+
+
+def testReplayYieldsEveryPly():
+    with open("win.pgn") as f:
+        game = chess.pgn.read_game(f)
+    blob = encodeGame(game)
+
+    expected = [game.board().epd()] + [node.board().epd() for node in game.mainline()]
+    AssertThat([board.epd() for board in replay(blob)]).IsEqualTo(expected)
+
+    hashes = [chess.polyglot.zobrist_hash(game.board())] + [
+        chess.polyglot.zobrist_hash(node.board()) for node in game.mainline()
+    ]
+    AssertThat(list(zobristHashes(blob))).IsEqualTo(hashes)
+
+
+def testGameFromCustomPositionIsNotEncoded():
+    game = chess.pgn.read_game(
+        io.StringIO('[FEN "4k3/8/8/8/8/8/4P3/4K3 w - - 0 1"]\n\n1. e4 *')
+    )
+    AssertThat(encodeGame(game)).IsNone()
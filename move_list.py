@@ -1,7 +1,11 @@
-from PySide6.QtWidgets import QWidget, QLabel, QPushButton
-from PySide6 import QtWidgets, QtCore
+from typing import Optional
+
+from PySide6 import QtCore, QtGui, QtWidgets
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QColorConstants
 
 import chess
+from tracing import traced
 
 MOVE_NUMBER_COLUMN = 0
 WHITE_MOVE_COLUMN = 1
@@ -13,177 +17,246 @@ NUM_COLUMNS = 5
 
 BOOK_ASSESSMENT_TEXT = "\U0001F4D6"
 
+CURRENT_MOVE_ROLE = Qt.UserRole
+BOOK_MOVE_ROLE = Qt.UserRole + 1
 
-class MoveList(QtWidgets.QScrollArea):
-    MOVE_STYLE = """
-    padding-left: 8px;
-    padding-right: 8px;
-    padding-top: 4px;
-    padding-bottom: 2px;
-    text-align: left;
-    color: white;
-    border: none;
-    """
 
-    CURRENT_MOVE_STYLE = (
-        MOVE_STYLE
-        + """
-    background-color: lightgray;
-    color: black;
+def plyFromTurnAndNumber(turnAndNumber: Optional[tuple[chess.Color, int]]):
+    if turnAndNumber is None:
+        return None
+    turn, number = turnAndNumber
+    return (number - 1) * 2 + (turn == chess.BLACK)
+
+
+class MoveListModel(QtCore.QAbstractTableModel):
+    """
+    The moves of the game as rows of (number, white move, white assessment, black
+    move, black assessment). Updates only signal the cells that changed so the
+    view repaints just those.
     """
-    )
+
+    sans: list[str]
+    book: list[bool]
+    currentPly: Optional[int]
 
     def __init__(self):
         super().__init__()
-        self.setMoves(None, [])
-        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        (left, _, right, _) = self.move_grid.getContentsMargins()
-        self.setMinimumWidth(250 + left + right)
-
-    def removeMove(self, row, color):
-        if color == chess.BLACK:
-            item = self.move_grid.itemAtPosition(row, BLACK_MOVE_COLUMN)
+        self.sans = []
+        self.book = []
+        self.currentPly = None
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else (len(self.sans) + 1) // 2
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else NUM_COLUMNS
+
+    def plyAt(self, index: QtCore.QModelIndex) -> Optional[int]:
+        """Returns the ply of the move in a cell, or None for the number column."""
+        column = index.column()
+        if column == MOVE_NUMBER_COLUMN:
+            return None
+        ply = index.row() * 2 + (column >= BLACK_MOVE_COLUMN)
+        return ply if ply < len(self.sans) else None
+
+    def moveIndex(self, ply: int) -> QtCore.QModelIndex:
+        return self.index(ply // 2, BLACK_MOVE_COLUMN if ply % 2 else WHITE_MOVE_COLUMN)
+
+    def data(self, index: QtCore.QModelIndex, role=Qt.DisplayRole):
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == MOVE_NUMBER_COLUMN:
+                return str(index.row() + 1)
+            if column in (WHITE_MOVE_COLUMN, BLACK_MOVE_COLUMN):
+                ply = self.plyAt(index)
+                return None if ply is None else self.sans[ply]
+        elif role == CURRENT_MOVE_ROLE:
+            return column in (
+                WHITE_MOVE_COLUMN,
+                BLACK_MOVE_COLUMN,
+            ) and self.plyAt(index) == self.currentPly
+        elif role == BOOK_MOVE_ROLE:
+            if column in (WHITE_ASSESSMENT_COLUMN, BLACK_ASSESSMENT_COLUMN):
+                ply = self.plyAt(index)
+                return ply is not None and self.book[ply]
+            return False
+        return None
+
+    def plyChanged(
+        self, ply: int, first=WHITE_MOVE_COLUMN, last=BLACK_ASSESSMENT_COLUMN
+    ):
+        row = ply // 2
+        self.dataChanged.emit(self.index(row, first), self.index(row, last))
+
+    def setMoves(self, sans: list[str]):
+        self.beginResetModel()
+        self.sans = sans
+        self.book = [False] * len(sans)
+        self.currentPly = None
+        self.endResetModel()
+
+    def setCurrentPly(self, ply: Optional[int]):
+        old = self.currentPly
+        self.currentPly = ply
+        for changed in (old, ply):
+            if changed is not None and changed < len(self.sans):
+                index = self.moveIndex(changed)
+                self.dataChanged.emit(index, index)
+
+    def setBookMoves(self, startPly: int, bookMoves: list[bool]):
+        # The lookup is asynchronous, so the moves may have been truncated since.
+        endPly = min(startPly + len(bookMoves), len(self.sans))
+        if startPly >= endPly:
+            return
+        self.book[startPly:endPly] = bookMoves[: endPly - startPly]
+        self.dataChanged.emit(
+            self.index(startPly // 2, WHITE_ASSESSMENT_COLUMN),
+            self.index((endPly - 1) // 2, BLACK_ASSESSMENT_COLUMN),
+        )
+
+    def appendMove(self, san: str):
+        ply = len(self.sans)
+        if ply % 2 == 0:
+            row = ply // 2
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.sans.append(san)
+            self.book.append(False)
+            self.endInsertRows()
+        else:
+            self.sans.append(san)
+            self.book.append(False)
+            self.plyChanged(ply, first=BLACK_MOVE_COLUMN)
+
+    def truncate(self, ply: int):
+        """Removes the move at ply and every move after it."""
+        if ply >= len(self.sans):
+            return
+        rows = self.rowCount()
+        remainingRows = (ply + 1) // 2
+        if remainingRows < rows:
+            self.beginRemoveRows(QtCore.QModelIndex(), remainingRows, rows - 1)
+            del self.sans[ply:]
+            del self.book[ply:]
+            self.endRemoveRows()
         else:
-            item = self.move_grid.itemAtPosition(row, WHITE_MOVE_COLUMN)
-            # if removing the white move then also remove the move number.
-            self.move_grid.itemAtPosition(row, 0).widget().setParent(None)
-            self.move_grid.setRowMinimumHeight(row, 0)
-            self.move_grid.setRowStretch(row, 0)
+            del self.sans[ply:]
+            del self.book[ply:]
+        if ply % 2:
+            self.plyChanged(ply, first=BLACK_MOVE_COLUMN)
+        if self.currentPly is not None and self.currentPly >= ply:
+            self.currentPly = None
 
-        item.widget().setParent(None)
 
-    def createClickableLabel(self, text, turnAndMove):
-        label = QPushButton(text)
-        label.setStyleSheet(MoveList.MOVE_STYLE)
-        if turnAndMove is not None:
-            label.clicked.connect(lambda: self.controller.selectMove(*turnAndMove))
-        return label
+class MoveDelegate(QtWidgets.QStyledItemDelegate):
+    """Paints the moves, the current move highlight and the book markers."""
+
+    TEXT_COLOR = QColorConstants.White
+    CURRENT_MOVE_TEXT_COLOR = QColorConstants.Black
+    CURRENT_MOVE_BACKGROUND = QColorConstants.Svg.lightgray
+    MARGINS = QtCore.QMargins(8, 4, 8, 2)
+
+    def paint(
+        self,
+        painter: QtGui.QPainter,
+        option: QtWidgets.QStyleOptionViewItem,
+        index: QtCore.QModelIndex,
+    ) -> None:
+        rect = option.rect.marginsRemoved(MoveDelegate.MARGINS)
+        if index.data(CURRENT_MOVE_ROLE):
+            painter.fillRect(option.rect, MoveDelegate.CURRENT_MOVE_BACKGROUND)
+            painter.setPen(MoveDelegate.CURRENT_MOVE_TEXT_COLOR)
+        else:
+            painter.setPen(MoveDelegate.TEXT_COLOR)
+
+        if index.data(BOOK_MOVE_ROLE):
+            text = BOOK_ASSESSMENT_TEXT
+        else:
+            text = index.data(Qt.DisplayRole)
+        if text:
+            painter.drawText(rect, Qt.AlignLeft | Qt.AlignVCenter, text)
+
+
+class MoveList(QtWidgets.QTableView):
+    moveModel: MoveListModel
+
+    def __init__(self):
+        super().__init__()
+        self.controller = None
+        self.moveModel = MoveListModel()
+        self.setModel(self.moveModel)
+        self.setItemDelegate(MoveDelegate(self))
+
+        self.horizontalHeader().hide()
+        self.verticalHeader().hide()
+        self.setShowGrid(False)
+        self.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        # Leave the arrow keys to the navigation shortcuts.
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+
+        # Fixed row and column sizes let the view lay out only the visible rows.
+        fm = self.fontMetrics()
+        margins = MoveDelegate.MARGINS
+        vertical = self.verticalHeader()
+        vertical.setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        vertical.setDefaultSectionSize(fm.height() + margins.top() + margins.bottom())
+        horizontal = self.horizontalHeader()
+        horizontal.setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        horizontal.setStretchLastSection(True)
+        padding = margins.left() + margins.right()
+        moveWidth = fm.horizontalAdvance("Qxf8=Q+") + padding
+        assessmentWidth = fm.horizontalAdvance(BOOK_ASSESSMENT_TEXT) + padding
+        for column, width in (
+            (MOVE_NUMBER_COLUMN, fm.horizontalAdvance("000") + padding),
+            (WHITE_MOVE_COLUMN, moveWidth),
+            (WHITE_ASSESSMENT_COLUMN, assessmentWidth),
+            (BLACK_MOVE_COLUMN, moveWidth),
+        ):
+            self.setColumnWidth(column, width)
+
+        self.clicked.connect(self.moveClicked)
+        self.setMinimumWidth(250)
+
+    def moveClicked(self, index: QtCore.QModelIndex):
+        ply = self.moveModel.plyAt(index)
+        if ply is None or self.controller is None:
+            return
+        self.controller.selectMove(
+            chess.BLACK if ply % 2 else chess.WHITE, ply // 2 + 1
+        )
 
     def setBookMoves(self, startPly: int, bookMoves: list[bool]):
-        row = startPly // 2
-        for i in range(0, len(bookMoves)):
-            ply = startPly + i
-            annotateText = BOOK_ASSESSMENT_TEXT if bookMoves[i] else ""
-            if ply % 2:
-                # Black move
-                self.move_grid.itemAtPosition(
-                    row, BLACK_ASSESSMENT_COLUMN
-                ).widget().setText(annotateText)
-                row += 1
-            else:
-                # White move
-                self.move_grid.itemAtPosition(
-                    row, WHITE_ASSESSMENT_COLUMN
-                ).widget().setText(annotateText)
+        self.moveModel.setBookMoves(startPly, bookMoves)
 
+    @traced("pane")
     def setMoves(self, controller, moves):
-        # Resetting the grid layout itself seems to be very difficult in pyside
-        # since you don't seem able to actually delete the layout, so just
-        # recreate the widget every time we add a new set of moves.
         self.controller = controller
-        self.widget = QWidget()
-        self.setWidget(self.widget)
-        self.move_grid = QtWidgets.QGridLayout()
-        self.widget.setLayout(self.move_grid)
-
-        self.move_grid.setSpacing(0)
-        self.move_grid.setColumnStretch(BLACK_ASSESSMENT_COLUMN + 1, 1)
-        self.move_grid.setSizeConstraint(QtWidgets.QLayout.SetMinimumSize)
-
-        moves = iter(moves)
-        row = 0
-        try:
-            while True:
-                white_move = next(moves)
-
-                move_number = row + 1
-                number_label = self.createClickableLabel(str(move_number), None)
-                self.move_grid.addWidget(number_label, row, MOVE_NUMBER_COLUMN)
-                if self.move_grid.itemAtPosition(row, WHITE_MOVE_COLUMN):
-                    self.move_grid.itemAtPosition(
-                        row, WHITE_MOVE_COLUMN
-                    ).widget().setText(white_move.san())
-                else:
-                    white_move_label = self.createClickableLabel(
-                        white_move.san(), (chess.WHITE, move_number)
-                    )
-                    white_book_label = self.createClickableLabel(
-                        "", (chess.WHITE, move_number)
-                    )
-                    self.move_grid.addWidget(white_move_label, row, WHITE_MOVE_COLUMN)
-                    self.move_grid.addWidget(
-                        white_book_label, row, WHITE_ASSESSMENT_COLUMN
-                    )
-                black_move_label = self.createClickableLabel(
-                    next(moves).san(), (chess.BLACK, move_number)
-                )
-                black_book_label = self.createClickableLabel(
-                    "", (chess.BLACK, move_number)
-                )
-
-                self.move_grid.addWidget(black_move_label, row, BLACK_MOVE_COLUMN)
-                self.move_grid.addWidget(black_book_label, row, BLACK_ASSESSMENT_COLUMN)
-                black_move_label.setStyleSheet(MoveList.MOVE_STYLE)
-                row = move_number
-        except StopIteration:
-            pass
-
-        self.move_grid.setRowStretch(row + 1, 1)
-
-    def styleMove(self, turnAndNumber, style, ensureVisible=False):
-        if turnAndNumber is None:
-            # This is the 0th move before anything has started
-            if ensureVisible:
-                self.ensureVisible(0, 0)
-        else:
-            turn, number = turnAndNumber
-            item = self.move_grid.itemAtPosition(number - 1, 3 - 2 * int(turn))
-            if item is not None:
-                item.widget().setStyleSheet(style)
-                if ensureVisible:
-                    QtCore.QTimer.singleShot(
-                        0, lambda: self.ensureWidgetVisible(item.widget())
-                    )
+        # Convert along the mainline rather than with ChildNode.san(), which
+        # replays the game from the start for every move.
+        sans = []
+        board = None
+        for node in moves:
+            if board is None:
+                board = node.parent.board()
+            sans.append(board.san(node.move))
+            board.push(node.move)
+        self.moveModel.setMoves(sans)
 
     def setCurrentMove(self, new, old):
-        if old != new:
-            self.styleMove(old, MoveList.MOVE_STYLE)
-
-        self.styleMove(new, MoveList.CURRENT_MOVE_STYLE, ensureVisible=True)
+        ply = plyFromTurnAndNumber(new)
+        self.moveModel.setCurrentPly(ply)
+        if ply is None:
+            self.scrollToTop()
+        elif ply < len(self.moveModel.sans):
+            self.scrollTo(self.moveModel.moveIndex(ply))
 
     def addMove(self, turnAndNumber, move):
-        turn, number = turnAndNumber
-        row = number - 1
-        move_label = self.createClickableLabel(move, turnAndNumber)
-        book_label = self.createClickableLabel("", (chess.WHITE, number))
-        if turn == chess.WHITE:
-            number_label = self.createClickableLabel(str(number), turnAndNumber)
-            self.move_grid.addWidget(number_label, row, MOVE_NUMBER_COLUMN)
-            self.move_grid.addWidget(move_label, row, WHITE_MOVE_COLUMN)
-            self.move_grid.addWidget(book_label, row, WHITE_ASSESSMENT_COLUMN)
-
-        else:
-            self.move_grid.addWidget(move_label, row, BLACK_MOVE_COLUMN)
-            self.move_grid.addWidget(book_label, row, BLACK_ASSESSMENT_COLUMN)
+        ply = plyFromTurnAndNumber(turnAndNumber)
+        self.moveModel.truncate(ply)
+        self.moveModel.appendMove(move)
 
     def removeMoves(self, turnAndNumber):
-        turn, number = turnAndNumber
-        row = number - 1
-        if turn == chess.BLACK:
-            # Delete the black move and increment, then increment the number before starting the
-            # loop
-            if (
-                item := self.move_grid.itemAtPosition(row, BLACK_MOVE_COLUMN)
-            ) is not None:
-                if (widget := item.widget()) is not None:
-                    widget.setParent(None)
-                    self.move_grid.itemAtPosition(
-                        row, BLACK_ASSESSMENT_COLUMN
-                    ).widget().setParent(None)
-            row = row + 1
-
-        for t in range(row, self.move_grid.rowCount()):
-            for i in range(0, NUM_COLUMNS):
-                item = self.move_grid.itemAtPosition(t, i)
-                if item is not None:
-                    item.widget().setParent(None)
+        self.moveModel.truncate(plyFromTurnAndNumber(turnAndNumber))
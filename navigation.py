@@ -0,0 +1,56 @@
+import time
+from collections import deque
+from typing import Optional
+
+RATE_WINDOW_SECONDS = 2.0
+
+
+class NavigationQueue:
+    """
+    Accumulates steps through the game (in plies) until the controller applies
+    them, so that steps which arrive while the board is still animating are
+    coalesced into a single jump, and measures the navigation throughput.
+    """
+
+    pending: int
+    history: deque[tuple[float, int]]
+
+    def __init__(self, window: float = RATE_WINDOW_SECONDS):
+        self.pending = 0
+        self.window = window
+        self.history = deque()
+        self.totalPlies = 0
+        self.skippedPlies = 0
+
+    def push(self, plies: int) -> None:
+        self.pending += plies
+
+    def take(self) -> int:
+        plies = self.pending
+        self.pending = 0
+        return plies
+
+    def clear(self) -> None:
+        self.pending = 0
+
+    def record(self, plies: int, skipped: int, now: Optional[float] = None) -> None:
+        """
+        Records that plies were navigated, of which skipped were applied without
+        being animated.
+        """
+        if now is None:
+            now = time.monotonic()
+        self.history.append((now, plies))
+        self.totalPlies += plies
+        self.skippedPlies += skipped
+        while self.history and self.history[0][0] < now - self.window:
+            self.history.popleft()
+
+    def pliesPerSecond(self, now: Optional[float] = None) -> float:
+        """Returns the navigation rate over the last window seconds."""
+        if now is None:
+            now = time.monotonic()
+        return (
+            sum(plies for (when, plies) in self.history if when >= now - self.window)
+            / self.window
+        )
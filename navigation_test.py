@@ -0,0 +1,38 @@
+from truth.truth import AssertThat
+
+from navigation import NavigationQueue
+
+
+def testPushesCoalesceIntoOneTake():
+    queue = NavigationQueue()
+    queue.push(1)
+    queue.push(1)
+    queue.push(-3)
+    queue.push(2)
+
+    AssertThat(queue.take()).IsEqualTo(1)
+    AssertThat(queue.take()).IsEqualTo(0)
+
+
+def testClearDropsPendingSteps():
+    queue = NavigationQueue()
+    queue.push(5)
+    queue.clear()
+
+    AssertThat(queue.take()).IsEqualTo(0)
+
+
+def testRateWindowExpiresOldRecords():
+    queue = NavigationQueue(window=2.0)
+    queue.record(4, 0, now=10.0)
+    queue.record(6, 5, now=11.0)
+
+    AssertThat(queue.pliesPerSecond(now=11.5)).IsEqualTo(5.0)
+    # The first record is older than the window by then.
+    AssertThat(queue.pliesPerSecond(now=12.5)).IsEqualTo(3.0)
+    AssertThat(queue.pliesPerSecond(now=20.0)).IsEqualTo(0.0)
+
+    queue.record(2, 0, now=13.5)
+    AssertThat(list(queue.history)).IsEqualTo([(13.5, 2)])
+    AssertThat(queue.totalPlies).IsEqualTo(12)
+    AssertThat(queue.skippedPlies).IsEqualTo(5)
@@ -0,0 +1,120 @@
+import statistics
+from typing import Optional
+
+from PySide6 import QtCore, QtGui
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QLabel, QWidget
+
+from controller import Controller
+from database import ChessDatabase
+from lag_monitor import LagMonitor, percentileMs
+
+REFRESH_MS = 500
+
+
+def databaseLine(name: str, database: ChessDatabase) -> str:
+    lookups = database.hits + database.misses
+    rate = f"{database.hits / lookups:4.0%}" if lookups else "   -"
+    return f"{name:10} hits {rate} of {lookups:<6} in flight {database.inFlight}"
+
+
+def engineLine(controller: Controller) -> str:
+    info = controller.engine_output.lastInfo
+    if info is None or "source" in info:
+        return f"{'Engine':10} -"
+    nps = info.get("nps")
+    speed = "-" if nps is None else f"{nps / 1e6:.2f}M"
+    return f"{'Engine':10} depth {info.get('depth')}  {speed} nodes/s"
+
+
+def stageLine(name: str, report: dict) -> str:
+    wait = report["mean_wait_ms"]
+    wait = "-" if wait is None else f"{wait:.0f}ms"
+    return (
+        f"{name.capitalize():10} done {report['completed']}/{report['requests']}  "
+        f"superseded {report['superseded']}  wait {wait}"
+    )
+
+
+def hudText(controller: Controller, lag_monitor: Optional[LagMonitor] = None) -> str:
+    """The HUD's readout, from counters the controller and its widgets keep."""
+    lines = [
+        databaseLine("Games", controller.game_database),
+        databaseLine("Openings", controller.opening_database),
+        engineLine(controller),
+    ]
+
+    columns_bytes = controller.game_database.backendBytes()
+    if columns_bytes is not None:
+        lines.insert(1, f"{'Columns':10} {columns_bytes / (1 << 20):.1f}MB in memory")
+
+    draws = controller.chess_board.drawTimes
+    if draws:
+        lines.append(
+            f"{'Draw':10} mean {statistics.fmean(draws) * 1000:.1f}ms  "
+            f"max {max(draws) * 1000:.1f}ms"
+        )
+
+    ready = controller.readyLatencies
+    if ready:
+        lines.append(
+            f"{'Ready':10} p50 {percentileMs(ready, 0.5):.0f}ms  "
+            f"p90 {percentileMs(ready, 0.9):.0f}ms  (last {len(ready)})"
+        )
+    lines.append(
+        f"{'Navigation':10} {controller.navigation.pliesPerSecond():.1f} plies/s  "
+        f"queued {controller.scheduler.queueDepth()}"
+    )
+    for name, report in controller.scheduler.report()["stages"].items():
+        lines.append(stageLine(name, report))
+
+    if lag_monitor is not None:
+        report = lag_monitor.report()
+        if report["mean_lag_ms"] is not None:
+            lines.append(
+                f"{'Loop lag':10} mean {report['mean_lag_ms']:.0f}ms  "
+                f"max {report['max_lag_ms']:.0f}ms  stalls {report['stalls']}"
+            )
+    return "\n".join(lines)
+
+
+class PerfHud(QLabel):
+    """
+    An overlay of live performance numbers. It only reads counters that are kept
+    anyway, and only while it's shown, so it can be left on.
+    """
+
+    controller: Optional[Controller]
+    lag_monitor: Optional[LagMonitor]
+    timer: QtCore.QTimer
+
+    def __init__(self, parent: QWidget, lag_monitor: Optional[LagMonitor] = None):
+        super().__init__(parent)
+        self.controller = None
+        self.lag_monitor = lag_monitor
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.setStyleSheet("color: white; background: rgba(0, 0, 0, 170); padding: 6px")
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def setController(self, controller: Controller):
+        self.controller = controller
+        self.refresh()
+
+    def toggle(self):
+        if self.isVisible():
+            self.timer.stop()
+            self.hide()
+        else:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start(REFRESH_MS)
+
+    def refresh(self):
+        if self.controller is None:
+            return
+        self.setText(hudText(self.controller, self.lag_monitor))
+        self.adjustSize()
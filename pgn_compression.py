@@ -0,0 +1,93 @@
+"""
+PGN text stored compressed with zstd, using a dictionary trained on the games
+themselves by compress_pgns.py. Lichess PGNs repeat the same headers and
+[%clk]/[%eval] comments, which the dictionary holds once instead of each game.
+
+A PGN column holds text for games stored before the database was compressed, or
+a zstd frame as a BLOB, which names the dictionary it was compressed with. The
+dictionaries are kept in the database's pgn_dictionaries table.
+"""
+import sqlite3
+from typing import Iterable, Optional, Union
+
+import zstandard
+
+COMPRESSION_LEVEL = 9
+
+DICTIONARIES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pgn_dictionaries (
+    id INTEGER PRIMARY KEY,
+    dict_id INTEGER UNIQUE,
+    data BLOB NOT NULL
+);
+"""
+
+DICTIONARIES_SQL = "SELECT data FROM pgn_dictionaries ORDER BY id"
+
+
+class PgnCodec:
+    """
+    Compresses PGNs with the newest dictionary and decompresses them with
+    whichever they were compressed with.
+    """
+
+    dictionaries: dict[int, zstandard.ZstdCompressionDict]
+    decompressors: dict[int, zstandard.ZstdDecompressor]
+    compressor: Optional[zstandard.ZstdCompressor]
+    dictId: Optional[int]
+
+    def __init__(self, dictionaries: Iterable[bytes] = ()):
+        """
+        Args:
+            dictionaries: The dictionaries' data, oldest first.
+        """
+        self.dictionaries = {}
+        self.decompressors = {}
+        self.compressor = None
+        self.dictId = None
+        for data in dictionaries:
+            self.addDictionary(data)
+
+    def addDictionary(self, data: bytes) -> int:
+        """Adds a dictionary, which PGNs are compressed with from now on."""
+        dictionary = zstandard.ZstdCompressionDict(data)
+        self.dictId = dictionary.dict_id()
+        self.dictionaries[self.dictId] = dictionary
+        self.compressor = zstandard.ZstdCompressor(
+            level=COMPRESSION_LEVEL, dict_data=dictionary
+        )
+        return self.dictId
+
+    def compress(self, pgn: str) -> Union[str, bytes]:
+        """Compresses the PGN, or leaves it as text if there's no dictionary yet."""
+        if self.compressor is None:
+            return pgn
+        return self.compressor.compress(pgn.encode())
+
+    def decompress(self, value: Union[str, bytes, None]) -> Optional[str]:
+        """The text of a PGN column's value."""
+        if value is None or isinstance(value, str):
+            return value
+        dict_id = frameDictId(value)
+        decompressor = self.decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self.dictionaries:
+                raise ValueError(f"PGN compressed with unknown dictionary {dict_id}")
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self.dictionaries.get(dict_id)
+            )
+            self.decompressors[dict_id] = decompressor
+        return decompressor.decompress(value).decode()
+
+
+def frameDictId(value: bytes) -> int:
+    """The dictionary a compressed PGN was compressed with, or 0 for none."""
+    return zstandard.get_frame_parameters(value).dict_id
+
+
+def loadCodec(con: sqlite3.Connection) -> PgnCodec:
+    try:
+        return PgnCodec(data for (data,) in con.execute(DICTIONARIES_SQL))
+    except sqlite3.OperationalError:
+        # The database hasn't been compressed, so has no dictionaries table.
+        return PgnCodec()
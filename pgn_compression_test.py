@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+
+from truth.truth import AssertThat
+
+import generate_databases
+import update_positions
+from compress_pgns import compress_pgns
+from database import GameDatabase
+from pgn_compression import PgnCodec, loadCodec
+
+
+def pgns(con) -> dict[int, str]:
+    codec = loadCodec(con)
+    return {
+        game_id: codec.decompress(pgn)
+        for (game_id, pgn) in con.execute("SELECT game_id, pgn FROM games")
+    }
+
+
+def testCompressPgns(tmp_path):
+    games_file = str(tmp_path / "games.db")
+    con = sqlite3.connect(games_file)
+    generate_databases.generateGames(con, 40, seed=4)
+    update_positions.update_positions(con, verbose=False)
+    original = pgns(con)
+
+    AssertThat(compress_pgns(con, verbose=False)).IsEqualTo(80)
+
+    AssertThat(
+        {kind for (kind,) in con.execute("SELECT typeof(pgn) FROM raw_games")}
+    ).IsEqualTo({"blob"})
+    AssertThat(pgns(con)).IsEqualTo(original)
+    # Only PGNs that aren't compressed with the newest dictionary are redone.
+    AssertThat(compress_pgns(con, verbose=False)).IsEqualTo(0)
+    AssertThat(compress_pgns(con, retrain=True, verbose=False)).IsEqualTo(80)
+    AssertThat(pgns(con)).IsEqualTo(original)
+    con.close()
+
+    async def loadGamePgn():
+        database = GameDatabase(games_file)
+        try:
+            return await database.loadGamePgn(1)
+        finally:
+            await database.close()
+
+    AssertThat(asyncio.run(loadGamePgn())).IsEqualTo(original[1])
+
+
+def testTextIsLeftAloneWithoutADictionary():
+    codec = PgnCodec()
+
+    AssertThat(codec.compress("1. e4 *")).IsEqualTo("1. e4 *")
+    AssertThat(codec.decompress("1. e4 *")).IsEqualTo("1. e4 *")
+    AssertThat(codec.decompress(None)).IsNone()
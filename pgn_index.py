@@ -0,0 +1,206 @@
+import io
+import json
+import mmap
+import os
+import re
+from typing import Callable, Iterator, NamedTuple, Optional
+
+import chess.pgn
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+# Tags shown in the game picker. Any others are left for the parser.
+INDEXED_TAGS = ("White", "Black", "Result", "Date", "Event")
+
+TAG_REGEX = re.compile(rb'^\[([A-Za-z0-9_]+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+
+
+class GameEntry(NamedTuple):
+    """Where a game is in a PGN file, and the headers shown when picking it."""
+
+    offset: int
+    end: int
+    headers: dict[str, str]
+
+
+def decodeTag(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+def scanGames(
+    data, progress: Optional[Callable[[int], None]] = None
+) -> Iterator[GameEntry]:
+    """
+    Finds the games in PGN data (bytes or an mmap) in one pass, without parsing
+    the moves.
+
+    A game starts at the first tag line after the previous game's movetext. Lines
+    inside a brace comment are skipped, so a comment can't start a game.
+
+    Args:
+        progress: Called with the byte offset reached every so often.
+    """
+    PROGRESS_INTERVAL = 1 << 20
+
+    size = len(data)
+    position = 0
+    lastProgress = 0
+    start = None
+    headers = {}
+    inMovetext = False
+    commentDepth = 0
+
+    while position < size:
+        lineEnd = data.find(b"\n", position)
+        if lineEnd == -1:
+            lineEnd = size
+        line = data[position:lineEnd].strip()
+
+        if commentDepth == 0 and line.startswith(b"["):
+            if start is None or inMovetext:
+                if start is not None:
+                    yield GameEntry(start, position, headers)
+                start = position
+                headers = {}
+                inMovetext = False
+            match = TAG_REGEX.match(line)
+            if match and decodeTag(match.group(1)) in INDEXED_TAGS:
+                headers[decodeTag(match.group(1))] = decodeTag(match.group(2))
+        elif line and not line.startswith(b"%"):
+            if start is None:
+                # Movetext without any tags.
+                start = position
+            inMovetext = True
+            # Anything after a ; is a comment to the end of the line.
+            if commentDepth == 0:
+                line = line.split(b";", 1)[0]
+            commentDepth = max(0, commentDepth + line.count(b"{") - line.count(b"}"))
+
+        position = lineEnd + 1
+        if progress is not None and position - lastProgress >= PROGRESS_INTERVAL:
+            lastProgress = position
+            progress(min(position, size))
+
+    if start is not None and (inMovetext or headers):
+        yield GameEntry(start, size, headers)
+    if progress is not None:
+        progress(size)
+
+
+def indexPath(pgnPath: str) -> str:
+    return pgnPath + INDEX_SUFFIX
+
+
+def fileStamp(pgnPath: str) -> dict:
+    stat = os.stat(pgnPath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def loadIndex(pgnPath: str) -> Optional[list[GameEntry]]:
+    """Returns the cached index of the file, or None if it's missing or stale."""
+    try:
+        with open(indexPath(pgnPath)) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("version") != INDEX_VERSION or cached.get("file") != fileStamp(
+        pgnPath
+    ):
+        return None
+    return [GameEntry(offset, end, headers) for offset, end, headers in cached["games"]]
+
+
+def saveIndex(pgnPath: str, games: list[GameEntry]) -> None:
+    cached = {
+        "version": INDEX_VERSION,
+        "file": fileStamp(pgnPath),
+        "games": [list(game) for game in games],
+    }
+    try:
+        with open(indexPath(pgnPath), "w") as f:
+            json.dump(cached, f)
+    except OSError:
+        # The directory may be read-only, in which case the file is reindexed next
+        # time it's opened.
+        pass
+
+
+class PgnIndex:
+    """
+    The games in a PGN file, read one at a time by seeking to their offsets in a
+    memory map of the file rather than loading the whole file.
+    """
+
+    path: str
+    games: list[GameEntry]
+    # Whether games is the whole file's, as a file may have none.
+    indexed: bool
+
+    def __init__(self, path: str, games: Optional[list[GameEntry]] = None):
+        self.path = path
+        self.games = games if games is not None else []
+        self.indexed = games is not None
+        self.file = open(path, "rb")
+        self.data = self.map()
+
+    def map(self):
+        # An empty file can't be mapped.
+        if os.fstat(self.file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def fromFile(
+        path: str, progress: Optional[Callable[[int], None]] = None
+    ) -> "PgnIndex":
+        """
+        Opens a PGN file, using the cached index next to it if it's up to date and
+        indexing the file (and caching the index) otherwise.
+        """
+        index = PgnIndex(path, loadIndex(path))
+        if not index.indexed:
+            index.build(progress)
+        return index
+
+    def isCached(path: str) -> bool:
+        return loadIndex(path) is not None
+
+    def scan(
+        self, progress: Optional[Callable[[int], None]] = None
+    ) -> Iterator[GameEntry]:
+        """Indexes the file, yielding the games as they're found."""
+        self.games = []
+        self.indexed = False
+        for game in scanGames(self.data, progress):
+            self.games.append(game)
+            yield game
+        self.indexed = True
+        saveIndex(self.path, self.games)
+
+    def build(self, progress: Optional[Callable[[int], None]] = None) -> None:
+        for _ in self.scan(progress):
+            pass
+
+    def size(self) -> int:
+        return len(self.data)
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def gameText(self, number: int) -> str:
+        game = self.games[number]
+        return bytes(self.data[game.offset : game.end]).decode(
+            "utf-8", errors="replace"
+        )
+
+    def readGame(self, number: int) -> Optional[chess.pgn.Game]:
+        """Parses just the given game from the file."""
+        return chess.pgn.read_game(io.StringIO(self.gameText(number)))
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
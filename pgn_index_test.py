@@ -0,0 +1,94 @@
+import os
+
+from truth.truth import AssertThat
+
+from pgn_index import PgnIndex, indexPath, loadIndex, scanGames
+
+GAMES_PGN = b"""[Event "First"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0
+
+[Event "Second"]
+[White "C"]
+[Black "D"]
+[Result "0-1"]
+
+1. f3 { a comment
+[that looks like a tag] } e5 2. g4 Qh4# 0-1
+[Event "Third"]
+[White "E"]
+[Black "F"]
+[Result "*"]
+
+1. d4 *
+"""
+
+
+def writePgn(tmp_path, data=GAMES_PGN):
+    path = str(tmp_path / "games.pgn")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def testScanGames():
+    games = list(scanGames(GAMES_PGN))
+    AssertThat([game.headers["Event"] for game in games]).IsEqualTo(
+        ["First", "Second", "Third"]
+    )
+    AssertThat(games[0].offset).IsEqualTo(0)
+    AssertThat(games[0].end).IsEqualTo(games[1].offset)
+    AssertThat(games[2].end).IsEqualTo(len(GAMES_PGN))
+    AssertThat(games[1].headers).IsEqualTo(
+        {"Event": "Second", "White": "C", "Black": "D", "Result": "0-1"}
+    )
+
+
+def testScanGamesWithoutTags():
+    games = list(scanGames(b"1. e4 e5 *\n"))
+    AssertThat(len(games)).IsEqualTo(1)
+    AssertThat(games[0].headers).IsEmpty()
+
+
+def testReadGame(tmp_path):
+    index = PgnIndex.fromFile(writePgn(tmp_path))
+    AssertThat(len(index)).IsEqualTo(3)
+    game = index.readGame(1)
+    AssertThat(game.headers["White"]).IsEqualTo("C")
+    AssertThat([move.uci() for move in game.mainline_moves()]).IsEqualTo(
+        ["f2f3", "e7e5", "g2g4", "d8h4"]
+    )
+    AssertThat(game.end().board().is_checkmate()).IsTrue()
+    index.close()
+
+
+def testIndexIsCached(tmp_path):
+    path = writePgn(tmp_path)
+    AssertThat(loadIndex(path)).IsNone()
+    index = PgnIndex.fromFile(path)
+    index.close()
+    AssertThat(os.path.exists(indexPath(path))).IsTrue()
+    AssertThat(loadIndex(path)).IsEqualTo(index.games)
+
+    # Changing the file invalidates the cached index.
+    writePgn(tmp_path, GAMES_PGN + b'\n[Event "Fourth"]\n\n1. c4 *\n')
+    AssertThat(loadIndex(path)).IsNone()
+    index = PgnIndex.fromFile(path)
+    AssertThat(len(index)).IsEqualTo(4)
+    index.close()
+
+
+def testEmptyIndexIsCached(tmp_path):
+    path = writePgn(tmp_path, b"% Just an escaped line\n")
+    index = PgnIndex.fromFile(path)
+    index.close()
+    AssertThat(index.indexed).IsTrue()
+    AssertThat(len(index)).IsEqualTo(0)
+
+    AssertThat(loadIndex(path)).IsEqualTo([])
+    index = PgnIndex(path, loadIndex(path))
+    AssertThat(index.indexed).IsTrue()
+    index.close()
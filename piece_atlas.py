@@ -0,0 +1,130 @@
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from PySide6 import QtCore, QtGui
+from PySide6.QtSvg import QSvgRenderer
+
+import chess
+
+DEFAULT_ATLAS_SIZE = 4
+
+PiecePixmaps = dict[tuple[chess.PieceType, chess.Color], QtGui.QPixmap]
+
+
+def rasterise(
+    size: int, devicePixelRatio: float
+) -> dict[tuple[chess.PieceType, chess.Color], QtGui.QImage]:
+    """
+    Renders every piece's SVG at the given size. Only QImage is used, so this is safe
+    to call off the UI thread.
+    """
+    pixels = round(size * devicePixelRatio)
+    images = {}
+    for color in chess.COLORS:
+        for type in chess.PIECE_TYPES:
+            name = ("white_" if color == chess.WHITE else "black_") + chess.piece_name(
+                type
+            )
+            renderer = QSvgRenderer("pieces/" + name + ".svg")
+            image = QtGui.QImage(
+                pixels, pixels, QtGui.QImage.Format_ARGB32_Premultiplied
+            )
+            image.fill(QtCore.Qt.transparent)
+            painter = QtGui.QPainter(image)
+            painter.setRenderHint(QtGui.QPainter.Antialiasing)
+            renderer.render(painter)
+            painter.end()
+            image.setDevicePixelRatio(devicePixelRatio)
+            images[(type, color)] = image
+    return images
+
+
+class PieceAtlas(QtCore.QObject):
+    """
+    LRU cache of the piece pixmaps rasterised for each (size, device pixel ratio).
+    Sizes can be requested asynchronously, in which case the SVGs are rendered on a
+    worker thread and rasterised is emitted on the UI thread once they're ready.
+    """
+
+    rasterised = QtCore.Signal(object)
+    imagesReady = QtCore.Signal(object, object)
+
+    entries: OrderedDict[tuple[int, float], PiecePixmaps]
+    pending: dict[tuple[int, float], Future]
+
+    def __init__(self, maxsize: int = DEFAULT_ATLAS_SIZE):
+        super().__init__()
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Emitted from the worker thread, so the slot is queued onto the UI thread.
+        self.imagesReady.connect(self.store)
+
+    def get(self, size: int, devicePixelRatio: float) -> Optional[PiecePixmaps]:
+        key = (size, devicePixelRatio)
+        pixmaps = self.entries.get(key)
+        if pixmaps is not None:
+            self.entries.move_to_end(key)
+        return pixmaps
+
+    def pixmaps(self, size: int, devicePixelRatio: float) -> PiecePixmaps:
+        """Returns the pixmaps for the size, rasterising them now if necessary."""
+        pixmaps = self.get(size, devicePixelRatio)
+        if pixmaps is None:
+            key = (size, devicePixelRatio)
+            self.store(key, rasterise(size, devicePixelRatio))
+            pixmaps = self.entries[key]
+        return pixmaps
+
+    def request(self, size: int, devicePixelRatio: float) -> None:
+        """
+        Starts rasterising the pixmaps for the size on the worker thread unless
+        they're already available. Requests for other sizes that haven't started yet
+        are dropped, as during a resize only the latest size matters.
+        """
+        key = (size, devicePixelRatio)
+        if key in self.entries or key in self.pending:
+            return
+
+        for other in list(self.pending):
+            if self.pending[other].cancel():
+                del self.pending[other]
+
+        future = self.executor.submit(rasterise, size, devicePixelRatio)
+        self.pending[key] = future
+        future.add_done_callback(lambda future: self.rasterisationDone(key, future))
+
+    def rasterisationDone(self, key: tuple[int, float], future: Future) -> None:
+        # Called on the worker thread.
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            # Dropped so that the size is requested again rather than waited on.
+            self.pending.pop(key, None)
+            logging.warning("Couldn't rasterise the pieces at %s", key, exc_info=error)
+            return
+        self.imagesReady.emit(key, future.result())
+
+    def store(self, key: tuple[int, float], images) -> None:
+        self.pending.pop(key, None)
+        self.entries[key] = {
+            piece: QtGui.QPixmap.fromImage(image) for piece, image in images.items()
+        }
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        self.rasterised.emit(key)
+
+
+ATLAS = None
+
+
+def pieceAtlas() -> PieceAtlas:
+    global ATLAS
+    if ATLAS is None:
+        ATLAS = PieceAtlas()
+    return ATLAS
@@ -0,0 +1,298 @@
+"""
+An inverted index from positions to the games that reached them, built offline
+from games.db and memory-mapped by GameDatabase so that looking a position up is a
+binary search and a scan of one posting list instead of SQL joins.
+
+    python position_index.py [games.db] [games.pidx] [--username NAME]
+
+Positions are keyed by a 64-bit hash of their EPD. Each position's posting list
+holds a (game, ply, next move) entry for every time a game reached it, sorted by
+game, as varints with the game stored as the difference from the previous entry's.
+A table of each game's result and whether the user played white turns postings
+into the same rows as GameDatabase's SQL.
+
+The index records the games it was built from and is ignored once games.db has
+more, until it's rebuilt.
+"""
+import argparse
+import bisect
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+from array import array
+from typing import Iterator, NamedTuple, Optional
+
+import migrate_move_codes
+
+MAGIC = b"CHESSPIX"
+VERSION = 1
+# Written in the builder's byte order, which is checked on opening.
+BYTE_ORDER_MARK = 0x01020304
+HEADER = struct.Struct("=8sIIIIQQQ")
+
+RESULTS = (None, "1-0", "1/2-1/2", "0-1")
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+# Results other than the usual ones, e.g. "*".
+OTHER_RESULT = len(RESULTS)
+# Whether the user played white is stored as a tri-state like SQL's white = ?.
+USER_WHITE_CODES = {False: 0, True: 1, None: 2}
+USER_WHITE = (0, 1, None)
+
+
+def positionHash(epd: str) -> int:
+    digest = hashlib.blake2b(epd.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def encodeVarint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decodePostings(data) -> Iterator[tuple[int, int, int]]:
+    """Yields the (game index, ply, next move code or -1) entries of a posting list."""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value = shift = 0
+
+    game = 0
+    for i in range(0, len(values), 3):
+        game += values[i]
+        yield game, values[i + 1], values[i + 2] - 1
+
+
+class IndexSource(NamedTuple):
+    """What an index was built from, to tell whether games.db has changed since."""
+
+    username: Optional[str]
+    max_game_id: int
+    max_game_pos_id: int
+
+
+SOURCE_SQL = """
+SELECT (SELECT COALESCE(MAX(game_id), 0) FROM games),
+    (SELECT COALESCE(MAX(game_pos_id), 0) FROM game_positions)
+"""
+
+
+def indexSource(con: sqlite3.Connection, username: Optional[str]) -> IndexSource:
+    return IndexSource(username, *con.execute(SOURCE_SQL).fetchone())
+
+
+def gameFlags(white: Optional[str], result: Optional[str], username: Optional[str]):
+    user_white = None if white is None or username is None else white == username
+    result_code = RESULT_CODES.get(result, OTHER_RESULT)
+    return result_code | USER_WHITE_CODES[user_white] << 3
+
+
+def buildIndex(con: sqlite3.Connection, path: str, username: Optional[str]) -> int:
+    """
+    Writes the index of the games in the database.
+
+    Returns:
+        int: The number of positions indexed.
+    """
+    source = indexSource(con, username)
+
+    game_ids = array("I")
+    flags = array("B")
+    game_index = {}
+    for game_id, white, result in con.execute(
+        "SELECT game_id, white, result FROM games ORDER BY game_id"
+    ):
+        game_index[game_id] = len(game_ids)
+        game_ids.append(game_id)
+        flags.append(gameFlags(white, result, username))
+
+    # EPDs are unique, so each position's entries are consecutive.
+    postings = {}
+    for epd, game_id, ply, next_move in con.execute(
+        """
+        SELECT p.epd, g.game_id, g.ply, g.next_move
+        FROM game_positions g
+        JOIN positions p ON p.pos_id = g.pos_id
+        JOIN games ON games.game_id = g.game_id
+        ORDER BY p.pos_id, g.game_id, g.ply
+        """
+    ):
+        key = positionHash(epd)
+        if key not in postings:
+            postings[key] = bytearray()
+            last = 0
+        posting = postings[key]
+        index = game_index[game_id]
+        encodeVarint(index - last, posting)
+        encodeVarint(ply, posting)
+        # Move codes are never 0, as a move's from and to squares differ, but the
+        # shift keeps 0 for positions the game ended in.
+        encodeVarint(0 if next_move is None else next_move + 1, posting)
+        last = index
+
+    hashes = array("Q", sorted(postings))
+    offsets = array("Q", [0])
+    for key in hashes:
+        offsets.append(offsets[-1] + len(postings[key]))
+
+    username_bytes = (username or "").encode()
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                BYTE_ORDER_MARK,
+                len(game_ids),
+                len(hashes),
+                source.max_game_id,
+                source.max_game_pos_id,
+                len(username_bytes) | (username is not None) << 63,
+            )
+        )
+        f.write(username_bytes)
+        for section in (game_ids, flags, hashes, offsets):
+            pad(f)
+            section.tofile(f)
+        for key in hashes:
+            f.write(postings[key])
+    return len(hashes)
+
+
+def pad(f):
+    """Aligns the next section for memoryview.cast."""
+    f.write(b"\0" * (-f.tell() % 8))
+
+
+class PositionIndex:
+    """A built index, memory-mapped so that only the pages looked at are read."""
+
+    source: IndexSource
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        (
+            magic,
+            version,
+            byte_order,
+            games,
+            positions,
+            max_game_id,
+            max_game_pos_id,
+            username_field,
+        ) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION or byte_order != BYTE_ORDER_MARK:
+            self.close()
+            raise ValueError(f"{path} isn't a position index this version can read")
+
+        offset = HEADER.size
+        username_length = username_field & ~(1 << 63)
+        username = bytes(view[offset : offset + username_length]).decode()
+        self.source = IndexSource(
+            username if username_field >> 63 else None, max_game_id, max_game_pos_id
+        )
+        offset += username_length
+
+        def section(format: str, count: int) -> memoryview:
+            nonlocal offset
+            offset += -offset % 8
+            start = offset
+            offset += count * struct.calcsize(format)
+            return view[start:offset].cast(format)
+
+        self.game_ids = section("I", games)
+        self.flags = section("B", games)
+        self.hashes = section("Q", positions)
+        self.offsets = section("Q", positions + 1)
+        self.postings = view[offset:]
+        self.views = [view, self.game_ids, self.flags, self.hashes, self.offsets]
+        self.views.append(self.postings)
+
+    def close(self):
+        # The map can only be closed once nothing is viewing it.
+        for view in reversed(getattr(self, "views", [])):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+    def size(self) -> int:
+        return len(self.map)
+
+    def gamesThrough(self, epd: str) -> Iterator[tuple[int, int, int]]:
+        """Yields the (game id, ply, next move code or -1) of each game through epd."""
+        key = positionHash(epd)
+        i = bisect.bisect_left(self.hashes, key)
+        if i == len(self.hashes) or self.hashes[i] != key:
+            return
+        data = self.postings[self.offsets[i] : self.offsets[i + 1]]
+        for game, ply, move in decodePostings(data):
+            yield self.game_ids[game], ply, move
+
+    def rows(self, epds: list[str]) -> list[tuple]:
+        """
+        The same rows as GameDatabase's SQL: (epd, next_move, count,
+        user_plays_white, win, draw, loss) for each move played from each position
+        by each side.
+        """
+        rows = []
+        for epd in dict.fromkeys(epds):
+            key = positionHash(epd)
+            i = bisect.bisect_left(self.hashes, key)
+            if i == len(self.hashes) or self.hashes[i] != key:
+                continue
+            data = self.postings[self.offsets[i] : self.offsets[i + 1]]
+            # The number of games with each result code.
+            groups = {}
+            for game, _, move in decodePostings(data):
+                flags = self.flags[game]
+                group = (None if move < 0 else move, USER_WHITE[flags >> 3])
+                results = groups.get(group)
+                if results is None:
+                    results = groups[group] = [0] * (OTHER_RESULT + 1)
+                results[flags & 7] += 1
+
+            for (move, user_white), results in groups.items():
+                count = sum(results)
+                # Like SQL's SUM, the totals are NULL when every result is.
+                if results[0] == count:
+                    totals = (None, None, None)
+                else:
+                    totals = tuple(results[1:OTHER_RESULT])
+                rows.append((epd, move, count, user_white, *totals))
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds a games database's index.")
+    parser.add_argument("games", nargs="?", default="/Users/dan/github/chess/games.db")
+    parser.add_argument(
+        "index", nargs="?", default="/Users/dan/github/chess/games.pidx"
+    )
+    parser.add_argument(
+        "--username", help="The user's name, defaulting to the lichess one in config"
+    )
+    args = parser.parse_args()
+
+    username = args.username
+    if username is None:
+        from config import config
+
+        username = config()["lichess"]["username"]
+
+    con = sqlite3.connect(args.games)
+    if not migrate_move_codes.uses_move_codes(con):
+        sys.exit(f"{args.games} stores moves as SAN, run migrate_move_codes.py on it")
+    positions = buildIndex(con, args.index, username)
+    con.close()
+    size = os.path.getsize(args.index)
+    print(f"Indexed {positions} positions in {size / (1 << 20):.1f}MB")
@@ -0,0 +1,71 @@
+import asyncio
+
+import chess
+from truth.truth import AssertThat
+
+import generate_databases
+import update_positions
+from database import GameDatabase
+from position_index import PositionIndex, buildIndex
+
+
+async def lookupRows(games_file, epds, **kwargs) -> list[tuple]:
+    database = GameDatabase(
+        games_file, username=generate_databases.DEFAULT_USERNAME, **kwargs
+    )
+    try:
+        return sorted(await database.fetchRows(epds, chess.WHITE), key=repr)
+    finally:
+        await database.close()
+
+
+def testIndexFindsTheSameRowsAsSql(tmp_path, games_database):
+    games_file, con = games_database
+    index_file = str(tmp_path / "games.pidx")
+    buildIndex(con, index_file, generate_databases.DEFAULT_USERNAME)
+    epds = [epd for (epd,) in con.execute("SELECT epd FROM positions")]
+    con.close()
+
+    expected = asyncio.run(lookupRows(games_file, epds))
+    AssertThat(
+        asyncio.run(lookupRows(games_file, epds, position_index=index_file))
+    ).IsEqualTo(expected)
+    AssertThat(
+        asyncio.run(lookupRows(games_file, epds[:1], position_index=index_file))
+    ).IsEqualTo(asyncio.run(lookupRows(games_file, epds[:1])))
+
+
+def testGamesThroughStartingPosition(tmp_path, games_database):
+    games_file, con = games_database
+    index_file = str(tmp_path / "games.pidx")
+    buildIndex(con, index_file, generate_databases.DEFAULT_USERNAME)
+    game_ids = [game_id for (game_id,) in con.execute("SELECT game_id FROM games")]
+    con.close()
+
+    index = PositionIndex(index_file)
+    games = list(index.gamesThrough(chess.Board().epd()))
+    index.close()
+    AssertThat([game_id for (game_id, _, _) in games]).IsEqualTo(sorted(game_ids))
+    AssertThat({ply for (_, ply, _) in games}).IsEqualTo({0})
+
+
+def testStaleIndexIsIgnored(tmp_path, games_database):
+    games_file, con = games_database
+    index_file = str(tmp_path / "games.pidx")
+    buildIndex(con, index_file, generate_databases.DEFAULT_USERNAME)
+    generate_databases.generateGames(con, 5, seed=2)
+    update_positions.update_positions(con, verbose=False)
+    con.close()
+
+    async def openIndex():
+        database = GameDatabase(
+            games_file,
+            username=generate_databases.DEFAULT_USERNAME,
+            position_index=index_file,
+        )
+        try:
+            return await database.openPositionIndex()
+        finally:
+            await database.close()
+
+    AssertThat(asyncio.run(openIndex())).IsNone()
@@ -0,0 +1,147 @@
+import asyncio
+import statistics
+import time
+from collections import deque
+from typing import Callable, Coroutine, Optional
+
+LATENCY_SAMPLES = 100
+
+
+class Stage:
+    """
+    A kind of work that's redone whenever the position changes. Each request
+    replaces the previous one, so at most one is waiting and one is running.
+    """
+
+    name: str
+    delay: float
+    timer: Optional[asyncio.TimerHandle]
+    task: Optional[asyncio.Task]
+    cancelledTasks: set[asyncio.Task]
+    waits: deque[float]
+    latencies: deque[float]
+
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+        self.timer = None
+        self.task = None
+        self.cancelledTasks = set()
+        self.requests = 0
+        self.superseded = 0
+        self.completed = 0
+        self.waits = deque(maxlen=LATENCY_SAMPLES)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def depth(self) -> int:
+        """Number of requests waiting for their delay or running."""
+        return (self.timer is not None) + (
+            self.task is not None and not self.task.done()
+        )
+
+    def report(self) -> dict:
+        def mean(samples):
+            return statistics.fmean(samples) * 1000 if samples else None
+
+        return {
+            "depth": self.depth(),
+            "requests": self.requests,
+            "superseded": self.superseded,
+            "completed": self.completed,
+            "mean_wait_ms": mean(self.waits),
+            "mean_latency_ms": mean(self.latencies),
+        }
+
+
+class StagedScheduler:
+    """
+    Runs the work for each position in stages with increasing delays, e.g. the
+    database lookups once navigation has been idle for a moment and the engine
+    analysis only once the user dwells on the position. Only the newest request
+    for each stage survives: a new one cancels any that's waiting or running.
+
+    Tasks are started with the given scheduleTask so that the owner keeps track
+    of them and sees their exceptions.
+    """
+
+    stages: dict[str, Stage]
+
+    def __init__(self, scheduleTask: Callable[[Coroutine], asyncio.Task]):
+        self.scheduleTask = scheduleTask
+        self.stages = {}
+
+    def addStage(self, name: str, delay: float) -> None:
+        self.stages[name] = Stage(name, delay)
+
+    def runNow(self, name: str, work: Callable[[], None]) -> None:
+        """Runs synchronous work for a stage that has no delay, timing it."""
+        stage = self.stages[name]
+        stage.requests += 1
+        start = time.monotonic()
+        work()
+        stage.completed += 1
+        stage.waits.append(0.0)
+        stage.latencies.append(time.monotonic() - start)
+
+    def request(self, name: str, work: Callable[[], Coroutine]) -> None:
+        """
+        Schedules the coroutine returned by work to run after the stage's delay,
+        replacing the stage's previous request. work is only called once the delay
+        has passed, so it sees the state at that point.
+        """
+        stage = self.stages[name]
+        stage.requests += 1
+        self.cancel(name)
+
+        requested = time.monotonic()
+        stage.timer = asyncio.get_running_loop().call_later(
+            stage.delay, self.start, stage, work, requested
+        )
+
+    def cancel(self, name: str) -> int:
+        """
+        Cancels the stage's waiting and running requests.
+
+        Returns:
+            int: The number of requests cancelled.
+        """
+        stage = self.stages[name]
+        cancelled = 0
+        if stage.timer is not None:
+            stage.timer.cancel()
+            stage.timer = None
+            cancelled += 1
+        if stage.task is not None and not stage.task.done():
+            stage.task.cancel()
+            stage.cancelledTasks.add(stage.task)
+            cancelled += 1
+        stage.task = None
+        stage.superseded += cancelled
+        return cancelled
+
+    def start(self, stage: Stage, work: Callable[[], Coroutine], requested: float):
+        stage.timer = None
+        stage.waits.append(time.monotonic() - requested)
+        task = self.scheduleTask(work())
+        stage.task = task
+
+        def done(task: asyncio.Task):
+            # Cancelled tasks may swallow their CancelledError, so task.cancelled()
+            # can't be relied on.
+            if task in stage.cancelledTasks:
+                stage.cancelledTasks.discard(task)
+            elif not task.cancelled():
+                stage.completed += 1
+                stage.latencies.append(time.monotonic() - requested)
+
+        task.add_done_callback(done)
+
+    def queueDepth(self) -> int:
+        return sum(stage.depth() for stage in self.stages.values())
+
+    def report(self) -> dict:
+        """Returns the queue depth and each stage's counters and latencies."""
+        return {
+            "depth": self.queueDepth(),
+            "stages": {name: stage.report() for name, stage in self.stages.items()},
+        }
@@ -0,0 +1,76 @@
+import asyncio
+
+from truth.truth import AssertThat
+
+from scheduler import StagedScheduler
+
+
+def scheduler() -> StagedScheduler:
+    scheduler = StagedScheduler(asyncio.ensure_future)
+    scheduler.addStage("lookup", 0.1)
+    return scheduler
+
+
+def testRequestReplacesWaitingRequest():
+    runs = []
+
+    async def run():
+        s = scheduler()
+
+        async def work(name):
+            runs.append(name)
+
+        s.request("lookup", lambda: work("first"))
+        await asyncio.sleep(0.01)
+        s.request("lookup", lambda: work("second"))
+        await asyncio.sleep(0.25)
+        return s.report()["stages"]["lookup"]
+
+    report = asyncio.run(run())
+
+    AssertThat(runs).IsEqualTo(["second"])
+    AssertThat(report["requests"]).IsEqualTo(2)
+    AssertThat(report["superseded"]).IsEqualTo(1)
+    AssertThat(report["completed"]).IsEqualTo(1)
+    AssertThat(report["depth"]).IsEqualTo(0)
+
+
+def testCancelCountsRequestsCancelled():
+    async def run():
+        s = scheduler()
+        AssertThat(s.cancel("lookup")).IsEqualTo(0)
+
+        s.request("lookup", lambda: asyncio.sleep(1))
+        AssertThat(s.queueDepth()).IsEqualTo(1)
+        AssertThat(s.cancel("lookup")).IsEqualTo(1)
+        AssertThat(s.queueDepth()).IsEqualTo(0)
+
+        # Once the delay has passed the request is running instead of waiting.
+        s.request("lookup", lambda: asyncio.sleep(1))
+        await asyncio.sleep(0.25)
+        AssertThat(s.queueDepth()).IsEqualTo(1)
+        AssertThat(s.cancel("lookup")).IsEqualTo(1)
+        await asyncio.sleep(0)
+        return s.report()["stages"]["lookup"]
+
+    report = asyncio.run(run())
+
+    AssertThat(report["superseded"]).IsEqualTo(2)
+    AssertThat(report["completed"]).IsEqualTo(0)
+
+
+def testRunNowSkipsTheDelay():
+    runs = []
+
+    async def run():
+        s = scheduler()
+        s.runNow("lookup", lambda: runs.append("now"))
+        AssertThat(runs).IsEqualTo(["now"])
+        return s.report()["stages"]["lookup"]
+
+    report = asyncio.run(run())
+
+    AssertThat(report["requests"]).IsEqualTo(1)
+    AssertThat(report["completed"]).IsEqualTo(1)
+    AssertThat(report["mean_wait_ms"]).IsEqualTo(0)
+    AssertThat(report["depth"]).IsEqualTo(0)
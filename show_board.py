@@ -3,6 +3,7 @@ import functools
 import io
 import pathlib
 import sys
+import threading
 
 import qasync
 from qasync import asyncClose, QApplication
@@ -20,12 +21,19 @@ from PySide6.QtWidgets import (
 import chess
 import chess.pgn
 from chess_board import ChessBoard
+from config import config
 from controller import Controller
+from database import GameDatabase
 from database_pane import DatabasePane
 from eval_bar import EvalBar
 from move_list import MoveList
 from game import Game
+from game_browser import GameBrowser
+from game_picker import GamePicker
+from lag_monitor import DEFAULT_THRESHOLD, LagMonitor
 from openings_pane import OpeningsPane
+from perf_hud import PerfHud
+from pgn_index import PgnIndex, loadIndex
 
 controller = None
 
@@ -40,6 +48,9 @@ class MainWindow(QMainWindow):
     move_list: MoveList
     database_pane: DatabasePane
     openings_pane: OpeningsPane
+    game_browser: GameBrowser
+    lag_monitor: LagMonitor
+    perf_hud: PerfHud
 
     def __init__(self):
         super().__init__()
@@ -64,6 +75,7 @@ class MainWindow(QMainWindow):
         eval_and_board_layout = QHBoxLayout()
         eval_and_board_layout.addWidget(self.eval_bar)
         eval_and_board_layout.addWidget(self.board_widget)
+        self.board_widget.boardResized.connect(self.eval_bar.setBoardHeight)
         board_and_analysis_layout.addLayout(eval_and_board_layout)
         self.analysis_widget = QLabel()
 
@@ -103,6 +115,15 @@ class MainWindow(QMainWindow):
         self.openings_pane = OpeningsPane()
         tabView.addTab(self.openings_pane, "Openings")
 
+        self.game_database = GameDatabase(
+            database_file="games.db", username=config()["lichess"]["username"]
+        )
+        self.game_browser = GameBrowser(self.game_database)
+        self.game_browser.gameSelected.connect(
+            lambda pgn: setupGame(chess.pgn.read_game(io.StringIO(pgn)))
+        )
+        tabView.addTab(self.game_browser, "Games")
+
         right_panel_layout.addWidget(tabView)
         navigation_layout = QHBoxLayout()
         navigation_layout.setSpacing(2)
@@ -130,9 +151,36 @@ class MainWindow(QMainWindow):
             self.last.click,
         )
 
+        monitoring = config().get("monitoring") or {}
+        self.lag_monitor = LagMonitor(
+            threshold=monitoring.get("lag_threshold_ms", DEFAULT_THRESHOLD * 1000)
+            / 1000
+        )
+        self.lag_monitor.start()
+        if monitoring.get("show_lag", False):
+            lag_label = QLabel()
+            self.statusBar().addPermanentWidget(lag_label)
+            self.lag_timer = QtCore.QTimer(self)
+            self.lag_timer.timeout.connect(
+                lambda: lag_label.setText(self.lag_monitor.statusText())
+            )
+            self.lag_timer.start(1000)
+
+        self.perf_hud = PerfHud(self.root, self.lag_monitor)
+        self.perf_hud.move(8, 8)
+        viewMenu = menubar.addMenu("&View")
+        hudAction = viewMenu.addAction("&Performance HUD")
+        hudAction.setShortcut("Ctrl+Shift+P")
+        hudAction.setCheckable(True)
+        hudAction.triggered.connect(self.perf_hud.toggle)
+        if monitoring.get("show_hud", False):
+            hudAction.trigger()
+
     @asyncClose
     async def closeEvent(self, event):
+        self.lag_monitor.stop()
         await controller.stop()
+        await self.game_database.close()
 
 
 pgn_text = """
@@ -176,16 +224,104 @@ Rxc2+ 32. Kf1 Nxg5+ 33. Ke1 Nf3+ 34. Kd1 Rd2+ 35. Kc1 Nxd5
 def openFile():
     pgn_file, _ = QtWidgets.QFileDialog.getOpenFileName(filter="*.pgn")
     if pgn_file:
-        pgn_text = pathlib.Path(pgn_file).read_text()
-        setupGame(pgn_text)
+        asyncio.ensure_future(openPgn(pgn_file))
+
+
+# Files larger than this are indexed in the background while the picker shows
+# the games found so far.
+BACKGROUND_INDEX_SIZE = 4 << 20
+INDEX_BATCH_SIZE = 500
+
+
+def indexInBackground(index, picker, loop, stop):
+    batch = []
+    for game in index.scan(
+        lambda position: loop.call_soon_threadsafe(picker.setProgress, position)
+    ):
+        batch.append(game)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            loop.call_soon_threadsafe(picker.addGames, batch)
+            batch = []
+        if stop.is_set():
+            # The index is only cached once the whole file has been scanned.
+            return
+    loop.call_soon_threadsafe(picker.addGames, batch)
+
+
+def warnNoGames(pgn_file):
+    QtWidgets.QMessageBox.warning(
+        window, "Open PGN", f"No games were found in {pathlib.Path(pgn_file).name}."
+    )
+
+
+async def openPgn(pgn_file):
+    """
+    Opens a PGN file through its offset index, letting the user pick a game if
+    there's more than one. Only the picked game is parsed.
+    """
+    index = PgnIndex(pgn_file, loadIndex(pgn_file))
+    try:
+        if not index.indexed and index.size() < BACKGROUND_INDEX_SIZE:
+            index.build()
+        if index.indexed and not index.games:
+            warnNoGames(pgn_file)
+            return
+        if len(index) == 1:
+            setupGame(index.readGame(0))
+            return
+
+        loop = asyncio.get_running_loop()
+        picker = GamePicker(pathlib.Path(pgn_file).name, window)
+        picker.addGames(index.games)
+        stop = threading.Event()
+        indexing = None
+        if not index.indexed:
+
+            def indexingFinished(_):
+                picker.indexingFinished()
+                if index.indexed and not index.games:
+                    picker.reject()
+
+            picker.setIndexing(index.size())
+            indexing = loop.run_in_executor(
+                None, indexInBackground, index, picker, loop, stop
+            )
+            indexing.add_done_callback(indexingFinished)
+
+        finished = loop.create_future()
+        picker.finished.connect(finished.set_result)
+        picker.open()
+        result = await finished
+
+        stop.set()
+        if indexing is not None:
+            await indexing
+            if index.indexed and not index.games:
+                warnNoGames(pgn_file)
+                return
+        number = picker.selectedGame()
+        if result == QtWidgets.QDialog.Accepted and number is not None:
+            setupGame(index.readGame(number))
+    finally:
+        index.close()
 
 
 window = None
 
 
-def setupGame(pgn_text):
+def setupGame(pgn):
     global controller, window
-    pgn = chess.pgn.read_game(io.StringIO(pgn_text))
+    if controller is not None:
+        # The buttons would otherwise still drive the previous game too.
+        for button in (
+            window.first,
+            window.previous,
+            window.next,
+            window.last,
+            window.rotate,
+        ):
+            button.clicked.disconnect()
+        asyncio.ensure_future(controller.stop())
     game = Game(chess.Board(), pgn)
     controller = Controller(
         game,
@@ -201,6 +337,7 @@ def setupGame(pgn_text):
         window.rotate,
         window.analysis_widget,
     )
+    window.perf_hud.setController(controller)
 
 
 async def main():
@@ -222,7 +359,7 @@ async def main():
         )
 
     window = MainWindow()
-    setupGame(pgn_text)
+    setupGame(chess.pgn.read_game(io.StringIO(pgn_text)))
 
     window.show()
 
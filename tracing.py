@@ -0,0 +1,225 @@
+"""
+Optional tracing of the hot paths: the database lookups, the panes and board being
+redrawn and the stages of analysing a position. The trace is saved as Chrome
+trace-event JSON, which can be opened in chrome://tracing or ui.perfetto.dev to
+see a session on a timeline.
+
+Tracing is off unless the CHESS_TRACE environment variable names the file to save
+the trace to, or config.yaml has a tracing section:
+
+    tracing:
+      file: trace.json
+
+The trace is saved when the program exits. While tracing is off, traced functions
+only pay for checking that it is.
+"""
+import atexit
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from config import config
+
+TRACE_ENV = "CHESS_TRACE"
+# Enough for a long session; the oldest events are dropped after this.
+MAX_EVENTS = 1_000_000
+
+
+class Tracer:
+    """Collects trace events in memory until they're saved."""
+
+    file: str
+    events: list[dict]
+
+    def __init__(self, file: str):
+        self.file = file
+        self.events = []
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+        self.ids = itertools.count(1)
+        self.threads = {}
+
+    def now(self) -> float:
+        """Microseconds since tracing started, the unit trace events use."""
+        return (time.perf_counter() - self.start) * 1e6
+
+    def add(self, event: dict):
+        if len(self.events) >= MAX_EVENTS:
+            del self.events[: MAX_EVENTS // 10]
+            self.dropped += MAX_EVENTS // 10
+        thread = threading.current_thread()
+        self.threads[thread.ident] = thread.name
+        event["pid"] = self.pid
+        event["tid"] = thread.ident
+        self.events.append(event)
+
+    def complete(self, name: str, category: str, start: float, args: Optional[dict]):
+        """Adds a span that ran synchronously, so nests within the thread's spans."""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": self.now() - start,
+        }
+        if args:
+            event["args"] = args
+        self.add(event)
+
+    def asyncBegin(self, name: str, category: str, args: Optional[dict]) -> int:
+        """
+        Starts a span of a coroutine. Coroutines interleave on the event loop's
+        thread, so their spans are async events on a track of their own instead.
+        """
+        id = next(self.ids)
+        event = {"name": name, "cat": category, "ph": "b", "ts": self.now(), "id": id}
+        if args:
+            event["args"] = args
+        self.add(event)
+        return id
+
+    def asyncEnd(self, name: str, category: str, id: int, args: Optional[dict] = None):
+        event = {"name": name, "cat": category, "ph": "e", "ts": self.now(), "id": id}
+        if args:
+            event["args"] = args
+        self.add(event)
+
+    def save(self):
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": ident,
+                "args": {"name": name},
+            }
+            for ident, name in self.threads.items()
+        ]
+        with open(self.file, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": metadata + self.events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {"dropped_events": self.dropped},
+                },
+                f,
+            )
+
+
+__TRACER__: Optional[Tracer] = None
+__CONFIGURED__ = False
+
+
+def tracer() -> Optional[Tracer]:
+    """The tracer if tracing is on, else None."""
+    global __CONFIGURED__
+    if not __CONFIGURED__:
+        __CONFIGURED__ = True
+        file = os.environ.get(TRACE_ENV)
+        if not file:
+            try:
+                file = (config().get("tracing") or {}).get("file")
+            except OSError:
+                # No config.yaml, e.g. in tests.
+                file = None
+        if file:
+            enable(file)
+    return __TRACER__
+
+
+def enable(file: str) -> Tracer:
+    """Starts tracing, to be saved to the given file at exit."""
+    global __TRACER__, __CONFIGURED__
+    __CONFIGURED__ = True
+    if __TRACER__ is None:
+        atexit.register(save)
+    __TRACER__ = Tracer(file)
+    return __TRACER__
+
+
+def save():
+    if __TRACER__ is not None:
+        __TRACER__.save()
+
+
+@contextmanager
+def span(name: str, category: str, **args):
+    """Traces the block, which mustn't await: see asyncSpan for blocks that do."""
+    current = tracer()
+    if current is None:
+        yield
+        return
+    start = current.now()
+    try:
+        yield
+    finally:
+        current.complete(name, category, start, args)
+
+
+@contextmanager
+def asyncSpan(name: str, category: str, **args):
+    """Traces a block of a coroutine, which may await."""
+    current = tracer()
+    if current is None:
+        yield
+        return
+    id = current.asyncBegin(name, category, args)
+    try:
+        yield
+    except BaseException as e:
+        # Usually the task being cancelled as the position changed.
+        current.asyncEnd(name, category, id, {"exception": type(e).__name__})
+        raise
+    current.asyncEnd(name, category, id)
+
+
+def traced(category: str, args: Optional[Callable[..., dict]] = None):
+    """
+    Decorates a function or coroutine function to trace each call, named after the
+    function. args is called with the function's arguments to give the span's
+    arguments, e.g. lambda self, epds, color: {"positions": len(epds)}.
+    """
+
+    def decorate(func):
+        name = func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def tracedCoroutine(*a, **kw):
+                current = tracer()
+                if current is None:
+                    return await func(*a, **kw)
+                id = current.asyncBegin(name, category, args and args(*a, **kw))
+                try:
+                    result = await func(*a, **kw)
+                except BaseException as e:
+                    exception = {"exception": type(e).__name__}
+                    current.asyncEnd(name, category, id, exception)
+                    raise
+                current.asyncEnd(name, category, id)
+                return result
+
+            return tracedCoroutine
+
+        @functools.wraps(func)
+        def tracedFunction(*a, **kw):
+            current = tracer()
+            if current is None:
+                return func(*a, **kw)
+            start = current.now()
+            try:
+                return func(*a, **kw)
+            finally:
+                current.complete(name, category, start, args and args(*a, **kw))
+
+        return tracedFunction
+
+    return decorate
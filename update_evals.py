@@ -0,0 +1,71 @@
+import chess
+import chess.pgn
+import io
+import sqlite3
+
+from pgn_compression import loadCodec
+
+# Backfills position_evals from the [%eval] comments of games that were imported by
+# update_positions.py before it stored evaluations.
+
+con = sqlite3.connect("/Users/dan/github/chess/games.db")
+codec = loadCodec(con)
+cur = con.cursor()
+cur.execute(
+    """CREATE TABLE IF NOT EXISTS position_evals (
+            pos_id INTEGER PRIMARY KEY,
+            cp INTEGER,
+            mate INTEGER,
+            depth INTEGER
+            );
+"""
+)
+
+# Compressed PGNs can't be searched, so they're checked once decompressed.
+cur.execute(
+    """
+    SELECT id, pgn FROM raw_games
+    WHERE typeof(pgn) = 'blob' OR pgn LIKE '%[[[%eval %' ESCAPE '['
+    """
+)
+
+write_cursor = con.cursor()
+
+index = 0
+total_evals = 0
+for (game_id, raw_pgn) in cur:
+    raw_pgn = codec.decompress(raw_pgn)
+    if "[%eval " not in raw_pgn:
+        continue
+    game = chess.pgn.read_game(io.StringIO(raw_pgn))
+    board = game.board()
+    for node in game.mainline():
+        board.push(node.move)
+        score = node.eval()
+        if score is None:
+            continue
+
+        epd = board.epd()
+        write_cursor.execute("INSERT OR IGNORE INTO positions (epd) VALUES (?)", (epd,))
+        pos_id = write_cursor.execute(
+            "SELECT pos_id FROM positions WHERE epd = ?", (epd,)
+        ).fetchone()[0]
+        write_cursor.execute(
+            """
+    INSERT OR IGNORE INTO position_evals (pos_id, cp, mate, depth)
+    VALUES (?, ?, ?, ?)
+    """,
+            (
+                pos_id,
+                score.white().score(),
+                score.white().mate(),
+                node.eval_depth(),
+            ),
+        )
+        total_evals += 1
+    print(f"{index} : {total_evals}", end="\r")
+    index = index + 1
+con.commit()
+
+print(f"{' ':80}", end="\r")
+print(f"Imported {total_evals} evaluations from {index} games")
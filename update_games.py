@@ -3,9 +3,15 @@ import chess.pgn
 import io
 import sqlite3
 
+from move_encoding import encodeGame
+from pgn_compression import loadCodec
+from update_moves import ensure_moves_column
+
 board = chess.Board()
 
 con = sqlite3.connect("/Users/dan/github/chess/games.db")
+ensure_moves_column(con)
+codec = loadCodec(con)
 cur = con.cursor()
 
 pgns = []
@@ -22,15 +28,16 @@ write_cursor = con.cursor()
 
 index = 0
 for (game_id, date, pgn) in cur:
-    game = chess.pgn.read_game(io.StringIO(pgn))
+    # The PGN is copied as it's stored, which may be compressed.
+    game = chess.pgn.read_game(io.StringIO(codec.decompress(pgn)))
     headers = game.headers
 
     write_cursor.execute(
         """
   INSERT INTO games (
     game_id, pgn, date, result, white, black, time_control,
-    variant, white_elo, black_elo, eco, opening, termination)
-  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    variant, white_elo, black_elo, eco, opening, termination, moves)
+  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
   """,
         (
             game_id,
@@ -46,6 +53,7 @@ for (game_id, date, pgn) in cur:
             headers.get("ECO"),
             headers.get("Opening"),
             headers.get("Termination"),
+            encodeGame(game),
         ),
     )
     print(f"{index}", end="\r")
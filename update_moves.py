@@ -0,0 +1,54 @@
+import chess
+import chess.pgn
+import io
+import sqlite3
+
+from move_encoding import encodeGame
+from pgn_compression import loadCodec
+
+# Backfills games.moves, the encoded mainline (see move_encoding.py), for games that
+# were imported by update_games.py before it stored them.
+
+
+def ensure_moves_column(con):
+    columns = [row[1] for row in con.execute("PRAGMA table_info(games)")]
+    if "moves" not in columns:
+        con.execute("ALTER TABLE games ADD COLUMN moves BLOB")
+        con.commit()
+
+
+def update_moves(con, verbose=True) -> int:
+    """
+    Encodes the mainline of each game that doesn't have it yet. Games that start
+    from a custom position are left without.
+
+    Returns:
+        int: The number of games encoded.
+    """
+    ensure_moves_column(con)
+    codec = loadCodec(con)
+    cur = con.cursor()
+    cur.execute("SELECT game_id, pgn FROM games WHERE moves IS NULL")
+
+    write_cursor = con.cursor()
+    index = 0
+    for (game_id, pgn) in cur:
+        moves = encodeGame(chess.pgn.read_game(io.StringIO(codec.decompress(pgn))))
+        if moves is None:
+            continue
+        write_cursor.execute(
+            "UPDATE games SET moves = ? WHERE game_id = ?", (moves, game_id)
+        )
+        index = index + 1
+        if verbose:
+            print(f"{index}", end="\r")
+    con.commit()
+    return index
+
+
+if __name__ == "__main__":
+    con = sqlite3.connect("/Users/dan/github/chess/games.db")
+    total_games = update_moves(con)
+
+    print(f"{' ':80}", end="\r")
+    print(f"Encoded the moves of {total_games} games")
@@ -3,59 +3,125 @@ import chess.pgn
 import io
 import sqlite3
 
-board = chess.Board()
-
-con = sqlite3.connect("/Users/dan/github/chess/games.db")
-cur = con.cursor()
-
-pgns = []
-total_rows = cur.execute("SELECT COUNT(1) FROM raw_games;").fetchone()[0]
-
-cur.execute(
-    """SELECT id, date, pgn FROM (
-    SELECT raw_games.id, date, pgn, game_id
-    FROM raw_games LEFT JOIN game_positions ON id = game_id)
-  WHERE game_id is NULL;"""
-)
-
-positions = {}
-
-total_moves = 0
-
-write_cursor = con.cursor()
-
-index = 0
-for (game_id, date, raw_pgn) in cur:
-    game = chess.pgn.read_game(io.StringIO(raw_pgn))
-    ply = 0
-    last_game_pos_id = None
-    while game is not None:
-        board = game.board()
-        epd = board.epd()
-
-        write_cursor.execute("INSERT OR IGNORE INTO positions (epd) VALUES (?)", (epd,))
-
-        pos_id = write_cursor.execute(
-            "SELECT pos_id FROM positions WHERE epd = ?", (epd,)
-        ).fetchone()[0]
-
-        next = game.next()
-        next_move = None if next is None else board.san(next.move)
-        write_cursor.execute(
-            """
-    INSERT INTO game_positions (pos_id, ply, game_id, last_game_pos_id, next_move)
-    VALUES (?, ?, ?, ?, ?)
-    """,
-            (pos_id, ply, game_id, last_game_pos_id, next_move),
-        )
-
-        last_game_pos_id = write_cursor.lastrowid
-        total_moves += 1
-        ply += 1
-        game = next
-    print(f"{index} : {date} {total_moves}", end="\r")
-    index = index + 1
-con.commit()
-
-print(f"{' ':80}", end="\r")
-print(f"Imported positions from {total_moves} total moves")
+import migrate_move_codes
+from move_encoding import decodeMoves, encodeMove
+from pgn_compression import loadCodec
+from update_moves import ensure_moves_column
+
+
+def game_positions(raw_pgn, moves):
+    """
+    Yields each position in the game's mainline with the move played from it, and
+    the evaluation and its depth stored in the PGN for it. The encoded moves are
+    replayed instead of parsing the PGN when there are no evaluations to read.
+    The same board is yielded each time.
+    """
+    if moves is not None and "[%eval" not in raw_pgn:
+        board = chess.Board()
+        for move in decodeMoves(moves):
+            yield board, move, None, None
+            board.push(move)
+        yield board, None, None, None
+        return
+
+    node = chess.pgn.read_game(io.StringIO(raw_pgn))
+    board = node.board()
+    while node is not None:
+        next = node.next()
+        yield board, None if next is None else next.move, node.eval(), node.eval_depth()
+        if next is not None:
+            board.push(next.move)
+        node = next
+
+
+def update_positions(con, verbose=True) -> int:
+    """
+    Adds the positions of each game in raw_games that hasn't had them added yet.
+
+    Returns:
+        int: The number of positions added.
+    """
+    ensure_moves_column(con)
+    migrate_move_codes.migrate(con, verbose)
+    codec = loadCodec(con)
+    cur = con.cursor()
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS position_evals (
+                pos_id INTEGER PRIMARY KEY,
+                cp INTEGER,
+                mate INTEGER,
+                depth INTEGER
+                );
+    """
+    )
+
+    cur.execute(
+        """SELECT id, date, pgn, moves FROM (
+        SELECT raw_games.id, raw_games.date, raw_games.pgn, games.moves,
+            game_positions.game_id
+        FROM raw_games
+        LEFT JOIN games ON raw_games.id = games.game_id
+        LEFT JOIN game_positions ON raw_games.id = game_positions.game_id)
+      WHERE game_id is NULL;"""
+    )
+
+    total_moves = 0
+
+    write_cursor = con.cursor()
+
+    index = 0
+    for (game_id, date, raw_pgn, moves) in cur:
+        last_game_pos_id = None
+        for ply, (board, move, score, depth) in enumerate(
+            game_positions(codec.decompress(raw_pgn), moves)
+        ):
+            epd = board.epd()
+
+            write_cursor.execute(
+                "INSERT OR IGNORE INTO positions (epd) VALUES (?)", (epd,)
+            )
+
+            pos_id = write_cursor.execute(
+                "SELECT pos_id FROM positions WHERE epd = ?", (epd,)
+            ).fetchone()[0]
+
+            # Lichess [%eval] comments are the evaluation of the position after the
+            # move.
+            if score is not None:
+                write_cursor.execute(
+                    """
+        INSERT OR IGNORE INTO position_evals (pos_id, cp, mate, depth)
+        VALUES (?, ?, ?, ?)
+        """,
+                    (
+                        pos_id,
+                        score.white().score(),
+                        score.white().mate(),
+                        depth,
+                    ),
+                )
+
+            next_move = None if move is None else encodeMove(move)
+            write_cursor.execute(
+                """
+        INSERT INTO game_positions (pos_id, ply, game_id, last_game_pos_id, next_move)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+                (pos_id, ply, game_id, last_game_pos_id, next_move),
+            )
+
+            last_game_pos_id = write_cursor.lastrowid
+            total_moves += 1
+        if verbose:
+            print(f"{index} : {date} {total_moves}", end="\r")
+        index = index + 1
+    con.commit()
+    return total_moves
+
+
+if __name__ == "__main__":
+    con = sqlite3.connect("/Users/dan/github/chess/games.db")
+    total_moves = update_positions(con)
+
+    print(f"{' ':80}", end="\r")
+    print(f"Imported positions from {total_moves} total moves")
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import chess
+import chess.engine
+
+import migrate_move_codes
+
+# Evaluates every distinct position in the repertoire with a pool of engines, then
+# flags the book moves that lose more than THRESHOLD centipawns. Positions are only
+# evaluated once however many lines transpose into them, and positions that already
+# have an evaluation at DEPTH are skipped, so after import_openings.py adds chapters
+# only the new positions are searched.
+
+DEPTH = 20
+THRESHOLD = 100
+WORKERS = os.cpu_count() or 1
+MATE_SCORE = 10000
+COMMIT_EVERY = 100
+
+con = sqlite3.connect("/Users/dan/github/chess/openings.db")
+migrate_move_codes.migrate(con)
+cur = con.cursor()
+cur.execute(
+    """CREATE TABLE IF NOT EXISTS opening_evals (
+            pos_id INTEGER PRIMARY KEY,
+            cp INTEGER,
+            mate INTEGER,
+            depth INTEGER
+            );
+"""
+)
+cur.execute(
+    """CREATE TABLE IF NOT EXISTS opening_move_evals (
+            pos_id INTEGER,
+            next_move INTEGER,
+            drop_cp INTEGER,
+            flagged INTEGER,
+            PRIMARY KEY (pos_id, next_move)
+            );
+"""
+)
+con.commit()
+
+engines = threading.local()
+all_engines = []
+all_engines_lock = threading.Lock()
+
+
+def evaluate(pos_id, epd):
+    # Each worker thread gets its own single-threaded engine so that the pool
+    # scales across cores.
+    if not hasattr(engines, "engine"):
+        engines.engine = chess.engine.SimpleEngine.popen_uci("stockfish")
+        with all_engines_lock:
+            all_engines.append(engines.engine)
+        if "Threads" in engines.engine.options:
+            engines.engine.configure({"Threads": 1})
+
+    board = chess.Board(epd)
+    info = engines.engine.analyse(board, chess.engine.Limit(depth=DEPTH))
+    score = info["score"].white()
+    return pos_id, score.score(), score.mate(), info.get("depth", DEPTH)
+
+
+positions = cur.execute(
+    """
+    SELECT DISTINCT p.pos_id, p.epd
+    FROM positions p
+    JOIN opening_positions o
+    ON p.pos_id = o.pos_id
+    LEFT JOIN opening_evals e
+    ON p.pos_id = e.pos_id
+    WHERE e.pos_id IS NULL OR e.depth < ?
+    """,
+    (DEPTH,),
+).fetchall()
+
+print(f"Evaluating {len(positions)} positions with {WORKERS} engines")
+
+index = 0
+try:
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        futures = [pool.submit(evaluate, pos_id, epd) for (pos_id, epd) in positions]
+        for future in as_completed(futures):
+            cur.execute(
+                """
+        INSERT OR REPLACE INTO opening_evals (pos_id, cp, mate, depth)
+        VALUES (?, ?, ?, ?)
+        """,
+                future.result(),
+            )
+            index = index + 1
+            if index % COMMIT_EVERY == 0:
+                con.commit()
+            print(f"{index} / {len(positions)}", end="\r")
+finally:
+    con.commit()
+    for engine in all_engines:
+        engine.quit()
+
+
+def centipawns(cp, mate):
+    if mate is not None:
+        return chess.engine.Mate(mate).score(mate_score=MATE_SCORE)
+    return cp
+
+
+# Work out how much each book move loses, from the point of view of the side making
+# it, by comparing the evaluation before and after the move.
+moves = cur.execute(
+    """
+    SELECT DISTINCT parent.pos_id, p.epd, parent.next_move,
+        before.cp, before.mate, after.cp, after.mate
+    FROM opening_positions parent
+    JOIN opening_positions child
+    ON child.last_opening_pos_id = parent.opening_pos_id
+    JOIN positions p
+    ON p.pos_id = parent.pos_id
+    JOIN opening_evals before
+    ON before.pos_id = parent.pos_id
+    JOIN opening_evals after
+    ON after.pos_id = child.pos_id
+    """
+).fetchall()
+
+flagged = 0
+for (pos_id, epd, next_move, before_cp, before_mate, after_cp, after_mate) in moves:
+    drop = centipawns(before_cp, before_mate) - centipawns(after_cp, after_mate)
+    # Scores are stored from white's point of view.
+    if epd.split()[1] == "b":
+        drop = -drop
+    cur.execute(
+        """
+    INSERT OR REPLACE INTO opening_move_evals (pos_id, next_move, drop_cp, flagged)
+    VALUES (?, ?, ?, ?)
+    """,
+        (pos_id, next_move, drop, drop >= THRESHOLD),
+    )
+    flagged += drop >= THRESHOLD
+con.commit()
+
+print(f"{' ':80}", end="\r")
+print(f"Evaluated {index} positions, {flagged} of {len(moves)} book moves flagged")